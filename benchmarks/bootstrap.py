@@ -0,0 +1,56 @@
+"""
+Compare bootstrap time and disk usage of full per-run venv installs against
+template cloned venvs.
+
+Usage: python benchmarks/bootstrap.py [-c pyproject.toml] [-e env] [-t tag] [-n runs]
+"""
+
+import argparse
+import shutil
+import time
+import typing as t
+from pathlib import Path
+
+from ptm.config import Config, Run, initialize
+from ptm.venv import disk_usage
+
+
+def bootstrap(cfg: Config, runs: t.List[Run], templates: bool) -> t.Tuple[float, int]:
+    cfg.templates = templates
+    shutil.rmtree(cfg.directory / ".templates", ignore_errors=True)
+    for run in runs:
+        shutil.rmtree(run.venv, ignore_errors=True)
+    start = time.perf_counter()
+    for run in runs:
+        with cfg.driver.bootstrap(run):
+            pass
+    elapsed = time.perf_counter() - start
+    return elapsed, disk_usage(
+        *(run.venv for run in runs),
+        *([cfg.directory / ".templates"] if templates else []),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-c", "--config", type=Path, default=None)
+    parser.add_argument("-e", "--env", action="append", default=[])
+    parser.add_argument("-t", "--tag", action="append", default=[])
+    parser.add_argument("-n", "--runs", type=int, default=None)
+    args = parser.parse_args()
+
+    cfg = initialize(args.config)
+    runs = list(cfg.runs(environments=set(args.env), tags=set(args.tag)))
+    runs = runs[: args.runs] if args.runs else runs
+    for run in runs:
+        if not run.locked and not (run.directory / "requirements.txt").is_file():
+            run.generate()
+
+    print(f"{'mode':<10} {'runs':>5} {'seconds':>10} {'disk (MB)':>10}")
+    for mode, templates in [("full", False), ("template", True)]:
+        elapsed, usage = bootstrap(cfg, runs, templates)
+        print(f"{mode:<10} {len(runs):>5} {elapsed:>10.2f} {usage / 2**20:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
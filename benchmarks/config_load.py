@@ -0,0 +1,93 @@
+"""
+Compare loading a large synthetic [tool.ptm] section with tomlkit against the
+tomllib read path, including locating matrix entry lines for RunGroup.lineno.
+
+Usage: python benchmarks/config_load.py [-e environments] [-g groups] [-r repeat]
+"""
+
+import argparse
+import json
+import tempfile
+import timeit
+from pathlib import Path
+
+import tomlkit
+
+from ptm import toml
+from ptm.config import Config, initialize
+
+PYTHONS = ["3.9", "3.10", "3.11", "3.12", "3.13"]
+
+
+def synthesize(environments: int, groups: int) -> str:
+    lines = [
+        "[project]",
+        'name = "bench"',
+        "",
+        "[tool.ptm]",
+        'groups = ["test"]',
+        "",
+        "[tool.ptm.setenv]",
+        'DJANGO_SETTINGS_MODULE = "tests.settings"',
+        "",
+    ]
+    for env in range(environments):
+        lines.extend(
+            [
+                f"[tool.ptm.env.env{env}]",
+                f'tags = ["tag{env % 5}"]',
+                f'setenv = {{RDBMS = "db{env}"}}',
+                "matrix = [",
+                "  # a comment with {braces} and [brackets]",
+            ]
+        )
+        for group in range(groups):
+            lines.append(
+                f'  {{python = {json.dumps(PYTHONS)}, django = ["4.2", "5.{group}"], '
+                f'pkg{env} = "1.{group}", -tags = ["t{group % 3}"]}},'
+            )
+        lines.extend(["]", ""])
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-e", "--environments", type=int, default=50)
+    parser.add_argument("-g", "--groups", type=int, default=20)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    text = synthesize(args.environments, args.groups)
+    with tempfile.TemporaryDirectory() as tmp:
+        config = Path(tmp) / "pyproject.toml"
+        config.write_text(text)
+        initialize(config)  # register drivers
+
+        def best(stmt) -> float:
+            return min(timeit.repeat(stmt, number=1, repeat=args.repeat))
+
+        timings = {
+            "tomlkit.parse": best(lambda: tomlkit.parse(text)),
+            "tomllib.loads": best(lambda: toml.loads(text)),
+            "matrix_lines": best(lambda: toml.matrix_lines(text)),
+            "Config (tomlkit)": best(
+                lambda: Config.from_toml(config, tomlkit.parse(text))
+            ),
+            "Config (tomllib + lines)": best(
+                lambda: Config.from_toml(
+                    config, toml.loads(text), toml.matrix_lines(text)
+                )
+            ),
+        }
+        runs = len(initialize(config).id_table)
+
+    print(
+        f"{len(text.splitlines())} lines, {args.environments * args.groups} "
+        f"matrix entries, {runs} runs"
+    )
+    for name, seconds in timings.items():
+        print(f"{name:<26} {seconds * 1000:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+User level caches shared by every checkout of every project.
+
+The resolution cache maps a canonical hash of the inputs of a run's resolution (its
+base export, constraints, python, strategy, host platform, uv version and uv
+settings) to the compiled requirements, so a
+fresh clone, worktree or CI job only runs the resolver for runs whose inputs
+changed. Entries expire ``ttl`` seconds after they were resolved, since releases
+published later may change the result of the same inputs. The cache can be
+exported to and imported from a single archive for CI cache steps.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tarfile
+import time
+import typing as t
+from dataclasses import dataclass, field
+from pathlib import Path
+
+DEFAULT_RESOLUTION_TTL = 7 * 24 * 60 * 60
+
+# bumped when the format of the cached inputs or entries changes
+RESOLUTION_VERSION = 2
+
+ENTRY = re.compile(r"[0-9a-f]{2}/[0-9a-f]{64}\.txt")
+
+
+def user_cache_dir() -> Path:
+    """
+    The user level ptm cache directory. Set ``PTM_CACHE_DIR`` to override it,
+    otherwise ``$XDG_CACHE_HOME/ptm`` or ``~/.cache/ptm`` is used.
+    """
+    if os.environ.get("PTM_CACHE_DIR"):
+        return Path(os.environ["PTM_CACHE_DIR"])
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "ptm"
+
+
+def resolution_key(**inputs: t.Any) -> str:
+    """
+    A canonical hash of the inputs of a resolution. Requirement lines are compared
+    without surrounding whitespace and line ending differences.
+    """
+    canonical = {
+        name: (
+            [line.strip() for line in value.splitlines() if line.strip()]
+            if isinstance(value, str)
+            else value
+        )
+        for name, value in inputs.items()
+    }
+    canonical["version"] = RESOLUTION_VERSION
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode()).hexdigest()
+
+
+@dataclass
+class ResolutionCache:
+    directory: Path = field(default_factory=lambda: user_cache_dir() / "resolutions")
+    ttl: int = DEFAULT_RESOLUTION_TTL
+
+    def path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.txt"
+
+    def expired(self, path: Path, now: t.Optional[float] = None) -> bool:
+        return (now or time.time()) - path.stat().st_mtime >= self.ttl
+
+    def get(self, key: str) -> t.Optional[str]:
+        """
+        The cached resolution of the key, None if it is missing or expired.
+        """
+        path = self.path(key)
+        try:
+            if self.expired(path):
+                return None
+            return path.read_text()
+        except OSError:
+            return None
+
+    def put(self, key: str, requirements: str):
+        path = self.path(key)
+        os.makedirs(path.parent, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(requirements)
+        os.replace(tmp, path)
+
+    def entries(self) -> t.List[Path]:
+        return sorted(self.directory.glob("??/*.txt"))
+
+    def prune(self) -> int:
+        """
+        Remove the expired entries, returning how many were removed.
+        """
+        now, removed = time.time(), 0
+        for path in self.entries():
+            if self.expired(path, now):
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def export(self, archive: Path) -> int:
+        """
+        Write the entries that have not expired to a gzipped tar archive, returning
+        how many were written.
+        """
+        self.prune()
+        entries = self.entries()
+        tmp = archive.with_name(f".{archive.name}.{os.getpid()}.tmp")
+        with tarfile.open(tmp, "w:gz") as tar:
+            for path in entries:
+                tar.add(path, arcname=path.relative_to(self.directory).as_posix())
+        os.replace(tmp, archive)
+        return len(entries)
+
+    def restore(self, archive: Path) -> int:
+        """
+        Import the entries of an archive written by :meth:`export`, keeping the
+        newer of two entries of the same key. Members that are not cache entries
+        are ignored. Returns the number of entries imported.
+        """
+        now, imported = time.time(), 0
+        with tarfile.open(archive, "r:*") as tar:
+            for member in tar:
+                if not member.isfile() or not ENTRY.fullmatch(member.name):
+                    continue
+                if now - member.mtime >= self.ttl:
+                    continue
+                path = self.directory / member.name
+                if path.is_file() and path.stat().st_mtime >= member.mtime:
+                    continue
+                stream = tar.extractfile(member)
+                if stream is None:
+                    continue
+                self.put(path.stem, stream.read().decode())
+                os.utime(path, (member.mtime, member.mtime))
+                imported += 1
+        return imported
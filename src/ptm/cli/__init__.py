@@ -5,8 +5,26 @@ from typer import Context, Option, Typer, echo
 from typing_extensions import Annotated
 
 from .. import __version__
-from ..config import Config, initialize
-from . import bootstrap, check, generate, run, table
+from ..config import initialize
+from ..server import connect
+from . import (
+    bootstrap,
+    cache,
+    check,
+    coordinator,
+    diff,
+    gc,
+    generate,
+    pack,
+    plan,
+    results,
+    run,
+    serve,
+    table,
+    unpack,
+    watch,
+    worker,
+)
 
 app = Typer(pretty_exceptions_show_locals=False)
 
@@ -15,12 +33,37 @@ app.add_typer(table.app)
 app.add_typer(check.app)
 app.add_typer(bootstrap.app)
 app.add_typer(run.app)
+app.add_typer(diff.app)
+app.add_typer(results.app)
+app.add_typer(serve.app)
+app.add_typer(coordinator.app)
+app.add_typer(worker.app)
+app.add_typer(gc.app)
+app.add_typer(watch.app)
+app.add_typer(cache.app)
+app.add_typer(pack.app)
+app.add_typer(plan.app)
+app.add_typer(unpack.app)
+
+
+class State(dict):
+    """
+    The CLI context object. The configuration is only loaded when it is first
+    accessed, so commands forwarded to a running ``ptm serve`` never parse it.
+    """
+
+    def __missing__(self, key):
+        if key == "config":
+            self["config"] = initialize(self.get("config_path"))
+            return self["config"]
+        raise KeyError(key)
 
 
 def init_config(ctx: Context, _, value: t.Optional[Path]):
-    ctx.ensure_object(dict)
+    if not isinstance(ctx.obj, State):
+        ctx.obj = State(ctx.obj or {})
     ctx.obj["config_path"] = value
-    ctx.obj["config"] = initialize(value)
+    ctx.obj["client"] = connect(value)
     return value
 
 
@@ -38,7 +81,6 @@ def callback(
         ),
     ] = None,
 ):
-    assert isinstance(ctx.obj["config"], Config)
     assert config is ctx.obj["config_path"]
 
 
@@ -9,6 +9,33 @@ from typing_extensions import Annotated
 from ..config import Config, Environment, Run
 
 
+def ident(run: t.Union[Run, str]) -> str:
+    """The identifier of a parsed run, which is a string when forwarding to serve."""
+    return run if isinstance(run, str) else run.ident
+
+
+def name(env: t.Union[Environment, str]) -> str:
+    """The name of a parsed environment, which is a string when forwarding to serve."""
+    return env if isinstance(env, str) else env.name
+
+
+def run_index(ctx: Context) -> t.Dict[str, t.Tuple[str, str, t.List[str]]]:
+    """
+    Map run identifiers to their environment, slug and tags either from the served
+    index or the configuration.
+    """
+    if ctx.obj.get("client"):
+        return {
+            run["ident"]: (run["env"], run["slug"], run["tags"])
+            for run in ctx.obj["client"].request("index")["runs"]
+        }
+    cfg: Config = ctx.obj["config"]
+    return {
+        identifier: (run.group.env.name, run.slug, run.tags)
+        for identifier, run in cfg.id_table.items()
+    }
+
+
 class RunParser(ParamType):
     def convert(
         self, value: t.Any, param: t.Optional[Parameter], ctx: t.Optional[Context]
@@ -16,6 +43,8 @@ class RunParser(ParamType):
         if isinstance(value, Run):
             return value
         ctx = get_current_context()
+        if ctx.obj.get("client"):
+            return value.lower()
         cfg: Config = ctx.obj["config"]
         return cfg.id_table[value.lower()]
 
@@ -25,24 +54,23 @@ class RunParser(ParamType):
 def complete_run(
     ctx: Context, param: Parameter, incomplete: str
 ) -> t.List[CompletionItem]:
-    cfg: Config = ctx.obj["config"]
     items = []
-    envs = [env.name for env in ctx.params.get("envs", [])]
+    envs = [name(env) for env in ctx.params.get("envs", [])]
     tags = ctx.params.get("tags", [])
     runs = (
-        [run.ident for run in (ctx.params.get(param.name) or []) if run]
+        [ident(run) for run in (ctx.params.get(param.name) or []) if run]
         if param.name
         else []
     ) or []
-    for identifier, run in cfg.id_table.items():
-        if (envs and run.group.env.name not in envs) or (
-            tags and not any(tg in tags for tg in run.tags)
+    for identifier, (env_name, slug, run_tags) in run_index(ctx).items():
+        if (envs and env_name not in envs) or (
+            tags and not any(tg in tags for tg in run_tags)
         ):
             continue
         if identifier.startswith(incomplete.lower()) and identifier not in runs:
             items.append(
                 CompletionItem(
-                    f"{incomplete}{identifier[len(incomplete) :]}", help=run.slug
+                    f"{incomplete}{identifier[len(incomplete) :]}", help=slug
                 )
             )
     return items
@@ -52,9 +80,11 @@ class EnvParser(ParamType):
     def convert(
         self, value: t.Any, param: t.Optional[Parameter], ctx: t.Optional[Context]
     ):
-        if isinstance(value, Run):
+        if isinstance(value, Environment):
             return value
         ctx = get_current_context()
+        if ctx.obj.get("client"):
+            return value.lower()
         cfg: Config = ctx.obj["config"]
         return cfg.environments[value.lower()]
 
@@ -64,12 +94,16 @@ class EnvParser(ParamType):
 def complete_env(
     ctx: Context, param: Parameter, incomplete: str
 ) -> t.List[CompletionItem]:
-    cfg: Config = ctx.obj["config"]
     items = []
     envs = (
-        [env.name for env in ctx.params.get(param.name) or []] if param.name else []
+        [name(env) for env in ctx.params.get(param.name) or []] if param.name else []
     ) or []
-    for env_name in cfg.environments.keys():
+    env_names = (
+        ctx.obj["client"].request("index")["environments"]
+        if ctx.obj.get("client")
+        else ctx.obj["config"].environments.keys()
+    )
+    for env_name in env_names:
         if env_name.startswith(incomplete) and env_name not in envs:
             items.append(CompletionItem(env_name))
 
@@ -79,10 +113,14 @@ def complete_env(
 def complete_tag(
     ctx: Context, param: Parameter, incomplete: str
 ) -> t.List[CompletionItem]:
-    cfg: Config = ctx.obj["config"]
     items = []
     tags = (ctx.params.get(param.name) if param.name else []) or []
-    for tag in cfg.tag_table.keys():
+    all_tags = (
+        ctx.obj["client"].request("index")["tags"]
+        if ctx.obj.get("client")
+        else ctx.obj["config"].tag_table.keys()
+    )
+    for tag in all_tags:
         if tag.startswith(incomplete) and tag not in tags:
             items.append(CompletionItem(tag))
     return items
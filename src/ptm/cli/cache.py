@@ -0,0 +1,45 @@
+import typing as t
+from pathlib import Path
+
+from typer import Context, Option, Typer, echo
+from typing_extensions import Annotated
+
+from ..cache import ResolutionCache
+from ..config import Config, find_config
+
+app = Typer(help="Manage the user level resolution cache.")
+
+
+@app.command()
+def cache(
+    ctx: Context,
+    export: Annotated[
+        t.Optional[Path],
+        Option("--export", help="Write the cache to a .tar.gz archive."),
+    ] = None,
+    restore: Annotated[
+        t.Optional[Path],
+        Option("--import", help="Import the entries of an exported archive."),
+    ] = None,
+    prune: Annotated[
+        bool,
+        Option("--prune", help="Remove expired entries."),
+    ] = False,
+):
+    """
+    Resolutions are shared by every checkout of a project. Export the cache after
+    and import it before generating in CI jobs to skip resolving unchanged runs.
+    """
+    resolutions = ResolutionCache()
+    # the cache is usable outside of a project, with its default settings
+    if ctx.obj["config_path"] or find_config():
+        cfg: Config = ctx.obj["config"]
+        resolutions = cfg.resolutions or resolutions
+    if restore is not None:
+        echo(f"Imported {resolutions.restore(restore)} resolutions from {restore}")
+    if prune:
+        echo(f"Removed {resolutions.prune()} expired resolutions")
+    if export is not None:
+        echo(f"Exported {resolutions.export(export)} resolutions to {export}")
+    if restore is None and export is None and not prune:
+        echo(f"{len(resolutions.entries())} resolutions in {resolutions.directory}")
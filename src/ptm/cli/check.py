@@ -1,9 +1,48 @@
-from typer import Typer
+from typer import Context, Exit, Option, Typer, echo
+from typing_extensions import Annotated
+
+from ..config import Config
+from ..preflight import Satisfiability, preflight
 
 app = Typer(help="Validate the uv_matrix configuration.")
 
 
 @app.command()
-def check():
+def check(
+    ctx: Context,
+    resolve: Annotated[
+        bool,
+        Option(
+            "--resolve",
+            help=(
+                "Check that each run's dependencies can be satisfied using the "
+                "package index metadata, without running the resolver."
+            ),
+        ),
+    ] = False,
+):
     """Check the uv_matrix configuration."""
-    pass
+    cfg: Config = ctx.obj["config"]
+    for env in cfg.environments.values():
+        for idx, group in enumerate(env.matrix):
+            location = f"line {group.lineno}" if group.lineno else f"matrix[{idx}]"
+            summary = f"{env.name} {location}: {len(group.runs)} runs"
+            # a dynamic range without versions leaves nothing to reduce
+            if group.expansion and group.product_size:
+                reduction = 1 - len(group.runs) / group.product_size
+                summary += (
+                    f" ({group.expansion} of {group.product_size}, "
+                    f"{reduction:.0%} reduction)"
+                )
+            echo(summary)
+    if not resolve:
+        return
+    verdicts = preflight(cfg.runs(), cfg.index, cfg.requires_python)
+    counts = {satisfiability: 0 for satisfiability in Satisfiability}
+    for verdict in verdicts:
+        counts[verdict.satisfiability] += 1
+        if verdict.satisfiability is not Satisfiability.SATISFIABLE:
+            echo(verdict, err=True)
+    echo(", ".join(f"{count} {kind}" for kind, count in counts.items()))
+    if counts[Satisfiability.UNSATISFIABLE]:
+        raise Exit(1)
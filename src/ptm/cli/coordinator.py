@@ -0,0 +1,74 @@
+import threading
+import typing as t
+
+from typer import Argument, Context, Exit, Option, Typer, echo
+from typing_extensions import Annotated
+
+from ..config import Config
+from ..coordinator import Coordinator, CoordinatorServer, longest_first, parse_address
+from ..results import RESULTS_DB, ResultStore
+from .args import Environments, Tags, name
+
+app = Typer(help="Distribute the command's runs to connected workers.")
+
+
+@app.command()
+def coordinator(
+    ctx: Context,
+    trailing_args: Annotated[t.List[str], Argument(metavar="--")],
+    envs: Environments = [],
+    tags: Tags = [],
+    bind: Annotated[
+        str,
+        Option("--bind", "-b", help="The host:port to accept workers on."),
+    ] = "127.0.0.1:8765",
+    longest: Annotated[
+        bool,
+        Option(
+            "--longest-first/--in-order",
+            help="Queue the runs that took longest last time first.",
+        ),
+    ] = True,
+    token: Annotated[
+        t.Optional[str],
+        Option(
+            "--token",
+            envvar="PTM_COORDINATOR_TOKEN",
+            help="The secret workers authenticate with, generated if not given.",
+        ),
+    ] = None,
+):
+    """
+    Queue the selected runs and hand them to workers started with
+    ``ptm worker --connect host:port --token TOKEN -- COMMAND`` until every run
+    has a result.
+    """
+    cfg: Config = ctx.obj["config"]
+    store = ResultStore(cfg.directory / RESULTS_DB)
+    runs = list(cfg.runs(environments={name(env) for env in envs}, tags=set(tags)))
+    if longest:
+        runs = longest_first(runs, store)
+    state = Coordinator(runs=runs, command=" ".join(trailing_args), store=store)
+    if token:
+        state.token = token
+    server = CoordinatorServer(parse_address(bind), state)
+    host, port = server.server_address[:2]
+    echo(f"Queued {len(runs)} runs, waiting for workers on {host!s}:{port}")
+    if not token:
+        echo(f"Workers authenticate with --token {state.token}")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with store:
+            while not state.finished.wait(1):
+                pass
+    finally:
+        server.shutdown()
+        server.server_close()
+    failed = state.failed
+    echo(
+        f"{len(state.results) - len(failed)} passed, {len(failed)} failed, "
+        f"{state.requeued} requeued"
+    )
+    if failed:
+        raise Exit(1)
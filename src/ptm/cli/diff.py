@@ -0,0 +1,55 @@
+import typing as t
+from pathlib import Path
+
+from typer import Argument, Context, Option, Typer, echo
+from typing_extensions import Annotated
+
+from ..config import Config, find_config
+from ..diff import diff as diff_configs
+from ..diff import load
+
+app = Typer(help="Show the runs that differ between two configurations.")
+
+
+@app.command()
+def diff(
+    ctx: Context,
+    old: Annotated[
+        str,
+        Argument(help="The old pyproject.toml path or git revision (rev[:path])."),
+    ],
+    new: Annotated[
+        t.Optional[str],
+        Argument(
+            help=(
+                "The new pyproject.toml path or git revision (rev[:path]). "
+                "Defaults to the current configuration."
+            )
+        ),
+    ] = None,
+    affected: Annotated[
+        bool,
+        Option(
+            "--affected",
+            "-a",
+            help="Only print the identifiers of added or changed runs.",
+        ),
+    ] = False,
+):
+    """Compare two configurations by their expanded runs."""
+    cfg_file: t.Optional[Path] = ctx.obj["config_path"] or find_config()
+    assert cfg_file, "No configuration file found."
+    new_cfg: Config = load(new, cfg_file) if new else ctx.obj["config"]
+    result = diff_configs(load(old, cfg_file), new_cfg)
+    if affected:
+        for run in result.affected:
+            echo(run.ident)
+    else:
+        for run in result.added:
+            echo(f"+ {run}")
+        for run in result.removed:
+            echo(f"- {run}")
+        for change in result.changed:
+            echo(f"~ {change}")
+        for change in result.retagged:
+            echo(f"# {change}")
@@ -0,0 +1,46 @@
+import typing as t
+
+from typer import Context, Option, Typer, echo
+from typing_extensions import Annotated
+
+from ..config import Config
+from ..usage import collect, format_size, parse_size
+
+app = Typer(help="Remove unused runs and venvs from the ptm directory.")
+
+
+@app.command()
+def gc(
+    ctx: Context,
+    max_size: Annotated[
+        t.Optional[str],
+        Option(
+            "--max-size",
+            help="The size budget (e.g. 10GB), by default tool.ptm.cache_max_size.",
+        ),
+    ] = None,
+    dry_run: Annotated[
+        bool,
+        Option("--dry-run", "-n", help="Only print what would be removed."),
+    ] = False,
+):
+    """
+    Remove the directories of runs that are no longer configured, then evict the
+    least recently used venvs until the ptm directory fits the size budget.
+    """
+    cfg: Config = ctx.obj["config"]
+    collection = collect(
+        cfg,
+        max_size=parse_size(max_size) if max_size else None,
+        dry_run=dry_run,
+    )
+    for orphan in collection.orphans:
+        echo(f"orphan  {orphan}")
+    for venv in collection.evicted:
+        echo(f"evicted {venv}")
+    budget = parse_size(max_size) if max_size else cfg.max_cache_size
+    echo(
+        f"{'Would free' if dry_run else 'Freed'} {format_size(collection.freed)}, "
+        f"{format_size(collection.total)} of venvs remain"
+        + (f" (budget {format_size(budget)})" if budget is not None else "")
+    )
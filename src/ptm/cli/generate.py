@@ -2,10 +2,13 @@ import typing as t
 from itertools import chain
 from pprint import pprint
 
-from typer import Context, Typer
+from typer import Context, Option, Typer, echo
+from typing_extensions import Annotated
 
 from ..config import Config
-from .args import Environments, Runs, Tags
+from ..preflight import Satisfiability, preflight
+from ..server import select
+from .args import Environments, Runs, Tags, ident, name
 
 app = Typer(help="Generate the test environments.")
 
@@ -16,7 +19,32 @@ def generate(
     runs: Runs = None,
     envs: Environments = [],
     tags: Tags = [],
+    prune: Annotated[
+        bool,
+        Option(
+            "--prune",
+            help=(
+                "Skip runs a pre-flight check of the package index metadata finds "
+                "unsatisfiable instead of failing in the resolver."
+            ),
+        ),
+    ] = False,
 ):
+    if ctx.obj.get("client"):
+        client = ctx.obj["client"]
+        idents = [ident(run) for run in runs or []] or [
+            run["ident"]
+            for run in select(
+                client.request("index"), envs=[name(env) for env in envs], tags=tags
+            )
+        ]
+        if prune:
+            pruned = client.request("preflight", idents=idents)
+            for message in pruned.values():
+                echo(message, err=True)
+            idents = [run_ident for run_ident in idents if run_ident not in pruned]
+        pprint(client.request("generate", idents=idents))
+        return
     cfg: Config = ctx.obj["config"]
     run_table: t.Dict[str, int] = {}
     if not runs:
@@ -25,8 +53,20 @@ def generate(
             if envs
             else cfg.runs(tags=set(tags))
         )
-    for run in runs or []:
-        run.generate()
-        run_table.setdefault(run.group.env.name, 0)
-        run_table[run.group.env.name] += 1
+    if prune:
+        runs = list(runs or [])
+        verdicts = preflight(runs, cfg.index, cfg.requires_python)
+        for verdict in verdicts:
+            if verdict.satisfiability is Satisfiability.UNSATISFIABLE:
+                echo(verdict, err=True)
+        runs = [
+            verdict.run
+            for verdict in verdicts
+            if verdict.satisfiability is not Satisfiability.UNSATISFIABLE
+        ]
+    with cfg.deferred_lock():
+        for run in runs or []:
+            run.generate()
+            run_table.setdefault(run.group.env.name, 0)
+            run_table[run.group.env.name] += 1
     pprint(run_table)
@@ -0,0 +1,46 @@
+import typing as t
+from pathlib import Path
+
+from typer import Argument, Context, Option, Typer, echo
+from typing_extensions import Annotated
+
+from ..config import Config
+from ..pack import compressions, pack
+from .args import Environments, Runs, Tags, ident, name
+
+app = Typer(help="Pack the venvs of runs into a relocatable archive.")
+
+
+@app.command("pack")
+def pack_command(
+    ctx: Context,
+    archive: Annotated[Path, Argument(help="The archive to write.")],
+    runs: Runs = None,
+    envs: Environments = [],
+    tags: Tags = [],
+    compression: Annotated[
+        t.Optional[str],
+        Option(
+            "--compression",
+            help="zstd or gzip, by default zstd if a zstd module is available.",
+        ),
+    ] = None,
+):
+    """
+    Write the bootstrapped venvs of the selected runs to one archive that stores
+    files shared between the venvs once. Restore it with ptm unpack.
+    """
+    cfg: Config = ctx.obj["config"]
+    # the parsers return identifiers and names while ptm serve is running
+    selected = (
+        [cfg.id_table[ident(run)] for run in runs]
+        if runs
+        else list(cfg.runs(environments={name(env) for env in envs}, tags=set(tags)))
+    )
+    compression = compression or compressions()[0]
+    assert compression in compressions(), f"{compression} is not available."
+    packed = pack(selected, archive, compression=compression)
+    echo(
+        f"Packed {len(packed.runs)} venvs ({packed.files} files, {packed.objects} "
+        f"distinct) into {archive} with {compression}"
+    )
@@ -0,0 +1,74 @@
+import typing as t
+
+from typer import Context, Option, Typer, echo
+from typing_extensions import Annotated
+
+from ..config import Config
+from ..plan import format_duration, plan_runs
+from .args import Environments, Tags, name
+
+app = Typer(help="Plan a subset of the runs that maximizes coverage in a budget.")
+
+Budget = Annotated[
+    str,
+    Option(
+        "--budget",
+        help=(
+            "A duration (e.g. 15m, 1h30m) spent by the recorded durations of the "
+            "runs, or a number of runs."
+        ),
+    ),
+]
+
+Required = Annotated[
+    t.List[str],
+    Option(
+        "--require",
+        help=(
+            "Always include the runs with these tags, in addition to the "
+            "[tool.ptm] plan_require tags (lowest by default)."
+        ),
+    ),
+]
+
+
+@app.command("plan")
+def plan_command(
+    ctx: Context,
+    budget: Budget,
+    envs: Environments = [],
+    tags: Tags = [],
+    required: Required = [],
+    seed: Annotated[
+        t.Optional[str],
+        Option("--seed", help="Break ties with this seed instead of the commit."),
+    ] = None,
+    quiet: Annotated[
+        bool,
+        Option("--quiet", "-q", help="Only print the selected run identifiers."),
+    ] = False,
+):
+    """
+    Select the runs covering the most python versions and dependency versions
+    within the budget. The selection is deterministic for a commit.
+    """
+    cfg: Config = ctx.obj["config"]
+    # the parser returns names while ptm serve is running
+    runs = list(cfg.runs(environments={name(env) for env in envs}, tags=set(tags)))
+    selection = plan_runs(cfg, runs, budget, required=required, seed=seed)
+    for run in selection.selected:
+        echo(run.ident if quiet else str(run))
+    if quiet:
+        return
+    spent = (
+        f"{len(selection.selected)} runs"
+        if budget.strip().isdigit()
+        else f"an estimated {format_duration(selection.duration)}"
+    )
+    total = len(selection.covered) + len(selection.uncovered)
+    echo(
+        f"Selected {len(selection.selected)} of {len(runs)} runs ({spent}) covering "
+        f"{len(selection.covered)} of {total} values"
+    )
+    for package, value in sorted(selection.uncovered):
+        echo(f"uncovered {package} {value}", err=True)
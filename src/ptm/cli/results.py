@@ -0,0 +1,67 @@
+import typing as t
+from datetime import datetime
+
+from typer import Context, Option, Typer, echo
+from typing_extensions import Annotated
+
+from ..config import Config
+from ..results import RESULTS_DB, Result, ResultStore
+
+app = Typer(help="Query the recorded results of previous runs.")
+
+
+def format_result(result: Result) -> str:
+    status = "pass" if result.passed else f"FAIL({result.exit_code})"
+    rss = f"{result.peak_rss / 2**20:.0f}MB" if result.peak_rss else "-"
+    started = datetime.fromtimestamp(result.started).strftime("%Y-%m-%d %H:%M")
+    return (
+        f"[{result.ident}] {result.env:<10} python={result.python:<6} {status:<9} "
+        f"bootstrap={result.bootstrap_time or 0:.1f}s "
+        f"command={result.command_time or 0:.1f}s rss={rss} {started} "
+        f"{result.command}"
+    )
+
+
+@app.command()
+def results(
+    ctx: Context,
+    slowest: Annotated[
+        t.Optional[int],
+        Option("--slowest", help="Show the N runs with the longest command times."),
+    ] = None,
+    flaky: Annotated[
+        bool,
+        Option(
+            "--flaky",
+            help="Show runs that both passed and failed with the same lock hash.",
+        ),
+    ] = False,
+    failed: Annotated[
+        bool,
+        Option(
+            "--failed",
+            help="Print the identifiers of runs whose latest result failed.",
+        ),
+    ] = False,
+    ident: Annotated[
+        t.Optional[str],
+        Option("--run", "-r", help="Show the full history of the given run."),
+    ] = None,
+):
+    """Show the latest recorded result of each run."""
+    cfg: Config = ctx.obj["config"]
+    store = ResultStore(cfg.directory / RESULTS_DB)
+    if failed:
+        for result in store.failed():
+            echo(result.ident)
+        return
+    if ident:
+        selected = store.history(ident.lower())
+    elif slowest:
+        selected = store.slowest(slowest)
+    elif flaky:
+        selected = store.flaky()
+    else:
+        selected = store.latest()
+    for result in selected:
+        echo(format_result(result))
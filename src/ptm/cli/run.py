@@ -1,17 +1,113 @@
+import os
 import subprocess
+import time
 import typing as t
 from itertools import chain
+from pathlib import Path
 from platform import platform
 
-from typer import Argument, Context, Option, Typer
+from dotenv import dotenv_values
+from typer import Argument, Context, Option, Typer, echo
 from typing_extensions import Annotated
 
-from ..config import Config, Run
-from .args import Environments, RunParser, Tags, complete_run
+from ..config import Config, Environment, Run
+from ..plan import plan_runs
+from ..results import RESULTS_DB, ResultStore, execute, lock_hash, record_result
+from ..server import Client, select
+from ..usage import collect_opportunistically, format_size
+from ..venv import environment
+from ..worker import Worker, socket_path
+from .args import Environments, RunParser, Tags, complete_run, ident, name
+from .plan import Required
 
 app = Typer(help="Run the command in the specified environment.")
 
 
+def worker(
+    directory: Path,
+    python: Path,
+    env: t.Dict[str, str],
+    current: t.Optional[str],
+) -> Worker:
+    """
+    Connect to the persistent worker of a run, (re)starting it if it is not running
+    or was started before the run's requirements changed.
+    """
+    handle = Worker(socket_path(directory))
+    if current is None or handle.lock_hash() != current:
+        handle.start(python, env, current, log=directory / "worker.log")
+    return handle
+
+
+def planned(
+    cfg: Config,
+    runs: t.List[Run],
+    envs: t.List[Environment],
+    tags: t.List[str],
+    budget: str,
+    required: t.List[str],
+) -> t.List[Run]:
+    """
+    The runs ptm plan selects within the budget from the given runs, or from the
+    runs of the environments and tags.
+    """
+    candidates = (
+        [cfg.id_table[ident(run)] for run in runs]
+        if runs
+        else cfg.runs(environments={name(env) for env in envs}, tags=set(tags))
+    )
+    return plan_runs(cfg, candidates, budget, required=required).selected
+
+
+def run_served(
+    client: Client,
+    command: str,
+    idents: t.List[str],
+    envs: t.List[str],
+    tags: t.List[str],
+    failed: bool,
+    argv: t.Optional[t.List[str]] = None,
+):
+    """
+    Run the command in runs bootstrapped by a running ptm serve process. If argv is
+    given the command is run by the runs' persistent workers.
+    """
+    index = client.request("index")
+    store = ResultStore(Path(index["directory"]) / RESULTS_DB)
+    if failed:
+        known = {run["ident"] for run in index["runs"]}
+        idents = [result.ident for result in store.failed() if result.ident in known]
+    elif not idents:
+        idents = [run["ident"] for run in select(index, envs=envs, tags=tags)]
+    with store:
+        for run_ident in idents:
+            started = time.time()
+            info = client.request("bootstrap", ident=run_ident)
+            env = environment(Path(info["bin"]).parent, info["setenv"])
+            if argv:
+                exit_code, command_time, peak_rss = worker(
+                    Path(info["directory"]),
+                    Path(info["bin"]) / "python",
+                    env,
+                    info["lock_hash"],
+                ).call(argv, env)
+            else:
+                exit_code, command_time, peak_rss = execute(command, env=env)
+            record_result(
+                store,
+                info,
+                command,
+                exit_code,
+                lock_hash=info["lock_hash"],
+                bootstrap_time=info["bootstrap_time"],
+                command_time=command_time,
+                peak_rss=peak_rss,
+                started=started,
+            )
+            if exit_code:
+                raise subprocess.CalledProcessError(exit_code, command)
+
+
 @app.command()
 def run(
     ctx: Context,
@@ -28,21 +124,121 @@ def run(
     ] = [],
     envs: Environments = [],
     tags: Tags = [],
+    failed: Annotated[
+        bool,
+        Option(
+            "--failed",
+            help="Only run the runs whose most recent recorded result failed.",
+        ),
+    ] = False,
+    use_worker: Annotated[
+        bool,
+        Option(
+            "--worker",
+            help=(
+                "Run the command in a persistent worker process per run that keeps "
+                "its imports warm between invocations. The command is not run by a "
+                "shell."
+            ),
+        ),
+    ] = False,
+    budget: Annotated[
+        t.Optional[str],
+        Option(
+            "--budget",
+            help=(
+                "Only run the runs ptm plan selects within this budget (e.g. 15m "
+                "or a number of runs)."
+            ),
+        ),
+    ] = None,
+    required: Required = [],
 ):
+    command = " ".join(trailing_args)
+    assert not use_worker or hasattr(os, "fork"), (
+        "--worker is not supported on this platform."
+    )
+    assert not (failed and budget), "--failed and --budget are exclusive."
+    if budget is not None:
+        runs = planned(ctx.obj["config"], runs or [], envs, tags, budget, required)
+    if ctx.obj.get("client"):
+        return run_served(
+            ctx.obj["client"],
+            command,
+            idents=[ident(run) for run in runs or []],
+            envs=[name(env) for env in envs],
+            tags=tags,
+            failed=failed,
+            argv=trailing_args if use_worker else None,
+        )
     cfg: Config = ctx.obj["config"]
-    if not runs:
+    store = ResultStore(cfg.directory / RESULTS_DB)
+    if failed:
+        runs = [
+            cfg.id_table[result.ident]
+            for result in store.failed()
+            if result.ident in cfg.id_table
+        ]
+    elif not runs:
         runs = (
             chain.from_iterable(env.runs(tags=set(tags)) for env in envs)  # type: ignore
             if envs
             else cfg.runs(tags=set(tags))
         )
-    for run in runs or []:
-        with run.bootstrap():
-            source = f"source {(run.venv / 'bin' / 'activate')}"
-            if platform() == "Windows":
-                source = f"{(run.venv / 'bin' / 'activate.bat')}"
-            subprocess.run(
-                f"{source} && {' '.join(trailing_args)}",
-                shell=True,
-                check=True,
+    used: t.List[Path] = []
+    try:
+        with store:
+            for run in runs or []:
+                used.append(run.venv)
+                started, start = time.time(), time.perf_counter()
+                if use_worker:
+                    handle = Worker(socket_path(run.directory))
+                    current = lock_hash(run)
+                    # a warm worker with current requirements skips the bootstrap
+                    if current is None or handle.lock_hash() != current:
+                        with run.bootstrap():
+                            pass
+                        current = lock_hash(run)
+                    else:
+                        run.touch()
+                    env = environment(run.venv, dotenv_values(run.env_file))
+                    handle = worker(run.directory, run.python_path, env, current)
+                    bootstrap_time = time.perf_counter() - start
+                    exit_code, command_time, peak_rss = handle.call(trailing_args, env)
+                else:
+                    with run.bootstrap():
+                        bootstrap_time = time.perf_counter() - start
+                        source = f"source {(run.venv / 'bin' / 'activate')}"
+                        if platform() == "Windows":
+                            source = f"{(run.venv / 'bin' / 'activate.bat')}"
+                        exit_code, command_time, peak_rss = execute(
+                            f"{source} && {command}"
+                        )
+                record_result(
+                    store,
+                    run,
+                    command,
+                    exit_code,
+                    lock_hash=lock_hash(run),
+                    bootstrap_time=bootstrap_time,
+                    command_time=command_time,
+                    peak_rss=peak_rss,
+                    started=started,
+                )
+                if exit_code:
+                    raise subprocess.CalledProcessError(exit_code, command)
+    finally:
+        # evict orphans and least recently used venvs if over the cache budget,
+        # a failed collection is reported without replacing the run's outcome
+        try:
+            collection = collect_opportunistically(cfg, protect=used)
+        except Exception as err:
+            echo(f"Collecting the cache failed: {err}", err=True)
+            collection = None
+        if collection and (collection.orphans or collection.evicted):
+            echo(
+                f"Removed {len(collection.orphans)} orphaned runs and evicted "
+                f"{len(collection.evicted)} venvs, freeing "
+                f"{format_size(collection.freed)}",
+                err=True,
             )
@@ -0,0 +1,33 @@
+import signal
+import typing as t
+from pathlib import Path
+
+from typer import Context, Exit, Typer, echo
+
+from ..config import find_config
+from ..server import Server
+
+app = Typer(help="Serve the configuration to other ptm invocations.")
+
+
+@app.command()
+def serve(ctx: Context):
+    """
+    Keep the configuration and venv state warm in a resident process. Other ptm
+    commands forward to it over a unix domain socket while it is running.
+    """
+    if ctx.obj.get("client"):
+        echo(f"ptm is already serving on {ctx.obj['client'].path}", err=True)
+        raise Exit(1)
+    config_file: t.Optional[Path] = ctx.obj["config_path"] or find_config()
+    assert config_file, "No configuration file found."
+    server = Server(config_file.absolute())
+    echo(f"Serving {config_file} on {server.server_address}")
+    # shut down cleanly on SIGTERM as well as SIGINT
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,34 @@
+import typing as t
+from pathlib import Path
+
+from typer import Argument, Context, Option, Typer, echo
+from typing_extensions import Annotated
+
+from ..config import Config
+from ..pack import unpack
+from .args import Runs, ident
+
+app = Typer(help="Restore the venvs of runs from an archive written by ptm pack.")
+
+
+@app.command("unpack")
+def unpack_command(
+    ctx: Context,
+    archive: Annotated[Path, Argument(help="The archive to restore.")],
+    runs: Runs = None,
+    jobs: Annotated[
+        int,
+        Option("--jobs", "-j", help="The number of venvs to restore in parallel."),
+    ] = 8,
+):
+    """
+    Restore the venvs of the runs whose requirements have not changed since they
+    were packed, rewriting the paths that depend on the checkout location.
+    Bootstrapping a restored run does not reinstall its venv.
+    """
+    cfg: Config = ctx.obj["config"]
+    idents: t.Optional[t.List[str]] = [ident(run) for run in runs] if runs else None
+    unpacked = unpack(cfg, archive, idents=idents, max_workers=jobs)
+    for skipped, reason in unpacked.skipped.items():
+        echo(f"skipped {skipped}: {reason}", err=True)
+    echo(f"Restored {len(unpacked.restored)} venvs from {archive}")
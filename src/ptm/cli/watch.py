@@ -0,0 +1,79 @@
+import time
+import typing as t
+from pathlib import Path
+
+from typer import Argument, Context, Option, Typer, echo
+from typing_extensions import Annotated
+
+from ..config import Run, find_config
+from ..watch import DEBOUNCE, Rewrites, WatchSession, debounce, drain, watcher
+from .args import Environments, RunParser, Tags, complete_run, ident, name
+
+app = Typer(help="Rerun the command in the affected runs when files change.")
+
+
+@app.command()
+def watch(
+    ctx: Context,
+    trailing_args: Annotated[t.List[str], Argument(metavar="--")],
+    runs: Annotated[
+        t.Optional[t.List[Run]],
+        Option(
+            "--run",
+            "-r",
+            parser=RunParser(),
+            shell_complete=complete_run,
+            help="Only rerun these runs.",
+        ),
+    ] = [],
+    envs: Environments = [],
+    tags: Tags = [],
+    delay: Annotated[
+        float,
+        Option("--debounce", help="Seconds to wait for further changes."),
+    ] = DEBOUNCE,
+    poll: Annotated[
+        bool,
+        Option("--poll", help="Poll for changes instead of using inotify."),
+    ] = False,
+):
+    """
+    Watch pyproject.toml, uv.lock and the project tree. Configuration changes
+    regenerate only the runs whose inputs changed, dependency changes regenerate
+    every selected run, and the command is rerun after every change.
+    """
+    config_file: t.Optional[Path] = ctx.obj["config_path"] or find_config()
+    assert config_file, "No configuration file found."
+    session = WatchSession(
+        config_file=config_file,
+        command=" ".join(trailing_args),
+        pinned=[ident(run) for run in runs or []],
+        environments={name(env) for env in envs},
+        tags=set(tags),
+        report=echo,
+    )
+    source = watcher(
+        session.cfg.project_dir.absolute(),
+        exclude=session.outputs,
+        patterns=session.cfg.watch_exclude,
+        poll=poll,
+    )
+    echo(f"Watching {session.cfg.project_dir} with {type(source).__name__}")
+    rewrites = Rewrites()
+    started = time.time()
+    session.execute(session.selected())
+    try:
+        while True:
+            # edits saved while the command ran trigger the next rerun, files the
+            # command rewrote with the same content do not
+            changes = rewrites.edited(drain(source), started)
+            if not changes:
+                changes = debounce(source, delay)
+            echo(f"{len(changes)} files changed")
+            generated, rerun = session.handle(changes)
+            if generated:
+                echo(f"Regenerated {len(generated)} runs")
+            started = time.time()
+            session.execute(rerun)
+    except KeyboardInterrupt:
+        pass
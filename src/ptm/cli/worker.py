@@ -0,0 +1,46 @@
+import typing as t
+
+from typer import Argument, Context, Option, Typer, echo
+from typing_extensions import Annotated
+
+from ..config import Config
+from ..coordinator import parse_address, work
+
+app = Typer(help="Execute runs handed out by a ptm coordinator.")
+
+
+@app.command()
+def worker(
+    ctx: Context,
+    trailing_args: Annotated[t.List[str], Argument(metavar="--")],
+    connect: Annotated[
+        str,
+        Option("--connect", help="The host:port of the coordinator."),
+    ],
+    token: Annotated[
+        str,
+        Option(
+            "--token",
+            envvar="PTM_COORDINATOR_TOKEN",
+            help="The secret printed by the coordinator.",
+        ),
+    ],
+    worker_name: Annotated[
+        t.Optional[str],
+        Option("--name", help="A unique name for this worker."),
+    ] = None,
+):
+    """
+    Pull runs from the coordinator, bootstrap them in this checkout and execute the
+    command in them until the coordinator's queue is drained. The coordinator must
+    distribute the same command.
+    """
+    cfg: Config = ctx.obj["config"]
+    executed = work(
+        cfg,
+        parse_address(connect),
+        " ".join(trailing_args),
+        token,
+        name=worker_name,
+    )
+    echo(f"Executed {executed} runs")
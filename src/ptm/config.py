@@ -1,11 +1,12 @@
 import hashlib
 import itertools
+import math
 import os
 import shutil
 import sys
 import typing as t
 import warnings
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
 from dataclasses import dataclass, field
 from enum import Enum
 from functools import cached_property
@@ -13,18 +14,21 @@ from pathlib import Path
 from platform import platform
 
 import requests
-import tomlkit
 from dotenv import dotenv_values
 from packaging.markers import Marker
 from packaging.requirements import InvalidRequirement, Requirement
 from packaging.specifiers import InvalidSpecifier, SpecifierSet
 from packaging.utils import NormalizedName, canonicalize_name
 from packaging.version import InvalidVersion, parse
-from tomlkit.container import Container
-from tomlkit.items import String, Table
 
 from . import __version__ as ptm_version
+from . import toml
+from .cache import DEFAULT_RESOLUTION_TTL, ResolutionCache
+from .covering import covering_array, parse_expansion
 from .drivers import GenerationFailed
+from .index import DEFAULT_INDEX_TTL, DEFAULT_INDEX_URL, PackageIndex
+from .lock import Lock
+from .usage import UsageLedger, parse_size
 
 ID_LENGTH = 12
 
@@ -264,7 +268,13 @@ class Run:
             return self.venv / "Scripts" / "python"
         return self.venv / "bin" / "python"
 
-    def generate(self) -> "Run":
+    @property
+    def locked(self) -> bool:
+        """True if the run's requirements are in the configured lock file."""
+        lock = self.group.env.cfg.lock
+        return lock is not None and self.ident in lock.runs
+
+    def write_env(self):
         os.makedirs(self.directory, exist_ok=True)
         self.env_file.write_text(
             "\n".join(
@@ -272,20 +282,40 @@ class Run:
                 for key, val in {**self.setenv, "PTM_RUN": self.directory}.items()
             )
         )
+
+    def generate(self) -> "Run":
+        self.write_env()
         try:
-            self.group.env.cfg.driver.generate(self)
+            with self.group.env.cfg.deferred_lock():
+                self.group.env.cfg.driver.generate(self)
         except GenerationFailed as gf:
             print(gf)
             sys.exit(1)
         return self
 
+    def prepare(self):
+        """
+        Make sure the run's env file exists, generating the run if it is not locked.
+        """
+        if not self.env_file.is_file():
+            if self.locked:
+                self.write_env()
+            else:
+                self.generate()
+
+    def touch(self):
+        """
+        Record the use of the run's venv for garbage collection.
+        """
+        self.group.env.cfg.usage.touch(self.venv)
+
     @contextmanager
     def bootstrap(self, revert: bool = True):
-        if not self.env_file.is_file():
-            self.generate()
+        self.prepare()
         current = dict(os.environ.copy())
         run_env = {**current, **dotenv_values(self.env_file)}
         with self.group.env.cfg.driver.bootstrap(self):
+            self.touch()
             try:
                 for key, value in run_env.items():
                     if value is not None:
@@ -305,7 +335,7 @@ class Run:
 @dataclass
 class RunGroup:
     env: "Environment"
-    matrix: t.Dict[str, t.List[str]]
+    matrix: t.Dict[str, t.Union[str, t.List[str], t.Dict[str, t.Any]]]
     strategy: t.Optional[ResolutionStrategy] = None
     setenv: t.Dict[str, str] = field(default_factory=dict)
     tags: t.List[str] = field(default_factory=list)
@@ -313,25 +343,64 @@ class RunGroup:
     extras: t.List[str] = field(default_factory=list)
     markers: t.List[Marker] = field(default_factory=list)
     lineno: t.Optional[int] = None
+    expansion: t.Optional[str] = None
+    include: t.List[t.Dict[str, str]] = field(default_factory=list)
 
     runs: t.List[Run] = field(default_factory=list)
 
     def __post_init__(self):
         self.expand()
 
+    @cached_property
+    def parameters(self) -> t.Dict[str, t.List[str]]:
+        """
+        The candidate values of each matrix parameter. Dynamic version ranges (e.g.
+        ``{range = ">=4.2", per = "minor"}``) are resolved against the package index.
+        """
+        parameters: t.Dict[str, t.List[str]] = {}
+        for pkg, spec in self.matrix.items():
+            if isinstance(spec, str):
+                parameters[pkg] = [spec]
+            elif isinstance(spec, dict):
+                assert pkg != "python", "python versions can not be a dynamic range."
+                parameters[pkg] = [
+                    f"=={version}"
+                    for version in self.env.cfg.index.versions(
+                        pkg,
+                        specifier=spec.get("range", ""),
+                        per=spec.get("per", None),
+                        prereleases=spec.get("include-prereleases", False),
+                    )
+                ]
+                if not parameters[pkg]:
+                    warnings.warn(
+                        f"No versions of {pkg} in {self.env.name} satisfy {spec}."
+                    )
+            else:
+                assert spec, f"`{pkg}` in {self.env.name} has no values."
+                parameters[pkg] = list(spec)
+        return parameters
+
+    @property
+    def product_size(self) -> int:
+        """The number of runs in the full product of this group's matrix."""
+        return math.prod(len(values) for values in self.parameters.values())
+
     def expand(self) -> t.List[Run]:
         assert "python" in self.matrix, (
             "`ptm.env.matrix` entries must include `python`."
         )
-        expanded = [
-            dict(zip(list(self.matrix.keys()), spec))
-            for spec in itertools.product(
-                *(
-                    [spec] if isinstance(spec, str) else spec  # type: ignore
-                    for spec in self.matrix.values()
-                )
-            )
-        ]
+        strength = parse_expansion(self.expansion)
+        assert strength or not self.include, (
+            f"`-include` in {self.env.name} requires a pairwise or n-wise `-expand`."
+        )
+        if strength:
+            expanded = covering_array(self.parameters, strength, self.include)
+        else:
+            expanded = [
+                dict(zip(list(self.parameters.keys()), spec))
+                for spec in itertools.product(*self.parameters.values())
+            ]
         for idx, run in enumerate(expanded):
             try:
                 self.runs.append(
@@ -353,7 +422,11 @@ class RunGroup:
         return self.runs
 
     @staticmethod
-    def from_toml(env: "Environment", run_group: Table) -> "RunGroup":
+    def from_toml(
+        env: "Environment",
+        run_group: t.Dict[str, t.Any],
+        lineno: t.Optional[int] = None,
+    ) -> "RunGroup":
         return RunGroup(
             env=env,
             matrix={
@@ -362,9 +435,11 @@ class RunGroup:
             **{
                 param.lstrip("-"): value
                 for param, value in run_group.items()
-                if param.startswith("-") and param != "-markers"
+                if param.startswith("-") and param not in ("-markers", "-expand")
             },
             markers=[Marker(marker) for marker in run_group.get("-markers", [])],
+            expansion=run_group.get("-expand", None),
+            lineno=lineno,
         )
 
     def generate(self, tags: t.Set[str] = set()) -> t.Generator[Run, None, None]:
@@ -406,12 +481,18 @@ class Environment:
 
     @staticmethod
     def from_toml(
-        name: str, cfg: "Config", env: t.Union[Container, Table, String]
+        name: str,
+        cfg: "Config",
+        env: t.Union[str, t.Dict[str, t.Any]],
+        linenos: t.Sequence[int] = (),
     ) -> "Environment":
-        if isinstance(env, String):
+        """
+        :param linenos: the line of each matrix entry in the configuration file
+        """
+        if isinstance(env, str):
             resp = requests.get(env)
             resp.raise_for_status()
-            env = tomlkit.parse(resp.text)
+            env, linenos = toml.loads(resp.text), ()
         parsed_env = Environment(
             name=name,
             cfg=cfg,
@@ -422,8 +503,12 @@ class Environment:
                 if param in env
             },
         )
+        matrix = env.get("matrix", [])
+        if len(linenos) != len(matrix):
+            linenos = [None] * len(matrix)  # type: ignore
         parsed_env.matrix = [
-            RunGroup.from_toml(parsed_env, run) for run in env.get("matrix", [])
+            RunGroup.from_toml(parsed_env, run, lineno=lineno)
+            for run, lineno in zip(matrix, linenos)
         ]
         return parsed_env
 
@@ -438,6 +523,22 @@ class Config:
     groups: t.List[str] = field(default_factory=lambda: ["dev"])
     extras: t.List[str] = field(default_factory=list)
     aliases: t.Dict[str, str] = field(default_factory=dict)
+    templates: bool = False
+    lockfile: t.Optional[str] = None
+    # the size budget of the ptm directory, e.g. "10GB"
+    cache_max_size: t.Optional[t.Union[str, int]] = None
+    index_url: str = DEFAULT_INDEX_URL
+    index_ttl: int = DEFAULT_INDEX_TTL
+    # cache resolutions across checkouts, see ptm.cache
+    resolution_cache: bool = True
+    resolution_ttl: int = DEFAULT_RESOLUTION_TTL
+    offline: bool = False
+    # tags whose runs ptm plan always selects, see ptm.plan
+    plan_require: t.List[str] = field(default_factory=lambda: ["lowest"])
+    # glob patterns of files ptm watch ignores, e.g. generated sources
+    watch_exclude: t.List[str] = field(default_factory=list)
+    # the project's requires-python specifier
+    requires_python: t.Optional[str] = None
     environments: t.Dict[str, Environment] = field(default_factory=dict)
 
     # maps tags to runs
@@ -452,8 +553,65 @@ class Config:
     def directory(self) -> Path:
         return self.project_dir / self.dot_dir
 
+    @cached_property
+    def lock(self) -> t.Optional[Lock]:
+        """
+        The consolidated lock file of all runs, if ``lockfile`` is configured.
+        """
+        if not self.lockfile:
+            return None
+        return Lock.load(self.project_dir / self.lockfile)
+
+    def deferred_lock(self) -> t.ContextManager[t.Optional[Lock]]:
+        """
+        Save the lock file once when the block exits rather than for every run
+        generated in it.
+        """
+        return self.lock.deferred() if self.lock is not None else nullcontext()
+
+    @cached_property
+    def usage(self) -> UsageLedger:
+        return UsageLedger(self.directory)
+
+    @property
+    def max_cache_size(self) -> t.Optional[int]:
+        """The ``cache_max_size`` budget in bytes."""
+        if self.cache_max_size is None:
+            return None
+        return parse_size(self.cache_max_size)
+
+    @cached_property
+    def resolutions(self) -> t.Optional[ResolutionCache]:
+        """
+        The user level resolution cache, None if disabled by ``resolution_cache``
+        or ``PTM_NO_RESOLUTION_CACHE``.
+        """
+        if not self.resolution_cache or os.environ.get(
+            "PTM_NO_RESOLUTION_CACHE", ""
+        ).lower() not in ("", "0", "false"):
+            return None
+        return ResolutionCache(ttl=self.resolution_ttl)
+
+    @cached_property
+    def index(self) -> PackageIndex:
+        return PackageIndex(
+            url=self.index_url,
+            ttl=self.index_ttl,
+            offline=self.offline
+            or os.environ.get("PTM_OFFLINE", "").lower() not in ("", "0", "false"),
+        )
+
     @staticmethod
-    def from_toml(config_path: Path, doc: tomlkit.TOMLDocument) -> "Config":
+    def from_toml(
+        config_path: Path,
+        doc: t.Dict[str, t.Any],
+        linenos: t.Optional[t.Dict[str, t.List[int]]] = None,
+    ) -> "Config":
+        """
+        :param doc: the parsed pyproject.toml
+        :param linenos: the line numbers of each environment's matrix entries, see
+            :func:`ptm.toml.matrix_lines`
+        """
         tool = doc.get("tool", None)
         assert tool and isinstance(tool, dict), "`tool.ptm` must be configured."
         section = tool["ptm"]
@@ -464,6 +622,7 @@ class Config:
             driver["driver"] = get_driver(section["driver"])
         cfg = Config(
             project_dir=config_path.parent,
+            requires_python=doc.get("project", {}).get("requires-python", None),
             **{  # type: ignore
                 param: section[param]
                 for param in [
@@ -473,6 +632,16 @@ class Config:
                     "extras",
                     "groups",
                     "aliases",
+                    "templates",
+                    "lockfile",
+                    "cache_max_size",
+                    "index_url",
+                    "index_ttl",
+                    "resolution_cache",
+                    "resolution_ttl",
+                    "offline",
+                    "plan_require",
+                    "watch_exclude",
                 ]
                 if param in section
             },
@@ -482,16 +651,28 @@ class Config:
         assert "env" in section and isinstance(section["env"], dict), (
             "`tool.ptm.env` must be configured correctly."
         )
-        for env_name, env in t.cast(Table, section["env"]).items():
-            cfg.environments[env_name] = Environment.from_toml(env_name, cfg, env)
+        # fetch the index metadata of all dynamic version ranges concurrently
+        cfg.index.prefetch(
+            pkg
+            for env in section["env"].values()
+            if isinstance(env, dict)
+            for run_group in env.get("matrix", [])
+            for pkg, spec in run_group.items()
+            if not pkg.startswith("-") and isinstance(spec, dict)
+        )
+        for env_name, env in section["env"].items():
+            cfg.environments[env_name] = Environment.from_toml(
+                env_name, cfg, env, linenos=(linenos or {}).get(env_name, ())
+            )
         return cfg
 
     def generate(
         self, environments: t.Set[str] = set(), tags: t.Set[str] = set()
     ) -> t.Generator[Run, None, None]:
-        for name, env in self.environments.items():
-            if not environments or name in environments:
-                yield from env.generate(tags=tags)
+        with self.deferred_lock():
+            for name, env in self.environments.items():
+                if not environments or name in environments:
+                    yield from env.generate(tags=tags)
 
     def runs(
         self, environments: t.Set[str] = set(), tags: t.Set[str] = set()
@@ -508,7 +689,8 @@ def initialize(cfg_file: t.Optional[Path] = None) -> Config:
     config = cfg_file or find_config()
     if config is None or not config.exists():
         raise ValueError("No configuration file found.")
-    cfg = Config.from_toml(config, tomlkit.parse(config.read_text()))
+    text = config.read_text()
+    cfg = Config.from_toml(config, toml.loads(text), toml.matrix_lines(text))
     os.makedirs(cfg.directory, exist_ok=True)
     return cfg
 
@@ -0,0 +1,370 @@
+"""
+Distributed execution of a command across runs, pulled from a shared queue.
+
+``ptm coordinator`` holds the queue of run identifiers and records the results. Any
+number of ``ptm worker --connect host:port`` processes, on this machine or others
+with the same checkout, pull one run at a time, bootstrap and execute it locally and
+stream back its log lines and timings. Faster workers simply pull more runs. A run
+in flight on a worker that disconnects or stops sending heartbeats is requeued at
+the front of the queue.
+
+Workers authenticate with the coordinator's token, and only execute the command
+they were started with, so neither side can be made to run another command.
+
+The protocol is newline delimited JSON over a TCP connection per worker::
+
+    -> {"op": "hello", "worker": name, "token": ...}
+                                                <- {"command": ...} or {"error": ...}
+    -> {"op": "next"}                           <- {"run": ident} or {"done": true}
+    -> {"op": "log", "lines": [...]}            (also a heartbeat, no reply)
+    -> {"op": "result", "exit_code": ..., ...}  (no reply)
+"""
+
+import hmac
+import json
+import os
+import secrets
+import socket
+import socketserver
+import threading
+import time
+import typing as t
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from dotenv import dotenv_values
+
+from .config import Config, Run
+from .plan import estimates
+from .results import Result, ResultStore, execute, lock_hash, record_result
+from .venv import environment
+
+# seconds between heartbeats from a worker running a command
+HEARTBEAT_INTERVAL = 2.0
+# seconds without a message after which a worker is presumed dead
+HEARTBEAT_TIMEOUT = 30.0
+# the number of log lines reported with a failed result
+TAIL_LINES = 20
+
+RUN_LOG = "run.log"
+
+
+class CoordinatorError(Exception):
+    pass
+
+
+def parse_address(address: str) -> t.Tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    assert host and port.isdigit(), f"Expected host:port, got {address}."
+    return host.strip("[]"), int(port)
+
+
+def longest_first(runs: t.Iterable[Run], store: ResultStore) -> t.List[Run]:
+    """
+    Order the runs by their last recorded duration, longest first. Runs without a
+    recorded result are assumed to take the average time.
+    """
+    runs = list(runs)
+    durations = estimates(runs, store)
+    return sorted(runs, key=lambda run: durations[run.ident], reverse=True)
+
+
+@dataclass
+class Coordinator:
+    runs: t.List[Run]
+    command: str
+    store: t.Optional[ResultStore] = None
+    report: t.Callable[[str], None] = print
+    heartbeat_timeout: float = HEARTBEAT_TIMEOUT
+    # the secret workers authenticate with
+    token: str = field(default_factory=lambda: secrets.token_urlsafe(16))
+
+    queue: t.Deque[str] = field(init=False)
+    # maps worker names to the run they are executing
+    in_flight: t.Dict[str, str] = field(default_factory=dict, init=False)
+    # maps worker names to the time their run was handed out
+    started: t.Dict[str, float] = field(default_factory=dict, init=False)
+    results: t.Dict[str, Result] = field(default_factory=dict, init=False)
+    requeued: int = field(default=0, init=False)
+    finished: threading.Event = field(default_factory=threading.Event, init=False)
+    _condition: threading.Condition = field(
+        default_factory=threading.Condition, init=False, repr=False
+    )
+
+    def __post_init__(self):
+        self.table = {run.ident: run for run in self.runs}
+        self.queue = deque(self.table)
+        if not self.queue:
+            self.finished.set()
+
+    @property
+    def failed(self) -> t.List[Result]:
+        return [result for result in self.results.values() if not result.passed]
+
+    def next(self, worker: str) -> t.Optional[str]:
+        """
+        The next run for the worker, None once every run has a result. Blocks while
+        the queue is empty but runs in flight elsewhere may still be requeued.
+        """
+        with self._condition:
+            while not self.queue:
+                if not self.in_flight:
+                    return None
+                self._condition.wait()
+            ident = self.queue.popleft()
+            self.in_flight[worker] = ident
+            self.started[worker] = time.time()
+        self.report(f"{worker}: {self.table[ident]} started")
+        return ident
+
+    def authenticate(self, token: t.Any) -> bool:
+        return isinstance(token, str) and hmac.compare_digest(
+            token.encode(), self.token.encode()
+        )
+
+    def log(self, worker: str, lines: t.List[str]):
+        ident = self.in_flight.get(worker)
+        for line in lines:
+            self.report(f"{worker} [{ident}] {line}")
+
+    def complete(self, worker: str, message: t.Dict[str, t.Any]) -> Result:
+        with self._condition:
+            ident = self.in_flight.pop(worker)
+            run = self.table[ident]
+            result = self.results[ident] = record_result(
+                self.store,
+                run,
+                self.command,
+                message["exit_code"],
+                lock_hash=message.get("lock_hash"),
+                bootstrap_time=message.get("bootstrap_time"),
+                command_time=message.get("command_time"),
+                peak_rss=message.get("peak_rss"),
+                started=self.started.pop(worker, None),
+            )
+            if not self.queue and not self.in_flight:
+                self.finished.set()
+            self._condition.notify_all()
+        if not result.passed:
+            for line in message.get("tail", []):
+                self.report(f"{worker} [{ident}] {line}")
+        status = "passed" if result.passed else f"FAILED ({result.exit_code})"
+        elapsed = (result.bootstrap_time or 0) + (result.command_time or 0)
+        self.report(f"{worker}: {run} {status} in {elapsed:.1f}s")
+        return result
+
+    def lost(self, worker: str):
+        """
+        Requeue the run in flight on a worker that disconnected.
+        """
+        with self._condition:
+            ident = self.in_flight.pop(worker, None)
+            self.started.pop(worker, None)
+            if ident is None:
+                return
+            self.queue.appendleft(ident)
+            self.requeued += 1
+            self._condition.notify_all()
+        self.report(f"{worker}: lost, requeued {self.table[ident]}")
+
+
+class CoordinatorHandler(socketserver.StreamRequestHandler):
+    server: "CoordinatorServer"
+
+    def send(self, message: t.Dict[str, t.Any]):
+        self.wfile.write(json.dumps(message).encode() + b"\n")
+        self.wfile.flush()
+
+    def handle(self):
+        coordinator = self.server.coordinator
+        self.request.settimeout(coordinator.heartbeat_timeout)
+        worker = "{}:{}".format(*self.client_address)
+        authenticated = False
+        try:
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                message = json.loads(line)
+                op = message.pop("op")
+                if op == "hello":
+                    if not coordinator.authenticate(message.get("token")):
+                        coordinator.report(f"{worker}: refused, invalid token")
+                        self.send({"error": "Invalid coordinator token."})
+                        return
+                    authenticated = True
+                    worker = message.get("worker") or worker
+                    self.send({"command": coordinator.command})
+                elif not authenticated:
+                    return
+                elif op == "next":
+                    ident = coordinator.next(worker)
+                    self.send({"run": ident} if ident else {"done": True})
+                    if ident is None:
+                        return
+                elif op == "log":
+                    coordinator.log(worker, message["lines"])
+                elif op == "result":
+                    coordinator.complete(worker, message)
+        except (OSError, ValueError, KeyError):
+            pass
+        finally:
+            coordinator.lost(worker)
+
+
+class CoordinatorServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address: t.Tuple[str, int], coordinator: Coordinator):
+        self.coordinator = coordinator
+        super().__init__(address, CoordinatorHandler)
+
+
+def _read_lines(log: Path, offset: int) -> t.Tuple[t.List[str], int]:
+    """
+    The complete lines written to the log since offset, and the new offset.
+    """
+    if not log.is_file():
+        return [], offset
+    with open(log, "rb") as stream:
+        stream.seek(offset)
+        data = stream.read()
+    end = data.rfind(b"\n") + 1
+    lines = data[:end].decode(errors="replace").splitlines()
+    return lines, offset + end
+
+
+def _tail(log: Path) -> t.List[str]:
+    if not log.is_file():
+        return []
+    return log.read_text(errors="replace").splitlines()[-TAIL_LINES:]
+
+
+def execute_run(
+    cfg: Config,
+    ident: str,
+    command: str,
+    stream: t.Callable[[t.List[str]], None],
+    interval: float = HEARTBEAT_INTERVAL,
+) -> t.Dict[str, t.Any]:
+    """
+    Bootstrap the run and execute the command in it, passing new lines of its output
+    to stream every interval seconds. Returns the result message for the coordinator.
+    """
+    run = cfg.id_table.get(ident)
+    if run is None:
+        return {
+            "exit_code": 1,
+            "tail": [f"{ident} is not a run of {cfg.project_dir}"],
+        }
+    os.makedirs(run.directory, exist_ok=True)
+    log = run.directory / RUN_LOG
+    log.unlink(missing_ok=True)
+    stop = threading.Event()
+
+    def follow():
+        offset = 0
+        while True:
+            stopped = stop.wait(interval)
+            lines, offset = _read_lines(log, offset)
+            # an empty list is a heartbeat
+            stream(lines)
+            if stopped:
+                return
+
+    follower = threading.Thread(target=follow, daemon=True)
+    follower.start()
+    start = time.perf_counter()
+    message: t.Dict[str, t.Any]
+    try:
+        run.prepare()
+        with cfg.driver.bootstrap(run):
+            run.touch()
+            bootstrap_time = time.perf_counter() - start
+            exit_code, command_time, peak_rss = execute(
+                command,
+                env=environment(run.venv, dotenv_values(run.env_file)),
+                log=log,
+            )
+        message = {
+            "exit_code": exit_code,
+            "bootstrap_time": bootstrap_time,
+            "command_time": command_time,
+            "peak_rss": peak_rss,
+            "lock_hash": lock_hash(run),
+        }
+    except (Exception, SystemExit) as err:
+        with open(log, "a") as output:
+            output.write(f"\n{type(err).__name__}: {err}\n")
+        message = {
+            "exit_code": 1,
+            "bootstrap_time": time.perf_counter() - start,
+        }
+    finally:
+        stop.set()
+        follower.join()
+    return {**message, "tail": _tail(log)}
+
+
+def work(
+    cfg: Config,
+    address: t.Tuple[str, int],
+    command: str,
+    token: str,
+    name: t.Optional[str] = None,
+    interval: float = HEARTBEAT_INTERVAL,
+) -> int:
+    """
+    Pull runs from the coordinator and execute them until its queue is drained.
+
+    :param cfg: the configuration of this worker's checkout
+    :param address: the coordinator's host and port
+    :param command: the command to execute, which must be the coordinator's
+    :param token: the coordinator's token
+    :param name: the unique name of this worker, by default its host and pid
+    :param interval: the seconds between log updates and heartbeats
+    :return: the number of runs executed
+    :raises CoordinatorError: if the coordinator refuses the token or distributes
+        another command
+    """
+    name = name or f"{socket.gethostname()}:{os.getpid()}"
+    lock = threading.Lock()
+    with socket.create_connection(address) as sock, sock.makefile("rwb") as conn:
+
+        def send(message: t.Dict[str, t.Any]):
+            with lock:
+                conn.write(json.dumps(message).encode() + b"\n")
+                conn.flush()
+
+        def receive() -> t.Dict[str, t.Any]:
+            line = conn.readline()
+            if not line:
+                raise ConnectionError(f"The coordinator at {address} disconnected.")
+            return json.loads(line)
+
+        send({"op": "hello", "worker": name, "token": token})
+        reply = receive()
+        if "error" in reply:
+            raise CoordinatorError(reply["error"])
+        if reply["command"] != command:
+            raise CoordinatorError(
+                f"The coordinator distributes `{reply['command']}`, "
+                f"this worker executes `{command}`."
+            )
+        executed = 0
+        while True:
+            send({"op": "next"})
+            reply = receive()
+            if reply.get("done"):
+                return executed
+            result = execute_run(
+                cfg,
+                reply["run"],
+                command,
+                lambda lines: send({"op": "log", "lines": lines}),
+                interval=interval,
+            )
+            send({"op": "result", **result})
+            executed += 1
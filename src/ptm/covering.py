@@ -0,0 +1,111 @@
+"""
+Deterministic greedy construction of t-way covering arrays.
+
+A covering array of strength t over a set of parameters is a list of rows such that
+every combination of values of any t parameters appears in at least one row. For
+strength 2 (pairwise) this is usually a small fraction of the full product.
+"""
+
+import itertools
+import typing as t
+
+# a t-tuple of (parameter index, value index) pairs
+Interaction = t.Tuple[t.Tuple[int, int], ...]
+
+
+def parse_expansion(expansion: t.Optional[str]) -> t.Optional[int]:
+    """
+    Parse an ``-expand`` option into a covering strength. Returns None for the full
+    product.
+
+    :param expansion: "product", "pairwise" or "n-wise:<strength>"
+    """
+    if expansion in (None, "product"):
+        return None
+    if expansion == "pairwise":
+        return 2
+    if expansion.startswith("n-wise:"):
+        try:
+            strength = int(expansion.split(":", 1)[1])
+        except ValueError:
+            strength = 0
+        if strength > 0:
+            return strength
+    raise ValueError(
+        f"Invalid expansion: {expansion}, expected product, pairwise or n-wise:<n>"
+    )
+
+
+def _interactions(
+    row: t.Dict[int, int], strength: int, param: int, value: int
+) -> t.Generator[Interaction, None, None]:
+    """
+    Yield the interactions introduced by assigning value to param in the row.
+    """
+    for others in itertools.combinations(sorted(row.items()), strength - 1):
+        yield tuple(sorted((*others, (param, value))))
+
+
+def covering_array(
+    parameters: t.Dict[str, t.List[str]],
+    strength: int = 2,
+    include: t.Sequence[t.Dict[str, str]] = (),
+) -> t.List[t.Dict[str, str]]:
+    """
+    Build a covering array of the given strength. The construction is deterministic
+    for a given parameter order so repeated expansions yield the same rows.
+
+    :param parameters: the ordered parameter names and their candidate values
+    :param strength: the number of parameters whose value combinations must all be
+        covered
+    :param include: combinations that must appear in the array, parameters left out
+        of an inclusion are filled to maximize coverage
+    :return: the rows of the covering array as parameter -> value mappings
+    """
+    names = list(parameters.keys())
+    values = [list(dict.fromkeys(parameters[name])) for name in names]
+    if strength >= len(names):
+        return [dict(zip(names, row)) for row in itertools.product(*values)]
+
+    uncovered: t.Set[Interaction] = set()
+    for params in itertools.combinations(range(len(names)), strength):
+        for combination in itertools.product(*(range(len(values[p])) for p in params)):
+            uncovered.add(tuple(zip(params, combination)))
+
+    def fill(row: t.Dict[int, int]) -> t.Dict[int, int]:
+        for param in range(len(names)):
+            if param in row:
+                continue
+            row[param] = max(
+                range(len(values[param])),
+                key=lambda value: (
+                    sum(
+                        1
+                        for interaction in _interactions(row, strength, param, value)
+                        if interaction in uncovered
+                    ),
+                    -value,
+                ),
+            )
+        for params in itertools.combinations(range(len(names)), strength):
+            uncovered.discard(tuple((param, row[param]) for param in params))
+        return row
+
+    rows: t.List[t.Dict[int, int]] = []
+    for inclusion in include:
+        row = {}
+        for name, value in inclusion.items():
+            if name not in names or value not in values[names.index(name)]:
+                raise ValueError(
+                    f"Included combination {inclusion} is not in the matrix."
+                )
+            row[names.index(name)] = values[names.index(name)].index(value)
+        rows.append(fill(row))
+
+    while uncovered:
+        rows.append(fill(dict(min(uncovered))))
+
+    unique = dict.fromkeys(tuple(sorted(row.items())) for row in rows)
+    return [
+        {names[param]: values[param][value] for param, value in row} for row in unique
+    ]
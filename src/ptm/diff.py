@@ -0,0 +1,147 @@
+import subprocess
+import typing as t
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from . import toml
+from .config import Config, Run
+
+
+def inputs(run: Run) -> t.Dict[str, t.Any]:
+    """
+    The resolved inputs of a run that are compared when diffing configurations.
+    """
+    return {
+        "python": run.python,
+        "dependencies": [str(dep) for dep in run.dependencies],
+        "strategy": str(run.strategy) if run.strategy else None,
+        "setenv": {
+            key: val for key, val in run.setenv.items() if not key.startswith("PTM_")
+        },
+        "groups": sorted(run.groups),
+        "extras": sorted(run.extras),
+        "markers": sorted(str(marker) for marker in run.markers),
+        "tags": sorted(run.tags),
+    }
+
+
+def coordinates(run: Run) -> t.Tuple[str, ...]:
+    """
+    The position of a run in its environment's matrix.
+    """
+    return (
+        run.group.env.name,
+        run.python,
+        *(str(dep) for dep in run.dependencies),
+    )
+
+
+@dataclass
+class RunChange:
+    old: Run
+    new: Run
+    fields: t.Dict[str, t.Tuple[t.Any, t.Any]]
+
+    def __str__(self):
+        changes = "; ".join(
+            f"{name}: {old} -> {new}" for name, (old, new) in self.fields.items()
+        )
+        return (
+            f"[{self.old.ident} -> {self.new.ident}] "
+            f"{self.new.slug.rstrip()} ({changes})"
+        )
+
+
+@dataclass
+class ConfigDiff:
+    added: t.List[Run] = field(default_factory=list)
+    removed: t.List[Run] = field(default_factory=list)
+    changed: t.List[RunChange] = field(default_factory=list)
+    # runs whose tags changed but whose resolved inputs did not
+    retagged: t.List[RunChange] = field(default_factory=list)
+
+    @property
+    def affected(self) -> t.List[Run]:
+        """The runs in the new configuration that must be re-run."""
+        return [*self.added, *(change.new for change in self.changed)]
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed or self.retagged)
+
+
+def diff(old: Config, new: Config) -> ConfigDiff:
+    """
+    Compare the expanded runs of two configurations. Runs are matched by ident,
+    and runs whose idents differ are matched by their matrix coordinates and
+    reported as changed with the differing input fields.
+    """
+    result = ConfigDiff()
+    old_unmatched: t.Dict[t.Tuple[str, ...], t.List[Run]] = {}
+    new_unmatched: t.List[Run] = []
+    for ident, run in old.id_table.items():
+        if ident not in new.id_table:
+            old_unmatched.setdefault(coordinates(run), []).append(run)
+
+    for ident, run in new.id_table.items():
+        if ident in old.id_table:
+            # tags do not contribute to the ident
+            old_tags = sorted(old.id_table[ident].tags)
+            if old_tags != sorted(run.tags):
+                result.retagged.append(
+                    RunChange(
+                        old=old.id_table[ident],
+                        new=run,
+                        fields={"tags": (old_tags, sorted(run.tags))},
+                    )
+                )
+        else:
+            new_unmatched.append(run)
+
+    for run in new_unmatched:
+        candidates = old_unmatched.get(coordinates(run), [])
+        if not candidates:
+            result.added.append(run)
+            continue
+        previous = candidates.pop(0)
+        old_inputs, new_inputs = inputs(previous), inputs(run)
+        result.changed.append(
+            RunChange(
+                old=previous,
+                new=run,
+                fields={
+                    name: (old_inputs[name], new_inputs[name])
+                    for name in new_inputs
+                    if old_inputs[name] != new_inputs[name]
+                },
+            )
+        )
+
+    for remaining in old_unmatched.values():
+        result.removed.extend(remaining)
+    return result
+
+
+def load(source: str, cfg_file: Path) -> Config:
+    """
+    Load a configuration from a pyproject.toml path or from a git revision of the
+    given configuration file. Revisions may name a file with rev:path.
+    """
+    if Path(source).is_file():
+        path = Path(source).absolute()
+        text = path.read_text()
+        return Config.from_toml(path, toml.loads(text), toml.matrix_lines(text))
+    rev, _, path_str = source.partition(":")
+    path = Path(path_str) if path_str else Path(cfg_file.name)
+    try:
+        text = subprocess.run(
+            ["git", "show", f"{rev}:./{path.as_posix()}"],
+            cwd=cfg_file.parent,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+    except subprocess.CalledProcessError as err:
+        raise ValueError(
+            f"{source} is not a file or a git revision: {err.stderr.strip()}"
+        ) from err
+    return Config.from_toml(cfg_file, toml.loads(text), toml.matrix_lines(text))
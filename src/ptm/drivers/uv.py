@@ -1,17 +1,118 @@
+import hashlib
 import os
+import platform
+import shlex
+import shutil
 import subprocess
+import sys
+import typing as t
 from contextlib import contextmanager
+from functools import lru_cache
 from itertools import chain
+from pathlib import Path
 
+from .. import toml
+from ..cache import resolution_key
 from ..config import Run
+from ..lock import LockedRun, exclusive, requirement_lines
+from ..pack import LOCK_HASH_FILE, UNPACKED_FILE, mark_installed, restored
+from ..results import lock_hash
+from ..venv import clone_tree, relocate
 from . import GenerationFailed
 
 
+def install_args(requirements: t.Iterable[str]) -> t.List[str]:
+    """
+    Convert compiled requirement lines into uv pip install arguments.
+    """
+    args: t.List[str] = []
+    for line in requirements:
+        args.extend(shlex.split(line) if line.startswith("-") else [line])
+    return args
+
+
+def local_requirements(requirements: t.Iterable[str]) -> t.List[str]:
+    """
+    The requirement lines installed from a local directory or file, e.g. an
+    editable install of the project.
+    """
+    return [
+        line
+        for line in requirements
+        if line.startswith(("-e", "--editable", ".", "/", "file:")) or "@ file:" in line
+    ]
+
+
+# UV_* variables that do not change what uv resolves
+UV_LOCAL_SETTINGS = {
+    "UV_CACHE_DIR",
+    "UV_CONCURRENT_BUILDS",
+    "UV_CONCURRENT_DOWNLOADS",
+    "UV_CONCURRENT_INSTALLS",
+    "UV_LINK_MODE",
+    "UV_NO_PROGRESS",
+    "UV_PYTHON_INSTALL_DIR",
+    "UV_TOOL_DIR",
+}
+
+
+@lru_cache(maxsize=None)
+def uv_version() -> str:
+    try:
+        return subprocess.run(
+            ["uv", "--version"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def uv_settings(project_dir: Path) -> t.Dict[str, t.Any]:
+    """
+    The uv settings that may change a resolution: the UV_* environment variables,
+    the project's ``[tool.uv]`` table and the contents of the uv.toml files uv
+    reads. Variables may hold credentials, but only the hash of the resolution
+    inputs is stored.
+    """
+    config_home = Path(os.environ.get("XDG_CONFIG_HOME") or Path.home() / ".config")
+    files = [
+        project_dir / "uv.toml",
+        config_home / "uv" / "uv.toml",
+        *(
+            Path(directory) / "uv" / "uv.toml"
+            for directory in os.environ.get("XDG_CONFIG_DIRS", "/etc/xdg").split(":")
+        ),
+        Path("/etc/uv/uv.toml"),
+    ]
+    pyproject = project_dir / "pyproject.toml"
+    return {
+        "environment": {
+            key: value
+            for key, value in sorted(os.environ.items())
+            if key.startswith("UV_") and key not in UV_LOCAL_SETTINGS
+        },
+        "tool.uv": (
+            toml.loads(pyproject.read_text()).get("tool", {}).get("uv")
+            if pyproject.is_file()
+            else None
+        ),
+        "files": {
+            str(path): hashlib.sha256(path.read_bytes()).hexdigest()
+            for path in files
+            if path.is_file()
+        },
+    }
+
+
 class UVDriver:
     DEFAULT_ENVIRONMENT = os.environ.get("PTM_DEFAULT_ENV", "uv sync")
 
+    def __init__(self):
+        # the common requirements of each template, until the next run is generated
+        self.intersections: t.Dict[t.Tuple[str, str, str], t.List[str]] = {}
+
     def generate(self, run: Run):
         """Generate some output based on input data."""
+        self.intersections.clear()
         req_file = run.directory / "requirements.in"
         resolution = ["--resolution", run.strategy] if run.strategy else []
         extras = list(chain.from_iterable((("--extra", extra) for extra in run.extras)))
@@ -45,6 +146,55 @@ class UVDriver:
         constraints = run.directory / "constraints.in"
         constraints.write_text(os.linesep.join(str(dep) for dep in run.dependencies))
 
+        finalized = run.directory / "requirements.txt"
+        cache = run.group.env.cfg.resolutions
+        key = resolution_key(
+            requirements=req_file.read_text(),
+            constraints=constraints.read_text(),
+            python=run.python,
+            strategy=str(run.strategy) if run.strategy else None,
+            # markers are resolved for the current host
+            platform=sys.platform,
+            machine=platform.machine(),
+            uv=uv_version(),
+            settings=uv_settings(run.group.env.cfg.project_dir),
+        )
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            print(f"{run.directory.name}: using the cached resolution {key[:12]}")
+            finalized.write_text(cached)
+        else:
+            self.compile(run, req_file, constraints, finalized, resolution)
+            if cache is not None:
+                cache.put(key, finalized.read_text())
+
+        lock = run.group.env.cfg.lock
+        if lock is not None:
+            # consolidate into the lock file instead of keeping per-run files
+            lock.add(
+                run.ident,
+                LockedRun(
+                    env=run.group.env.name,
+                    python=run.python,
+                    packages=[],
+                    strategy=str(run.strategy) if run.strategy else None,
+                    setenv=run.setenv,
+                ),
+                requirement_lines(finalized.read_text()),
+            )
+            # saved once per generate pass, see Config.deferred_lock
+            lock.prune(run.group.env.cfg.id_table)
+            for intermediate in (req_file, constraints, finalized):
+                intermediate.unlink()
+
+    def compile(
+        self,
+        run: Run,
+        req_file: Path,
+        constraints: Path,
+        finalized: Path,
+        resolution: t.List[str],
+    ):
         try:
             cmd = [
                 "uv",
@@ -59,13 +209,105 @@ class UVDriver:
                 str(req_file),
             ]
             print(" ".join(cmd).replace(f"{run.directory}/", ""))
-            finalized = run.directory / "requirements.txt"
             with open(finalized, "w") as req_out:
                 subprocess.run(cmd, check=True, stdout=req_out)
         except subprocess.CalledProcessError as err:
             print(run.directory)
             raise GenerationFailed(err.stderr) from err
 
+    def requirements(self, run: Run, generate: bool = True) -> t.Optional[t.List[str]]:
+        """
+        The compiled requirement lines of the run, from the lock file if the run is
+        locked, otherwise from its requirements.txt. Runs that have not been
+        generated are generated first, or None is returned if generate is False.
+        """
+        lock = run.group.env.cfg.lock
+        requirements = run.directory / "requirements.txt"
+        if not run.locked and (
+            not requirements.is_file() or not requirements.stat().st_size
+        ):
+            if not generate:
+                return None
+            self.generate(run)
+        if lock is not None and run.ident in lock.runs:
+            return lock.requirements(run.ident)
+        return requirement_lines(requirements.read_text())
+
+    def template_directory(self, run: Run) -> Path:
+        return (
+            run.group.env.cfg.directory
+            / ".templates"
+            / f"{run.python}-{run.strategy or 'default'}"
+        )
+
+    def intersection(self, run: Run) -> t.List[str]:
+        """
+        The requirements shared by all generated runs with the same python and
+        resolution strategy as the given run, which is generated if it has not been.
+        """
+        common = self.requirements(run) or []
+        cfg = run.group.env.cfg
+        key = (str(cfg.directory.absolute()), run.python, str(run.strategy))
+        if key in self.intersections:
+            return self.intersections[key]
+        for sibling in cfg.runs():
+            if (
+                sibling is run
+                or sibling.python != run.python
+                or sibling.strategy != run.strategy
+            ):
+                continue
+            sibling_reqs = self.requirements(sibling, generate=False)
+            if sibling_reqs is None:
+                continue
+            shared = set(sibling_reqs)
+            common = [req for req in common if req in shared]
+        self.intersections[key] = common
+        return common
+
+    def template(self, run: Run) -> Path:
+        """
+        Build or refresh the template venv shared by all runs with the same python
+        and resolution strategy as the given run. The template holds the
+        intersection of the requirements of those runs that have been generated.
+        Callers hold the template's lock, see :meth:`bootstrap`.
+        Returns the path to the template venv.
+        """
+        tmpl_dir = self.template_directory(run)
+        venv = tmpl_dir / ".venv"
+        requirements = tmpl_dir / "requirements.txt"
+        common = self.intersection(run)
+
+        contents = os.linesep.join(common)
+        if (
+            venv.is_dir()
+            and requirements.is_file()
+            and requirements.read_text() == contents
+        ):
+            run.group.env.cfg.usage.touch(venv)
+            return venv
+
+        if venv.exists():
+            shutil.rmtree(venv)
+        os.makedirs(tmpl_dir, exist_ok=True)
+        requirements.write_text(contents)
+        subprocess.run(["uv", "venv", "--python", run.python, str(venv)], check=True)
+        if common:
+            subprocess.run(
+                [
+                    "uv",
+                    "pip",
+                    "install",
+                    "--python",
+                    str(venv / run.python_path.relative_to(run.venv)),
+                    "--exact",
+                    *install_args(common),
+                ],
+                check=True,
+            )
+        run.group.env.cfg.usage.touch(venv)
+        return venv
+
     @contextmanager
     def bootstrap(self, run: Run):
         """
@@ -73,13 +315,51 @@ class UVDriver:
         """
         "uv pip install --exact"
         try:
-            requirements = run.directory / "requirements.txt"
-            if not requirements.is_file() or not requirements.stat().st_size:
-                self.generate(run)
-            subprocess.run(
-                ["uv", "venv", "--python", run.python, str(run.venv)], check=True
-            )
-            yield subprocess.run(
+            requirements = self.requirements(run) or []
+            if restored(run):
+                # unpacked from an archive of the same requirements, only local
+                # requirements are reinstalled as they refer to the checkout they
+                # were installed from (e.g. setuptools' editable finders)
+                local = local_requirements(requirements)
+                result = (
+                    subprocess.run(
+                        [
+                            "uv",
+                            "pip",
+                            "install",
+                            "--python",
+                            run.python_path,
+                            "--reinstall",
+                            "--no-deps",
+                            *install_args(local),
+                        ],
+                        check=True,
+                    )
+                    if local
+                    else None
+                )
+                (run.venv / UNPACKED_FILE).unlink()
+                yield result
+                return
+            installing = lock_hash(run)
+            (run.venv / LOCK_HASH_FILE).unlink(missing_ok=True)
+            (run.venv / UNPACKED_FILE).unlink(missing_ok=True)
+            if run.group.env.cfg.templates:
+                # clone the shared template and let --exact sync only the delta,
+                # while no other process rebuilds it
+                tmpl_dir = self.template_directory(run)
+                os.makedirs(tmpl_dir.parent, exist_ok=True)
+                with exclusive(tmpl_dir):
+                    template = self.template(run)
+                    if run.venv.exists():
+                        shutil.rmtree(run.venv)
+                    clone_tree(template, run.venv)
+                relocate(run.venv, template, run.venv)
+            else:
+                subprocess.run(
+                    ["uv", "venv", "--python", run.python, str(run.venv)], check=True
+                )
+            result = subprocess.run(
                 [
                     "uv",
                     "pip",
@@ -87,10 +367,11 @@ class UVDriver:
                     "--python",
                     run.python_path,
                     "--exact",
-                    "-r",
-                    str(requirements),
+                    *install_args(requirements),
                 ],
                 check=True,
             )
+            mark_installed(run, installing)
+            yield result
         finally:
             pass
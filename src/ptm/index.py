@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import typing as t
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+import requests
+from packaging.specifiers import SpecifierSet
+from packaging.utils import canonicalize_name
+from packaging.version import InvalidVersion, Version
+
+from .cache import user_cache_dir
+
+DEFAULT_INDEX_URL = "https://pypi.org/pypi/{package}/json"
+DEFAULT_INDEX_TTL = 24 * 60 * 60
+
+
+class IndexUnavailable(Exception):
+    pass
+
+
+def select_versions(
+    releases: t.Dict[str, t.Dict[str, t.Any]],
+    specifier: str = "",
+    per: t.Optional[str] = None,
+    prereleases: bool = False,
+) -> t.List[str]:
+    """
+    Select the versions of a package that satisfy the specifier.
+
+    :param releases: the release table of the package as cached by
+        :class:`PackageIndex`
+    :param specifier: a version specifier (e.g. ">=4.2")
+    :param per: major or minor to select only the highest version of each major or
+        major.minor series, or None to select every version
+    :param prereleases: include pre-releases
+    :return: the selected versions in ascending order
+    """
+    if per not in (None, "major", "minor"):
+        raise ValueError(f"Invalid version series {per}, expected major or minor.")
+    spec = SpecifierSet(specifier)
+    selected: t.Dict[t.Union[Version, t.Tuple[int, ...]], Version] = {}
+    for release, info in releases.items():
+        if info.get("yanked", False):
+            continue
+        try:
+            version = Version(release)
+        except InvalidVersion:
+            continue
+        if not spec.contains(version, prereleases=prereleases):
+            continue
+        series: t.Union[Version, t.Tuple[int, ...]] = version
+        if per == "major":
+            series = (version.major,)
+        elif per == "minor":
+            series = (version.major, version.minor)
+        if series not in selected or selected[series] < version:
+            selected[series] = version
+    return [str(version) for version in sorted(selected.values())]
+
+
+def trim(metadata: t.Dict[str, t.Any]) -> t.Dict[str, t.Any]:
+    """
+    Reduce a JSON API project response to the fields ptm uses.
+    """
+    releases = {}
+    for release, files in metadata.get("releases", {}).items():
+        releases[release] = {
+            # a release without files cannot be installed either
+            "yanked": not files or all(file.get("yanked", False) for file in files),
+            "requires_python": next(
+                (
+                    file["requires_python"]
+                    for file in files
+                    if file.get("requires_python")
+                ),
+                None,
+            ),
+        }
+    return {"releases": releases}
+
+
+def trim_release(metadata: t.Dict[str, t.Any]) -> t.Dict[str, t.Any]:
+    """
+    Reduce a JSON API release response to the core metadata ptm uses.
+    """
+    info = metadata.get("info", {})
+    return {
+        "requires_python": info.get("requires_python") or None,
+        "requires_dist": info.get("requires_dist") or [],
+    }
+
+
+@dataclass
+class PackageIndex:
+    """
+    A read-through, on-disk cache of package release metadata fetched from a
+    JSON API index (PyPI by default). The url must contain a ``{package}``
+    placeholder and may be a file:// url to a local stand-in index.
+    """
+
+    url: str = DEFAULT_INDEX_URL
+    ttl: int = DEFAULT_INDEX_TTL
+    offline: bool = False
+    cache_dir: Path = field(default_factory=lambda: user_cache_dir() / "index")
+    max_workers: int = 8
+
+    _metadata: t.Dict[str, t.Dict[str, t.Any]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+
+    @property
+    def directory(self) -> Path:
+        return self.cache_dir / hashlib.sha256(self.url.encode()).hexdigest()[:12]
+
+    def cache_file(self, package: str) -> Path:
+        return self.directory / f"{canonicalize_name(package)}.json"
+
+    def _download(
+        self, package: str, version: t.Optional[str] = None
+    ) -> t.Dict[str, t.Any]:
+        url = self.url.format(package=canonicalize_name(package))
+        if version is not None:
+            # release metadata lives under the project url, e.g. /pypi/django/5.1/json
+            url = self.url.replace("{package}", "{package}/{version}").format(
+                package=canonicalize_name(package), version=version
+            )
+        parsed = urlparse(url)
+        if parsed.scheme == "file":
+            return json.loads(Path(url2pathname(parsed.path)).read_text())
+        resp = requests.get(url, timeout=30)
+        resp.raise_for_status()
+        return resp.json()
+
+    def fetch(self, package: str) -> t.Dict[str, t.Any]:
+        """
+        Return the (trimmed) metadata for the package, from memory, then the disk
+        cache if it is younger than the ttl, then the index.
+        """
+        package = canonicalize_name(package)
+        if package in self._metadata:
+            return self._metadata[package]
+        cached = self.cache_file(package)
+        fresh = cached.is_file() and time.time() - cached.stat().st_mtime < self.ttl
+        if cached.is_file() and (fresh or self.offline):
+            self._metadata[package] = json.loads(cached.read_text())
+            return self._metadata[package]
+        if self.offline:
+            raise IndexUnavailable(f"{package} is not cached and ptm is offline.")
+        try:
+            metadata = trim(self._download(package))
+        except (OSError, ValueError, requests.RequestException) as err:
+            if not cached.is_file():
+                raise IndexUnavailable(
+                    f"Unable to fetch {package} from {self.url}: {err}"
+                ) from err
+            warnings.warn(f"Using stale index cache for {package}: {err}")
+            metadata = json.loads(cached.read_text())
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = cached.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps(metadata))
+            os.replace(tmp, cached)
+        self._metadata[package] = metadata
+        return metadata
+
+    def release(self, package: str, version: str) -> t.Dict[str, t.Any]:
+        """
+        Return the (trimmed) core metadata of a release of the package. Releases do
+        not change, so they are cached on disk indefinitely.
+        """
+        package = canonicalize_name(package)
+        key = f"{package}-{version}"
+        if key in self._metadata:
+            return self._metadata[key]
+        cached = self.directory / f"{key}.json"
+        if cached.is_file():
+            self._metadata[key] = json.loads(cached.read_text())
+            return self._metadata[key]
+        if self.offline:
+            raise IndexUnavailable(f"{key} is not cached and ptm is offline.")
+        try:
+            metadata = trim_release(self._download(package, version))
+        except (OSError, ValueError, requests.RequestException) as err:
+            raise IndexUnavailable(
+                f"Unable to fetch {package} {version} from {self.url}: {err}"
+            ) from err
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = cached.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(metadata))
+        os.replace(tmp, cached)
+        self._metadata[key] = metadata
+        return metadata
+
+    def prefetch(self, packages: t.Iterable[str]):
+        """
+        Fetch the metadata for several packages concurrently.
+        """
+        pending = {canonicalize_name(pkg) for pkg in packages} - self._metadata.keys()
+        if len(pending) < 2:
+            for package in pending:
+                self.fetch(package)
+            return
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            list(pool.map(self.fetch, sorted(pending)))
+
+    def versions(
+        self,
+        package: str,
+        specifier: str = "",
+        per: t.Optional[str] = None,
+        prereleases: bool = False,
+    ) -> t.List[str]:
+        """
+        The released versions of the package that satisfy the specifier. See
+        :func:`select_versions`.
+        """
+        return select_versions(
+            self.fetch(package)["releases"],
+            specifier=specifier,
+            per=per,
+            prereleases=prereleases,
+        )
@@ -0,0 +1,271 @@
+"""
+A consolidated lock file holding the resolved requirements of every run.
+
+Packages are stored once in a table keyed by their requirement line and each run
+lists the keys of the packages it installs, one per line, so the file is compact,
+loads in a single read and produces reviewable diffs::
+
+    version = 1
+
+    [packages]
+    "django==4.2.20" = {name = "django", version = "4.2.20"}
+
+    [runs.76bc0ab93df8]
+    env = "sqlite"
+    python = "3.8"
+    setenv = {"RDBMS" = "sqlite"}
+    packages = [
+        "django==4.2.20",
+    ]
+
+Saving holds an exclusive lock on a sidecar file and merges the runs added since
+loading into the file's current content, so concurrent ptm processes do not lose
+each other's runs. Within :meth:`Lock.deferred` the file is saved once when the
+block exits.
+"""
+
+import json
+import os
+import sys
+import typing as t
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.utils import canonicalize_name
+
+from . import toml
+
+LOCK_VERSION = 1
+
+
+def requirement_lines(text: str) -> t.List[str]:
+    """
+    Return the requirement lines of a compiled requirements file, without comments.
+    """
+    return [
+        line.strip()
+        for line in text.splitlines()
+        if line.strip() and not line[0].isspace() and not line.startswith("#")
+    ]
+
+
+def _string(value: str) -> str:
+    # JSON string escapes are a subset of TOML basic string escapes
+    return json.dumps(value)
+
+
+def _inline(table: t.Dict[str, t.Any]) -> str:
+    return (
+        "{"
+        + ", ".join(
+            f"{_string(key)} = {_string(val)}"
+            for key, val in table.items()
+            if val is not None
+        )
+        + "}"
+    )
+
+
+@contextmanager
+def exclusive(path: Path) -> t.Iterator[None]:
+    """
+    Hold an exclusive lock on the sidecar lock file of path across processes.
+    """
+    with open(path.with_name(f".{path.name}.lock"), "a+b") as handle:
+        if sys.platform == "win32":
+            import msvcrt
+
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+@dataclass(frozen=True)
+class Package:
+    """
+    A locked package. Lines that are not pinned requirements (e.g. ``-e .``) are
+    kept verbatim as the source of a package with no name.
+    """
+
+    name: str
+    version: t.Optional[str] = None
+    source: t.Optional[str] = None
+    markers: t.Optional[str] = None
+
+    @property
+    def requirement(self) -> str:
+        if not self.name:
+            return self.source or ""
+        req = (
+            f"{self.name}=={self.version}"
+            if self.version
+            else f"{self.name} @ {self.source}"
+        )
+        return f"{req} ; {self.markers}" if self.markers else req
+
+    @staticmethod
+    def parse(line: str) -> "Package":
+        try:
+            req = Requirement(line)
+        except InvalidRequirement:
+            return Package(name="", source=line)
+        version = next(
+            (spec.version for spec in req.specifier if spec.operator == "=="), None
+        )
+        if version is None and not req.url:
+            return Package(name="", source=line)
+        name: str = canonicalize_name(req.name)
+        if req.extras:
+            name = f"{name}[{','.join(sorted(req.extras))}]"
+        return Package(
+            name=name,
+            version=version,
+            source=req.url or None,
+            markers=str(req.marker) if req.marker else None,
+        )
+
+
+@dataclass
+class LockedRun:
+    env: str
+    python: str
+    packages: t.List[str]
+    strategy: t.Optional[str] = None
+    setenv: t.Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class Lock:
+    path: Path
+    packages: t.Dict[str, Package] = field(default_factory=dict)
+    runs: t.Dict[str, LockedRun] = field(default_factory=dict)
+    # the runs added and the idents kept by prune since the last save
+    _added: t.Dict[str, LockedRun] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    _keep: t.Optional[t.Container[str]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _deferred: int = field(default=0, init=False, repr=False, compare=False)
+
+    @staticmethod
+    def load(path: Path) -> "Lock":
+        if not path.is_file():
+            return Lock(path=path)
+        doc = toml.loads(path.read_text())
+        assert doc.get("version", None) == LOCK_VERSION, (
+            f"Unsupported lock file version in {path}, regenerate it."
+        )
+        return Lock(
+            path=path,
+            packages={
+                key: Package(**pkg) for key, pkg in doc.get("packages", {}).items()
+            },
+            runs={
+                ident: LockedRun(**run) for ident, run in doc.get("runs", {}).items()
+            },
+        )
+
+    def add(self, ident: str, run: LockedRun, requirements: t.Iterable[str]):
+        """
+        Lock the run to the given compiled requirement lines.
+        """
+        run.packages = []
+        for line in requirements:
+            package = Package.parse(line)
+            self.packages.setdefault(package.requirement, package)
+            run.packages.append(package.requirement)
+        self.runs[ident] = run
+        self._added[ident] = run
+
+    def requirements(self, ident: str) -> t.List[str]:
+        return [self.packages[key].requirement for key in self.runs[ident].packages]
+
+    def prune(self, idents: t.Container[str]):
+        """
+        Remove runs that are not in idents and packages no run references.
+        """
+        self.runs = {ident: run for ident, run in self.runs.items() if ident in idents}
+        self._keep = idents
+        referenced = {key for run in self.runs.values() for key in run.packages}
+        self.packages = {
+            key: pkg for key, pkg in self.packages.items() if key in referenced
+        }
+
+    def dumps(self) -> str:
+        lines = [
+            "# This file is generated by ptm, do not edit it by hand.",
+            f"version = {LOCK_VERSION}",
+            "",
+            "[packages]",
+        ]
+        for key in sorted(self.packages):
+            pkg = self.packages[key]
+            lines.append(
+                f"{_string(key)} = "
+                + _inline(
+                    {
+                        "name": pkg.name,
+                        "version": pkg.version,
+                        "source": pkg.source,
+                        "markers": pkg.markers,
+                    }
+                )
+            )
+        for ident in sorted(self.runs):
+            run = self.runs[ident]
+            lines.extend(["", f"[runs.{ident}]"])
+            lines.append(f"env = {_string(run.env)}")
+            lines.append(f"python = {_string(run.python)}")
+            if run.strategy:
+                lines.append(f"strategy = {_string(run.strategy)}")
+            lines.append(f"setenv = {_inline(dict(sorted(run.setenv.items())))}")
+            lines.append("packages = [")
+            lines.extend(f"    {_string(key)}," for key in run.packages)
+            lines.append("]")
+        return "\n".join(lines) + "\n"
+
+    @contextmanager
+    def deferred(self) -> t.Iterator["Lock"]:
+        """
+        Save the changes made in the block once when the outermost deferred block
+        exits, instead of on every :meth:`save`.
+        """
+        self._deferred += 1
+        try:
+            yield self
+        finally:
+            self._deferred -= 1
+            if not self._deferred and (self._added or self._keep is not None):
+                self.save()
+
+    def save(self):
+        """
+        Merge the runs added since loading into the current file and write it.
+        """
+        if self._deferred:
+            return
+        with exclusive(self.path):
+            current = Lock.load(self.path)
+            self.packages = {**current.packages, **self.packages}
+            self.runs = {**current.runs, **self._added}
+            self.prune(self.runs if self._keep is None else self._keep)
+            tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+            tmp.write_text(self.dumps())
+            os.replace(tmp, self.path)
+        self._added = {}
+        self._keep = None
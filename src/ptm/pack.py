@@ -0,0 +1,407 @@
+"""
+Relocatable archives of run venvs for CI caches.
+
+:func:`pack` streams the venvs of the given runs into one compressed tar archive,
+zstd if a zstd module is available and gzip otherwise. The archive starts with a
+JSON manifest of every run's directories, symlinks and files, followed by the
+content of each distinct file once, so files shared between venvs (most of them
+for a matrix of one project) are only stored and compressed once. The lock hash
+each venv was installed for is recorded with it.
+
+:func:`unpack` restores the runs whose current lock hash matches the archive. The
+archive is decompressed once into a staging directory, from which the venvs are
+restored in parallel by hardlinking identical files, then the paths that depend on
+the checkout location are rewritten. Restored venvs are marked so bootstrapping
+them only reinstalls the project's local requirements, e.g. an editable install of
+the project, instead of every requirement.
+"""
+
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import stat
+import tarfile
+import threading
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+
+from .config import Config, Run
+from .results import lock_hash
+from .venv import copy_file, relocate, relocate_site_packages
+
+PACK_VERSION = 1
+MANIFEST = "manifest.json"
+OBJECT = re.compile(r"objects/([0-9a-f]{64})")
+
+# the lock hash a venv was installed or unpacked for, kept in the venv so eviction
+# removes it
+LOCK_HASH_FILE = "ptm-lock-hash"
+
+# marks an unpacked venv whose local requirements have not been reinstalled yet
+UNPACKED_FILE = "ptm-unpacked"
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+CHUNK = 1024 * 1024
+
+
+def _zstd() -> t.Any:
+    """
+    The zstd module of the standard library (3.14+) or the zstandard package.
+    """
+    try:
+        from compression import zstd  # type: ignore[import-not-found]
+
+        return zstd
+    except ImportError:
+        pass
+    try:
+        import zstandard  # type: ignore[import-not-found]
+
+        return zstandard
+    except ImportError:
+        return None
+
+
+def compressions() -> t.List[str]:
+    return ["zstd", "gzip"] if _zstd() else ["gzip"]
+
+
+def _open(path: Path, mode: str, compression: str = "gzip") -> t.BinaryIO:
+    """
+    Open a compressed stream, detecting the compression of an existing archive.
+    """
+    if mode == "rb":
+        with open(path, "rb") as probe:
+            compression = "zstd" if probe.read(4) == ZSTD_MAGIC else "gzip"
+    if compression == "zstd":
+        zstd = _zstd()
+        assert zstd, "zstd compression requires python 3.14 or zstandard."
+        if hasattr(zstd, "ZstdFile"):
+            return zstd.ZstdFile(path, mode)
+        return zstd.open(path, mode)
+    assert compression == "gzip", f"Unknown compression {compression}."
+    import gzip
+
+    return gzip.open(path, mode, compresslevel=6)  # type: ignore[return-value]
+
+
+def digest(path: Path) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as stream:
+        for chunk in iter(lambda: stream.read(CHUNK), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+# the interpreter links of a venv, which point to the base python outside of it
+INTERPRETER = re.compile(r"(bin|Scripts)/(python|pypy)[\d.]*(\.exe)?")
+
+
+def _safe(relative: str) -> str:
+    path = PurePosixPath(relative)
+    assert not path.is_absolute() and ".." not in path.parts, (
+        f"Refusing to unpack {relative} outside of the venv."
+    )
+    return relative
+
+
+def _within(venv: Path, relative: str) -> Path:
+    """
+    The path in the venv, refusing paths whose parent resolves outside of it (e.g.
+    through a symlink).
+    """
+    path = venv / _safe(relative)
+    root = venv.resolve()
+    parent = path.parent.resolve()
+    assert parent == root or root in parent.parents, (
+        f"Refusing to unpack {relative} outside of the venv."
+    )
+    return path
+
+
+def _link_target(venv: Path, relative: str, target: str) -> bool:
+    """
+    True if the symlink target resolves inside the venv. Only the interpreter links
+    may point outside of it.
+    """
+    root = venv.resolve()
+    resolved = ((venv / relative).parent / target).resolve()
+    return (
+        resolved == root
+        or root in resolved.parents
+        or bool(INTERPRETER.fullmatch(relative))
+    )
+
+
+@dataclass
+class PackedRun:
+    venv: str
+    origin: str
+    project: str
+    python: str
+    lock_hash: t.Optional[str]
+    directories: t.List[t.Tuple[str, int]] = field(default_factory=list)
+    symlinks: t.List[t.Tuple[str, str]] = field(default_factory=list)
+    # path, mode, mtime and digest of each regular file
+    files: t.List[t.Tuple[str, int, int, str]] = field(default_factory=list)
+
+
+def scan(
+    run: Run, objects: t.Dict[str, Path], seen: t.Dict[t.Tuple[int, int], str]
+) -> PackedRun:
+    """
+    List the contents of the run's venv, adding the first file with each digest
+    to objects. seen maps inodes to digests so hardlinked files are hashed once.
+    """
+    venv = run.venv.absolute()
+    packed = PackedRun(
+        venv=run.venv.relative_to(run.group.env.cfg.project_dir).as_posix(),
+        origin=str(venv),
+        project=str(run.group.env.cfg.project_dir.absolute()),
+        python=run.python,
+        lock_hash=installed(run),
+    )
+    for root, dirs, files in os.walk(venv):
+        directory = Path(root)
+        relative = directory.relative_to(venv).as_posix()
+        if relative != ".":
+            packed.directories.append(
+                (relative, stat.S_IMODE(directory.stat().st_mode))
+            )
+        for name in [*dirs, *files]:
+            path = directory / name
+            relative = path.relative_to(venv).as_posix()
+            if path.is_symlink():
+                packed.symlinks.append((relative, os.readlink(path)))
+                continue
+            if name in dirs or relative in (LOCK_HASH_FILE, UNPACKED_FILE):
+                continue
+            info = path.stat()
+            inode = (info.st_dev, info.st_ino)
+            if inode not in seen:
+                seen[inode] = digest(path)
+            objects.setdefault(seen[inode], path)
+            packed.files.append(
+                (
+                    relative,
+                    stat.S_IMODE(info.st_mode),
+                    int(info.st_mtime),
+                    seen[inode],
+                )
+            )
+    return packed
+
+
+@dataclass
+class Packed:
+    runs: t.List[str] = field(default_factory=list)
+    files: int = 0
+    objects: int = 0
+
+
+def pack(runs: t.Iterable[Run], archive: Path, compression: str = "gzip") -> Packed:
+    """
+    Write the venvs of the runs that have been bootstrapped to the archive.
+    """
+    objects: t.Dict[str, Path] = {}
+    seen: t.Dict[t.Tuple[int, int], str] = {}
+    manifest: t.Dict[str, t.Any] = {"version": PACK_VERSION, "runs": {}}
+    for run in runs:
+        if run.venv.is_dir():
+            manifest["runs"][run.ident] = scan(run, objects, seen).__dict__
+    data = json.dumps(manifest).encode()
+    tmp = archive.with_name(f".{archive.name}.{os.getpid()}.tmp")
+    try:
+        with _open(tmp, "wb", compression) as stream, tarfile.open(
+            fileobj=stream, mode="w|"
+        ) as tar:
+            info = tarfile.TarInfo(MANIFEST)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+            for sha, path in objects.items():
+                info = tarfile.TarInfo(f"objects/{sha}")
+                info.size = path.stat().st_size
+                with open(path, "rb") as content:
+                    tar.addfile(info, content)
+        os.replace(tmp, archive)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return Packed(
+        runs=list(manifest["runs"]),
+        files=sum(len(run["files"]) for run in manifest["runs"].values()),
+        objects=len(objects),
+    )
+
+
+def installed(run: Run) -> t.Optional[str]:
+    """
+    The lock hash the run's venv was installed for, None if it is not known.
+    """
+    marker = run.venv / LOCK_HASH_FILE
+    return (marker.read_text().strip() or None) if marker.is_file() else None
+
+
+def mark_installed(run: Run, lock_hash: t.Optional[str]):
+    """
+    Record the lock hash the run's venv was installed for, see :func:`installed`.
+    """
+    (run.venv / LOCK_HASH_FILE).write_text(lock_hash or "")
+
+
+def restored(run: Run) -> bool:
+    """
+    True if the run's venv was unpacked for its current requirements and has not
+    been bootstrapped since.
+    """
+    current = lock_hash(run)
+    return (
+        (run.venv / UNPACKED_FILE).is_file()
+        and current is not None
+        and installed(run) == current
+    )
+
+
+@dataclass
+class Unpacked:
+    restored: t.List[str] = field(default_factory=list)
+    # maps idents to the reason they were not restored
+    skipped: t.Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class _Materializer:
+    """
+    Creates the restored files. The first file with each content, mode and mtime is
+    a private copy of the staged content, which later ones are hardlinked to.
+    """
+
+    staging: Path
+    first: t.Dict[t.Tuple[str, int, int], Path] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def file(self, path: Path, mode: int, mtime: int, sha: str):
+        key = (sha, mode, mtime)
+        with self.lock:
+            original = self.first.get(key)
+        if original is not None:
+            try:
+                os.link(original, path)
+                return
+            except OSError:
+                pass
+        # a hardlink to the staged content would share its mode and mtime with
+        # files of other modes and mtimes
+        copy_file(str(self.staging / sha), str(path))
+        os.chmod(path, mode)
+        os.utime(path, (mtime, mtime))
+        with self.lock:
+            self.first.setdefault(key, path)
+
+
+def _materialize(venv: Path, packed: PackedRun, materialize: _Materializer):
+    for relative, _ in packed.directories:
+        _within(venv, relative).mkdir(exist_ok=True)
+    for relative, mode, mtime, sha in packed.files:
+        materialize.file(_within(venv, relative), mode, mtime, sha)
+    # links are created last so no file is written through one
+    for relative, target in packed.symlinks:
+        if target.startswith(packed.origin + os.sep):
+            target = str(venv) + target[len(packed.origin) :]
+        assert _link_target(venv, relative, target), (
+            f"Refusing to link {relative} to {target} outside of the venv."
+        )
+        os.symlink(target, _within(venv, relative))
+    for relative, mode in reversed(packed.directories):
+        os.chmod(venv / relative, mode)
+
+
+def _restore(run: Run, packed: PackedRun, materialize: _Materializer):
+    venv = run.venv.absolute()
+    if venv.exists() or venv.is_symlink():
+        shutil.rmtree(venv)
+    venv.mkdir(parents=True)
+    try:
+        _materialize(venv, packed, materialize)
+    except (OSError, AssertionError):
+        shutil.rmtree(venv, ignore_errors=True)
+        raise
+    relocate(venv, packed.origin, venv)
+    relocate_site_packages(
+        venv, packed.project, run.group.env.cfg.project_dir.absolute()
+    )
+    mark_installed(run, packed.lock_hash)
+    (venv / UNPACKED_FILE).touch()
+    run.touch()
+
+
+def unpack(
+    cfg: Config,
+    archive: Path,
+    idents: t.Optional[t.Collection[str]] = None,
+    max_workers: int = 8,
+) -> Unpacked:
+    """
+    Restore the venvs in the archive of the configured runs (or the given subset
+    of them) whose requirements have not changed since they were packed.
+    """
+    result = Unpacked()
+    staging = cfg.directory / f".unpack-{os.getpid()}"
+    with _open(archive, "rb") as stream, tarfile.open(fileobj=stream, mode="r|") as tar:
+        member = tar.next()
+        assert member is not None and member.name == MANIFEST, (
+            f"{archive} is not a ptm pack archive."
+        )
+        manifest_file = tar.extractfile(member)
+        assert manifest_file is not None
+        manifest = json.loads(manifest_file.read())
+        assert manifest.get("version") == PACK_VERSION, (
+            f"Unsupported pack archive version {manifest.get('version')}."
+        )
+        selected: t.Dict[str, t.Tuple[Run, PackedRun]] = {}
+        for ident, info in manifest["runs"].items():
+            packed = PackedRun(**info)
+            run = cfg.id_table.get(ident)
+            if idents is not None and ident not in idents:
+                continue
+            if run is None:
+                result.skipped[ident] = "not configured"
+                continue
+            run.prepare()
+            if packed.lock_hash is None:
+                result.skipped[ident] = "installed for unknown requirements"
+            elif lock_hash(run) != packed.lock_hash:
+                result.skipped[ident] = "requirements changed"
+            else:
+                selected[ident] = (run, packed)
+        needed = {sha for _, packed in selected.values() for *_, sha in packed.files}
+        staging.mkdir(parents=True, exist_ok=True)
+        try:
+            for member in tar:
+                match = OBJECT.fullmatch(member.name)
+                if not member.isfile() or not match or match.group(1) not in needed:
+                    continue
+                content = tar.extractfile(member)
+                assert content is not None
+                with open(staging / match.group(1), "wb") as out:
+                    shutil.copyfileobj(content, out, CHUNK)
+            materialize = _Materializer(staging)
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                futures = {
+                    ident: pool.submit(_restore, run, packed, materialize)
+                    for ident, (run, packed) in selected.items()
+                }
+                for ident, future in futures.items():
+                    try:
+                        future.result()
+                        result.restored.append(ident)
+                    except (OSError, AssertionError) as err:
+                        result.skipped[ident] = str(err)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+    return result
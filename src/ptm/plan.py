@@ -0,0 +1,194 @@
+"""
+Budgeted selection of a subset of the matrix that maximizes coverage.
+
+Each run covers its python version and the (package, specifier) value of each of its
+dependencies. :func:`plan` chooses runs by greedy weighted set cover: runs that
+must be included are taken first, then the run covering the most values not yet
+covered per second of its estimated duration is added while it fits the budget.
+Durations are estimated from the recorded results, runs without a result are
+assumed to take the average duration.
+
+Gains only decrease as runs are selected, so candidates are kept in a heap and only
+the stale gain at its top is recomputed (lazy greedy), which keeps planning
+thousands of runs to milliseconds. Ties are broken by a hash of each run identifier
+and a seed, the current commit by default, so a plan is reproducible per commit
+but rotates through equally good runs between commits.
+"""
+
+import hashlib
+import heapq
+import re
+import subprocess
+import typing as t
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .config import Config, Run
+from .results import RESULTS_DB, ResultStore
+
+# the assumed duration of a run in seconds when no run has a recorded result
+DEFAULT_DURATION = 60.0
+
+UNITS = {"s": 1, "m": 60, "h": 60 * 60}
+
+# a coverable value: ("python", version) or (package, specifier)
+Value = t.Tuple[str, str]
+
+
+def parse_duration(duration: str) -> float:
+    """
+    Parse a duration like ``15m``, ``1h30m`` or ``90s``. A unit is required, a
+    bare number is a budget of runs, see :func:`plan_runs`.
+    """
+    part = r"\s*(\d+(?:\.\d+)?)\s*([smh])"
+    assert re.fullmatch(f"({part})+\\s*", duration.lower()), (
+        f"Invalid duration: {duration}"
+    )
+    return sum(
+        float(amount) * UNITS[unit]
+        for amount, unit in re.findall(part, duration.lower())
+    )
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(round(seconds), 60)
+    return f"{minutes}m{seconds:02d}s" if minutes else f"{seconds}s"
+
+
+def values(run: Run) -> t.Set[Value]:
+    return {
+        ("python", run.python),
+        *((dep.package, str(dep.specifier or dep)) for dep in run.dependencies),
+    }
+
+
+def estimates(runs: t.Iterable[Run], store: ResultStore) -> t.Dict[str, float]:
+    """
+    The duration of each run's most recent result. Runs without a result are
+    assumed to take the average duration of the others.
+    """
+    durations = {
+        result.ident: (result.bootstrap_time or 0) + (result.command_time or 0)
+        for result in store.latest()
+    }
+    idents = [run.ident for run in runs]
+    known = [durations[ident] for ident in idents if ident in durations]
+    default = sum(known) / len(known) if known else DEFAULT_DURATION
+    return {ident: durations.get(ident, default) for ident in idents}
+
+
+def commit(directory: Path) -> str:
+    """
+    The current commit of the repository containing directory, empty if there is
+    none.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=directory,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+@dataclass
+class Plan:
+    selected: t.List[Run] = field(default_factory=list)
+    # the estimated duration of the selected runs in seconds
+    duration: float = 0
+    covered: t.Set[Value] = field(default_factory=set)
+    uncovered: t.Set[Value] = field(default_factory=set)
+
+
+def plan(
+    runs: t.Iterable[Run],
+    budget: float,
+    costs: t.Optional[t.Mapping[str, float]] = None,
+    required: t.Iterable[str] = (),
+    seed: str = "",
+) -> Plan:
+    """
+    Select runs that cover as many values as possible within the budget.
+
+    :param runs: the candidate runs
+    :param budget: the budget, in the unit of the costs
+    :param costs: the cost of each run by identifier, 1 per run by default
+    :param required: tags whose runs are always selected, even over budget
+    :param seed: breaks ties between equally good runs
+    """
+    runs = list(runs)
+    cost = {run.ident: (costs or {}).get(run.ident, 1.0) for run in runs}
+    covers = {run.ident: values(run) for run in runs}
+    result = Plan()
+    required_tags = set(required)
+    chosen: t.Set[str] = set()
+
+    def take(run: Run):
+        chosen.add(run.ident)
+        result.selected.append(run)
+        result.duration += cost[run.ident]
+        result.covered |= covers[run.ident]
+
+    for run in runs:
+        if required_tags.intersection(run.tags) and run.ident not in chosen:
+            take(run)
+
+    def tiebreak(ident: str) -> str:
+        return hashlib.sha256(f"{seed}:{ident}".encode()).hexdigest()
+
+    def priority(run: Run, gain: int) -> float:
+        # free runs that add coverage are always worth taking
+        return -gain / max(cost[run.ident], 1e-9)
+
+    table = {run.ident: run for run in runs}
+    heap = [
+        (priority(run, len(covers[run.ident])), tiebreak(run.ident), run.ident)
+        for run in runs
+        if run.ident not in chosen
+    ]
+    heapq.heapify(heap)
+    while heap:
+        stale, order, ident = heapq.heappop(heap)
+        run = table[ident]
+        if result.duration + cost[ident] > budget:
+            continue
+        gain = len(covers[ident] - result.covered)
+        if not gain:
+            continue
+        current = priority(run, gain)
+        if current != stale and heap and (current, order) > heap[0][:2]:
+            heapq.heappush(heap, (current, order, ident))
+            continue
+        take(run)
+    result.uncovered = set().union(*covers.values()) - result.covered
+    selected = {run.ident for run in result.selected}
+    # keep the configured order of the runs
+    result.selected = [run for run in runs if run.ident in selected]
+    return result
+
+
+def plan_runs(
+    cfg: Config,
+    runs: t.Iterable[Run],
+    budget: str,
+    required: t.Iterable[str] = (),
+    seed: t.Optional[str] = None,
+) -> Plan:
+    """
+    Plan the runs within a budget that is either a duration (e.g. ``15m``), which
+    is spent by the estimated durations of the runs, or a number of runs.
+
+    :param required: tags whose runs are always selected, in addition to the
+        configured ``plan_require`` tags
+    :param seed: breaks ties, by default the current commit of the project
+    """
+    runs = list(runs)
+    required = [*cfg.plan_require, *required]
+    seed = commit(cfg.project_dir) if seed is None else seed
+    if budget.strip().isdigit():
+        return plan(runs, int(budget), required=required, seed=seed)
+    costs = estimates(runs, ResultStore(cfg.directory / RESULTS_DB))
+    return plan(runs, parse_duration(budget), costs, required=required, seed=seed)
@@ -0,0 +1,255 @@
+"""
+A static satisfiability check of runs that is cheap enough to run before resolving.
+
+Each pinned dependency of a run is matched against the release metadata of the
+package index: a run is unsatisfiable when no release of a dependency satisfies its
+specifier and supports the run's python, when the project does not support the
+run's python, or when every candidate release of one matrix dependency requires a
+version of another that none of its candidates provide. Runs the index can not
+decide (urls, unknown pythons, an unavailable index) are unknown.
+"""
+
+import re
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from enum import Enum
+from functools import lru_cache
+
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.specifiers import InvalidSpecifier, SpecifierSet
+from packaging.utils import canonicalize_name
+from packaging.version import Version
+
+from .config import Dependency, Run
+from .index import IndexUnavailable, PackageIndex
+
+# the most releases of a dependency whose core metadata is fetched to find one that
+# does not conflict with the run's other dependencies
+MAX_CANDIDATES = 10
+
+# a run requesting a minor version (e.g. 3.12) may get any of its micro releases
+MAX_MICRO = 99
+
+
+class Satisfiability(str, Enum):
+    SATISFIABLE = "satisfiable"
+    UNSATISFIABLE = "unsatisfiable"
+    UNKNOWN = "unknown"
+
+    def __str__(self):
+        return str(self.value)
+
+
+@dataclass
+class Verdict:
+    run: Run
+    satisfiability: Satisfiability
+    reasons: t.List[str] = field(default_factory=list)
+
+    @property
+    def location(self) -> str:
+        group = self.run.group
+        if group.lineno:
+            return f"{group.env.name} line {group.lineno}"
+        return f"{group.env.name} matrix[{group.env.matrix.index(group)}]"
+
+    def __str__(self):
+        reasons = "; ".join(self.reasons)
+        return f"{self.location}: {self.run} is {self.satisfiability}: {reasons}"
+
+
+def python_version(python: str) -> t.Optional[Version]:
+    """
+    The version of a run's python request (e.g. 3.12, 3.12.3, cpython3.12).
+    """
+    match = re.search(r"(\d+\.\d+(?:\.\d+)?)", python)
+    return Version(match.group(1)) if match else None
+
+
+def micros(python: Version) -> t.List[Version]:
+    """
+    The releases a python request may be satisfied by: itself if it names a micro
+    release, otherwise every micro release of its minor version.
+    """
+    if len(python.release) > 2:
+        return [python]
+    major, minor = python.release[:2]
+    return [Version(f"{major}.{minor}.{micro}") for micro in range(MAX_MICRO + 1)]
+
+
+def supports(requires_python: t.Optional[str], python: Version) -> bool:
+    """
+    True if some release the python request may be satisfied by is supported, so
+    ``>=3.8.1`` supports 3.8 and ``!=3.9.0`` supports 3.9.
+    """
+    if not requires_python:
+        return True
+    # versions compare equal regardless of trailing zeros (3.8 == 3.8.0)
+    return _supports(requires_python, str(python))
+
+
+@lru_cache(maxsize=None)
+def _supports(requires_python: str, python: str) -> bool:
+    try:
+        specifier = SpecifierSet(requires_python)
+    except InvalidSpecifier:
+        return True
+    return any(
+        specifier.contains(version, prereleases=True)
+        for version in micros(Version(python))
+    )
+
+
+def candidates(
+    dep: Dependency, index: PackageIndex, python: Version
+) -> t.Tuple[t.List[str], t.List[str]]:
+    """
+    The released versions that satisfy the dependency's specifier, and the subset
+    of them that support the python version, both highest first.
+    """
+    releases = index.fetch(dep.package)["releases"]
+    matching = index.versions(dep.package, str(dep.specifier), prereleases=True)
+    matching.reverse()
+    return matching, [
+        version
+        for version in matching
+        if supports(releases[version].get("requires_python"), python)
+    ]
+
+
+def conflicts(
+    dep: Dependency,
+    versions: t.List[str],
+    others: t.Dict[str, t.List[str]],
+    index: PackageIndex,
+    python: Version,
+) -> t.Optional[t.List[str]]:
+    """
+    Find the requirements of every candidate release of the dependency on the other
+    matrix dependencies that none of their candidates satisfy. Returns None if some
+    candidate has no such conflict or too many candidates would have to be checked.
+    """
+    releases = micros(python)
+    environments = [
+        {
+            "python_version": f"{release.major}.{release.minor}",
+            "python_full_version": str(release),
+            "extra": "",
+        }
+        for release in (releases[0], releases[-1])
+    ]
+    found: t.List[str] = []
+    for version in versions[:MAX_CANDIDATES]:
+        conflicting = []
+        for line in index.release(dep.package, version)["requires_dist"]:
+            try:
+                req = Requirement(line)
+            except InvalidRequirement:
+                continue
+            name = canonicalize_name(req.name)
+            # requirements whose markers differ between the micro releases the run
+            # may get can not be decided, so they are not conflicts
+            if name not in others or (
+                req.marker is not None
+                and not all(req.marker.evaluate(env) for env in environments)
+            ):
+                continue
+            if not any(
+                req.specifier.contains(other, prereleases=True)
+                for other in others[name]
+            ):
+                conflicting.append(f"{dep.package}=={version} requires {req}")
+        if not conflicting:
+            return None
+        found.extend(conflicting)
+    return found if len(versions) <= MAX_CANDIDATES else None
+
+
+def check(
+    run: Run, index: PackageIndex, requires_python: t.Optional[str] = None
+) -> Verdict:
+    """
+    Statically decide whether the run's dependencies can be resolved.
+
+    :param run: the run to check
+    :param index: the package index to fetch release metadata from
+    :param requires_python: the project's requires-python specifier
+    """
+    python = python_version(run.python)
+    if python is None:
+        return Verdict(
+            run, Satisfiability.UNKNOWN, [f"unrecognized python {run.python}"]
+        )
+    if not supports(requires_python, python):
+        return Verdict(
+            run,
+            Satisfiability.UNSATISFIABLE,
+            [f"the project requires python {requires_python}"],
+        )
+    reasons: t.List[str] = []
+    unknown: t.List[str] = []
+    compatible: t.Dict[str, t.List[str]] = {}
+    for dep in run.dependencies:
+        if dep.requirement.url:
+            unknown.append(f"{dep.package} is installed from a url")
+            continue
+        try:
+            matching, supported = candidates(dep, index, python)
+        except IndexUnavailable as err:
+            unknown.append(str(err))
+            continue
+        if not matching:
+            reasons.append(f"no release of {dep.package} satisfies {dep.specifier}")
+        elif not supported:
+            latest = index.fetch(dep.package)["releases"][matching[0]]
+            reasons.append(
+                f"no release of {dep} supports python {python}, "
+                f"{dep.package}=={matching[0]} requires python "
+                f"{latest['requires_python']}"
+            )
+        else:
+            compatible[dep.package] = supported
+    if not reasons:
+        for dep in run.dependencies:
+            if dep.package not in compatible:
+                continue
+            others = {
+                pkg: versions
+                for pkg, versions in compatible.items()
+                if pkg != dep.package
+            }
+            try:
+                found = conflicts(dep, compatible[dep.package], others, index, python)
+            except IndexUnavailable as err:
+                unknown.append(str(err))
+                continue
+            reasons.extend(found or [])
+    if reasons:
+        return Verdict(run, Satisfiability.UNSATISFIABLE, reasons)
+    if unknown:
+        return Verdict(run, Satisfiability.UNKNOWN, unknown)
+    return Verdict(run, Satisfiability.SATISFIABLE)
+
+
+def preflight(
+    runs: t.Iterable[Run],
+    index: PackageIndex,
+    requires_python: t.Optional[str] = None,
+) -> t.List[Verdict]:
+    """
+    Check the runs, fetching the metadata of their dependencies concurrently first.
+    """
+    runs = list(runs)
+    try:
+        index.prefetch(
+            dep.package
+            for run in runs
+            for dep in run.dependencies
+            if not dep.requirement.url
+        )
+    except IndexUnavailable:
+        # reported per run by check
+        pass
+    with ThreadPoolExecutor(max_workers=index.max_workers) as pool:
+        return list(pool.map(lambda run: check(run, index, requires_python), runs))
@@ -0,0 +1,251 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+import typing as t
+from contextlib import nullcontext
+from dataclasses import astuple, dataclass, field, fields
+from pathlib import Path
+
+from .config import ID_LENGTH, Run, hash_list
+from .lock import requirement_lines
+
+RESULTS_DB = "results.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ident TEXT NOT NULL,
+    env TEXT NOT NULL,
+    python TEXT NOT NULL,
+    lock_hash TEXT,
+    command TEXT NOT NULL,
+    exit_code INTEGER NOT NULL,
+    bootstrap_time REAL,
+    command_time REAL,
+    peak_rss INTEGER,
+    started REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_ident ON results (ident, id);
+"""
+
+
+def lock_hash(run: Run) -> t.Optional[str]:
+    """
+    Hash the resolved requirements of the run, None if it has not been generated.
+    """
+    lock = run.group.env.cfg.lock
+    if lock is not None and run.ident in lock.runs:
+        lines = lock.requirements(run.ident)
+    else:
+        requirements = run.directory / "requirements.txt"
+        if not requirements.is_file():
+            return None
+        lines = requirement_lines(requirements.read_text())
+    return hash_list(*(f"{line}\n" for line in lines))[:ID_LENGTH]
+
+
+@dataclass
+class Result:
+    ident: str
+    env: str
+    python: str
+    lock_hash: t.Optional[str]
+    command: str
+    exit_code: int
+    bootstrap_time: t.Optional[float] = None
+    command_time: t.Optional[float] = None
+    # bytes
+    peak_rss: t.Optional[int] = None
+    started: float = field(default_factory=time.time)
+
+    @property
+    def passed(self) -> bool:
+        return self.exit_code == 0
+
+    @classmethod
+    def columns(cls) -> t.List[str]:
+        return [fld.name for fld in fields(cls)]
+
+
+def execute(
+    command: str,
+    env: t.Optional[t.Dict[str, str]] = None,
+    log: t.Optional[Path] = None,
+) -> t.Tuple[int, float, t.Optional[int]]:
+    """
+    Run the shell command and return its exit code, wall time and the peak resident
+    set size in bytes of it and its children (where the platform reports it). If a
+    log file is given the command's output is written to it.
+    """
+    start = time.perf_counter()
+    with open(log, "wb") if log else nullcontext() as output:
+        proc = subprocess.Popen(
+            command,
+            shell=True,
+            env=env,
+            stdout=output,
+            stderr=subprocess.STDOUT if output else None,
+        )
+    if not hasattr(os, "wait4"):
+        return proc.wait(), time.perf_counter() - start, None
+    _, status, usage = os.wait4(proc.pid, 0)
+    elapsed = time.perf_counter() - start
+    proc.returncode = (
+        os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+    )
+    # linux reports kilobytes, macOS reports bytes
+    scale = 1 if sys.platform == "darwin" else 1024
+    return proc.returncode, elapsed, usage.ru_maxrss * scale
+
+
+@dataclass
+class ResultStore:
+    """
+    An SQLite database of run results. Results are buffered and written in batches;
+    the database uses write-ahead logging so several ptm processes may record and
+    query results at the same time.
+    """
+
+    path: Path
+    batch_size: int = 32
+    flush_interval: float = 5.0
+
+    _pending: t.List[Result] = field(default_factory=list, init=False, repr=False)
+    _last_flush: float = field(default_factory=time.monotonic, init=False, repr=False)
+
+    def __post_init__(self):
+        os.makedirs(self.path.parent, exist_ok=True)
+        conn = self.connect()
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def __enter__(self) -> "ResultStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.flush()
+
+    def record(self, result: Result) -> None:
+        self._pending.append(result)
+        if (
+            len(self._pending) >= self.batch_size
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        columns = Result.columns()
+        conn = self.connect()
+        try:
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO results ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' for _ in columns)})",
+                    [astuple(result) for result in self._pending],
+                )
+        finally:
+            conn.close()
+        self._pending.clear()
+
+    def _query(self, sql: str, *params: t.Any) -> t.List[Result]:
+        columns = Result.columns()
+        conn = self.connect()
+        try:
+            return [
+                Result(**{col: row[col] for col in columns})
+                for row in conn.execute(sql, params)
+            ]
+        finally:
+            conn.close()
+
+    def latest(self) -> t.List[Result]:
+        """The most recent result of each run."""
+        return self._query(
+            "SELECT * FROM results WHERE id IN "
+            "(SELECT MAX(id) FROM results GROUP BY ident) ORDER BY env, ident"
+        )
+
+    def history(self, ident: str) -> t.List[Result]:
+        """All results of the run, most recent first."""
+        return self._query(
+            "SELECT * FROM results WHERE ident = ? ORDER BY id DESC", ident
+        )
+
+    def slowest(self, limit: int = 10) -> t.List[Result]:
+        """The latest results of the runs with the longest command times."""
+        return self._query(
+            "SELECT * FROM results WHERE id IN "
+            "(SELECT MAX(id) FROM results GROUP BY ident) "
+            "ORDER BY command_time DESC LIMIT ?",
+            limit,
+        )
+
+    def flaky(self) -> t.List[Result]:
+        """
+        The latest result of each run that both passed and failed with the same
+        resolved requirements.
+        """
+        return self._query(
+            "SELECT * FROM results WHERE id IN ("
+            "  SELECT MAX(id) FROM results GROUP BY ident, lock_hash"
+            "  HAVING MIN(exit_code = 0) = 0 AND MAX(exit_code = 0) = 1"
+            ") ORDER BY env, ident"
+        )
+
+    def failed(self) -> t.List[Result]:
+        """The runs whose most recent result failed."""
+        return [result for result in self.latest() if not result.passed]
+
+
+def record_result(
+    store: t.Optional[ResultStore],
+    run: t.Union[Run, t.Mapping[str, t.Any]],
+    command: str,
+    exit_code: int,
+    lock_hash: t.Optional[str],
+    bootstrap_time: t.Optional[float] = None,
+    command_time: t.Optional[float] = None,
+    peak_rss: t.Optional[int] = None,
+    started: t.Optional[float] = None,
+) -> Result:
+    """
+    Build the result of running the command in the run and record it in the store,
+    if any.
+
+    :param run: a configured run, or a run described by the index of ``ptm serve``
+        (its ident, env and python)
+    :param lock_hash: the hash of the requirements the command ran with
+    :param started: the time the run's bootstrap started, now by default
+    """
+    if isinstance(run, Run):
+        ident, env, python = run.ident, run.group.env.name, run.python
+    else:
+        ident, env, python = run["ident"], run["env"], run["python"]
+    result = Result(
+        ident=ident,
+        env=env,
+        python=python,
+        lock_hash=lock_hash,
+        command=command,
+        exit_code=exit_code,
+        bootstrap_time=bootstrap_time,
+        command_time=command_time,
+        peak_rss=peak_rss,
+        started=time.time() if started is None else started,
+    )
+    if store is not None:
+        store.record(result)
+    return result
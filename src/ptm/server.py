@@ -0,0 +1,261 @@
+"""
+A resident ptm process that keeps the parsed configuration, the run index and venv
+freshness state warm for thin clients connecting over a unix domain socket.
+
+The protocol is one JSON request line per connection, ``{"op": ..., "args": {...}}``,
+answered by one JSON line, ``{"result": ...}`` or ``{"error": ...}``.
+"""
+
+import hashlib
+import json
+import os
+import socketserver
+import threading
+import time
+import typing as t
+import warnings
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from dotenv import dotenv_values
+
+from .config import Config, Run, find_config, initialize
+from .preflight import Satisfiability, preflight
+from .results import lock_hash
+from .sockets import check_owner, check_peer, private_dir, runtime_dir
+from .sockets import connect as connect_socket
+from .venv import bin_dir
+
+
+def socket_path(config_file: Path) -> Path:
+    """
+    The socket a server for the given configuration file listens on, in the
+    private directory of :func:`ptm.sockets.runtime_dir`.
+    """
+    digest = hashlib.sha256(str(config_file.absolute()).encode()).hexdigest()[:12]
+    return runtime_dir() / f"server-{digest}.sock"
+
+
+def describe(run: Run) -> t.Dict[str, t.Any]:
+    return {
+        "ident": run.ident,
+        "slug": run.slug,
+        "env": run.group.env.name,
+        "python": run.python,
+        "tags": run.tags,
+        "directory": str(run.directory),
+        "active": run.evaluate_markers(),
+    }
+
+
+def select(
+    index: t.Dict[str, t.Any],
+    envs: t.Iterable[str] = (),
+    tags: t.Iterable[str] = (),
+) -> t.List[t.Dict[str, t.Any]]:
+    """
+    Filter the runs of a server's index the same way :meth:`Config.runs` does.
+    """
+    envs, tags = set(envs), set(tags)
+    return [
+        run
+        for run in index["runs"]
+        if run["active"]
+        and (not envs or run["env"] in envs)
+        and (not tags or any(tag in tags for tag in run["tags"]))
+    ]
+
+
+class ServerError(Exception):
+    pass
+
+
+@dataclass
+class Client:
+    path: Path
+    timeout: t.Optional[float] = None
+
+    def request(self, op: str, **args: t.Any) -> t.Any:
+        with connect_socket(self.path, self.timeout) as sock:
+            with sock.makefile("rwb") as stream:
+                stream.write(json.dumps({"op": op, "args": args}).encode() + b"\n")
+                stream.flush()
+                response = json.loads(stream.readline())
+        if "error" in response:
+            raise ServerError(response["error"])
+        return response["result"]
+
+
+def connect(config_file: t.Optional[Path] = None) -> t.Optional[Client]:
+    """
+    Return a client for the server of the configuration file if one is running.
+    Set ``PTM_NO_SERVER`` to always run in process.
+    """
+    if os.environ.get("PTM_NO_SERVER", "").lower() not in ("", "0", "false"):
+        return None
+    config_file = config_file or find_config()
+    if config_file is None:
+        return None
+    path = socket_path(config_file)
+    if not path.exists():
+        return None
+    client = Client(path, timeout=1)
+    try:
+        client.request("ping")
+    except PermissionError as err:
+        warnings.warn(f"Not connecting to ptm serve: {err}")
+        return None
+    except (OSError, ValueError, ServerError):
+        return None
+    client.timeout = None
+    return client
+
+
+@dataclass
+class ServerState:
+    config_file: Path
+    cfg: t.Optional[Config] = None
+    mtime: float = 0
+    lock_mtime: float = 0
+
+    # the lock hash each run's venv was last bootstrapped with
+    fresh: t.Dict[str, t.Optional[str]] = field(default_factory=dict)
+    _index: t.Optional[t.Dict[str, t.Any]] = None
+    lock: threading.RLock = field(default_factory=threading.RLock)
+
+    @property
+    def config(self) -> Config:
+        mtime = self.config_file.stat().st_mtime
+        if self.cfg is None or mtime != self.mtime:
+            self.cfg = initialize(self.config_file)
+            self.mtime = mtime
+            self._index = None
+            self.fresh.clear()
+        elif self.cfg.lock is not None:
+            # pick up lock files rewritten by other processes
+            lock_mtime = (
+                self.cfg.lock.path.stat().st_mtime
+                if self.cfg.lock.path.is_file()
+                else 0
+            )
+            if lock_mtime != self.lock_mtime:
+                self.cfg.__dict__.pop("lock", None)
+                self.lock_mtime = lock_mtime
+        return self.cfg
+
+    def ping(self) -> str:
+        return str(self.config_file)
+
+    def index(self) -> t.Dict[str, t.Any]:
+        """
+        The runs, environments and tags of the configuration.
+        """
+        cfg = self.config
+        if self._index is None:
+            self._index = {
+                "directory": str(cfg.directory),
+                "environments": list(cfg.environments.keys()),
+                "tags": list(cfg.tag_table.keys()),
+                "runs": [
+                    describe(run)
+                    for env in cfg.environments.values()
+                    for group in env.matrix
+                    for run in group.runs
+                ],
+            }
+        return self._index
+
+    def generate(self, idents: t.List[str]) -> t.Dict[str, int]:
+        cfg = self.config
+        run_table: t.Dict[str, int] = {}
+        with cfg.deferred_lock():
+            for ident in idents:
+                run = cfg.id_table[ident].generate()
+                self.fresh.pop(ident, None)
+                run_table.setdefault(run.group.env.name, 0)
+                run_table[run.group.env.name] += 1
+        return run_table
+
+    def preflight(self, idents: t.List[str]) -> t.Dict[str, str]:
+        """
+        The runs a pre-flight check finds unsatisfiable, and why.
+        """
+        cfg = self.config
+        verdicts = preflight(
+            [cfg.id_table[ident] for ident in idents], cfg.index, cfg.requires_python
+        )
+        return {
+            verdict.run.ident: str(verdict)
+            for verdict in verdicts
+            if verdict.satisfiability is Satisfiability.UNSATISFIABLE
+        }
+
+    def bootstrap(self, ident: str) -> t.Dict[str, t.Any]:
+        """
+        Make sure the run's venv is installed and current, reinstalling it only if
+        its resolved requirements changed since it was last bootstrapped by this
+        server. Returns the environment variables to run commands with.
+        """
+        run = self.config.id_table[ident]
+        start = time.perf_counter()
+        if not run.env_file.is_file():
+            run.generate()
+        lock = lock_hash(run)
+        if lock is None or self.fresh.get(ident) != lock or not run.venv.is_dir():
+            with self.config.driver.bootstrap(run):
+                pass
+            self.fresh[ident] = lock_hash(run)
+        run.touch()
+        return {
+            **describe(run),
+            "lock_hash": self.fresh[ident],
+            "bootstrap_time": time.perf_counter() - start,
+            "bin": str(bin_dir(run.venv)),
+            "setenv": {
+                key: value
+                for key, value in dotenv_values(run.env_file).items()
+                if value is not None
+            },
+        }
+
+    def handle(self, op: str, args: t.Dict[str, t.Any]) -> t.Any:
+        if op not in ("ping", "index", "generate", "preflight", "bootstrap"):
+            raise ServerError(f"Unknown operation: {op}")
+        if op == "ping":
+            return self.ping()
+        with self.lock:
+            return getattr(self, op)(**args)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    server: "Server"
+
+    def handle(self):
+        try:
+            check_peer(self.request)
+            request = json.loads(self.rfile.readline())
+            response = {
+                "result": self.server.state.handle(request["op"], request["args"])
+            }
+        except (Exception, SystemExit) as err:
+            response = {"error": f"{type(err).__name__}: {err}"}
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    state: ServerState
+
+    def __init__(self, config_file: Path):
+        self.state = ServerState(config_file=config_file)
+        self.state.index()
+        path = socket_path(config_file)
+        private_dir(path.parent)
+        if path.exists() or path.is_symlink():
+            check_owner(path)
+            path.unlink()
+        super().__init__(str(path), RequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        Path(self.server_address).unlink(missing_ok=True)  # type: ignore
@@ -0,0 +1,95 @@
+"""
+Unix domain sockets private to the current user, shared by ``ptm serve`` and the
+``ptm run --worker`` workers.
+
+Sockets are kept in :func:`runtime_dir` rather than in the run directories because
+unix socket paths are limited in length. Clients only connect to sockets owned by
+the current user and, where the platform reports peer credentials, both sides
+refuse processes of other users.
+
+The worker script imports this module by file name in a venv interpreter that may
+not have ptm installed, so it may only import the standard library.
+"""
+
+import os
+import socket
+import stat
+import struct
+import tempfile
+import typing as t
+from pathlib import Path
+
+
+def runtime_dir() -> Path:
+    """
+    The directory ptm's sockets are kept in, ``$XDG_RUNTIME_DIR/ptm`` or
+    ``ptm-<uid>`` in the temporary directory. It is only created by
+    :func:`private_dir` when a socket is served.
+    """
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return Path(runtime) / "ptm"
+    return Path(tempfile.gettempdir()) / f"ptm-{os.getuid()}"
+
+
+def private_dir(directory: Path) -> Path:
+    """
+    Create the directory so only the current user can access it.
+
+    :raises PermissionError: if the directory exists but another user owns it or
+        others can access it
+    """
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(directory)
+    if (
+        not stat.S_ISDIR(info.st_mode)
+        or info.st_uid != os.getuid()
+        or info.st_mode & 0o077
+    ):
+        raise PermissionError(
+            f"{directory} must be a directory that only you can access."
+        )
+    return directory
+
+
+def check_owner(path: Path):
+    """
+    Refuse a socket path that is not a socket owned by the current user.
+    """
+    info = os.lstat(path)
+    if not stat.S_ISSOCK(info.st_mode) or info.st_uid != os.getuid():
+        raise PermissionError(f"{path} is not a socket owned by you.")
+
+
+def check_peer(sock: socket.socket):
+    """
+    Refuse a connection to or from a process of another user, where the platform
+    reports the peer's credentials.
+    """
+    if not hasattr(socket, "SO_PEERCRED"):
+        return
+    credentials = sock.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+    )
+    _, uid, _ = struct.unpack("3i", credentials)
+    if uid != os.getuid():
+        raise PermissionError(f"The peer process belongs to another user ({uid}).")
+
+
+def connect(path: Path, timeout: t.Optional[float] = None) -> socket.socket:
+    """
+    Connect to a socket owned by, and a process run by, the current user.
+    """
+    check_owner(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(str(path))
+        check_peer(sock)
+    except OSError:
+        sock.close()
+        raise
+    return sock
@@ -0,0 +1,131 @@
+"""
+Fast, read-only TOML loading for configuration files.
+
+Configurations are parsed with :mod:`tomllib` (or tomli on python < 3.11), which is
+much faster than the style preserving tomlkit parser. tomllib does not report
+positions, so :func:`matrix_lines` makes a single lexical pass over the text to
+find the line of each ``tool.ptm.env.<name>.matrix`` entry for diagnostics.
+"""
+
+import re
+import sys
+import typing as t
+
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+TOMLDecodeError = tomllib.TOMLDecodeError
+
+ENV_PREFIX = ("tool", "ptm", "env")
+
+
+def loads(text: str) -> t.Dict[str, t.Any]:
+    return tomllib.loads(text)
+
+
+def _split_key(key: str) -> t.Tuple[str, ...]:
+    """
+    Split a dotted TOML key into its parts, honoring quoted parts.
+    """
+    parts: t.List[str] = []
+    current: t.List[str] = []
+    quote: t.Optional[str] = None
+    for char in key:
+        if quote:
+            if char == quote:
+                quote = None
+            else:
+                current.append(char)
+        elif char in "\"'":
+            quote = char
+        elif char == ".":
+            parts.append("".join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    parts.append("".join(current).strip())
+    return tuple(parts)
+
+
+_STRUCTURAL = re.compile(r"[\[\]{}=\n#\"']")
+
+
+def _structure(text: str) -> t.Generator[t.Tuple[int, str, int], None, None]:
+    """
+    Yield (line number, character, offset) for each bracket, brace, equals sign and
+    newline of the text that is not inside a string or a comment.
+    """
+    lineno, idx, end = 1, 0, len(text)
+    while True:
+        match = _STRUCTURAL.search(text, idx)
+        if match is None:
+            return
+        idx = match.start()
+        char = text[idx]
+        if char == "#":
+            newline = text.find("\n", idx)
+            idx = end if newline < 0 else newline
+            continue
+        if char in "\"'":
+            delim = char * 3 if text.startswith(char * 3, idx) else char
+            close = text.find(delim, idx + len(delim))
+            while close > 0 and char == '"':
+                # a basic string quote is escaped by an odd number of backslashes
+                start = close
+                while start > idx and text[start - 1] == "\\":
+                    start -= 1
+                if (close - start) % 2 == 0:
+                    break
+                close = text.find(delim, close + 1)
+            close = end if close < 0 else close + len(delim)
+            lineno += text.count("\n", idx, close)
+            idx = close
+            continue
+        yield lineno, char, idx
+        if char == "\n":
+            lineno += 1
+        idx += 1
+
+
+def matrix_lines(text: str) -> t.Dict[str, t.List[int]]:
+    """
+    Find the line numbers of the matrix entries of each environment in the text.
+    Entries of inline environment tables are not located.
+
+    :param text: the TOML document
+    :return: a mapping of environment names to the line of each of their matrix
+        entries, in order
+    """
+    lines: t.Dict[str, t.List[int]] = {}
+    table: t.Tuple[str, ...] = ()
+    depth = 0
+    key_start = 0
+    matrix_env: t.Optional[str] = None
+    chars = _structure(text)
+    for lineno, char, idx in chars:
+        if depth == 0 and char == "[" and not text[key_start:idx].strip():
+            # a [table] or [[array.of.tables]] header
+            array_table = text.startswith("[[", idx)
+            close = text.find("]]" if array_table else "]", idx)
+            table = _split_key(text[idx + (2 if array_table else 1) : close])
+            if array_table and table[:3] == ENV_PREFIX and table[4:] == ("matrix",):
+                lines.setdefault(table[3], []).append(lineno)
+            while idx < close + (1 if array_table else 0):
+                lineno, char, idx = next(chars)
+            key_start = idx + 1
+        elif char == "=" and depth == 0:
+            key = table + _split_key(text[key_start:idx])
+            is_matrix = key[:3] == ENV_PREFIX and key[4:] == ("matrix",)
+            matrix_env = key[3] if is_matrix else None
+        elif char in "[{":
+            depth += 1
+            if matrix_env is not None and char == "{" and depth == 2:
+                lines.setdefault(matrix_env, []).append(lineno)
+        elif char in "]}":
+            depth -= 1
+        elif char == "\n" and depth == 0:
+            key_start = idx + 1
+            matrix_env = None
+    return lines
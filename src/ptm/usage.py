@@ -0,0 +1,331 @@
+"""
+Disk usage accounting and size-budgeted garbage collection of the ptm directory.
+
+Each venv's size and last use are recorded in a small SQLite ledger when the venv
+is used. A venv is only measured again when the modification times of its root and
+site-packages directories change, which installing or removing packages does, so
+the total size is known without walking the tree.
+
+:func:`collect` removes the run directories of runs that are no longer configured,
+then removes the least recently used venvs until the recorded total fits the
+budget. Evicted venvs are rebuilt from the run's requirements on their next use.
+"""
+
+import os
+import re
+import shutil
+import sqlite3
+import time
+import typing as t
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .venv import disk_usage
+
+if t.TYPE_CHECKING:
+    from .config import Config
+
+USAGE_DB = "usage.db"
+
+# the most seconds between opportunistic collections that only remove orphans
+COLLECT_INTERVAL = 24 * 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    stamp TEXT NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+UNITS = {
+    "": 1,
+    "b": 1,
+    "k": 1000,
+    "kb": 1000,
+    "m": 1000**2,
+    "mb": 1000**2,
+    "g": 1000**3,
+    "gb": 1000**3,
+    "t": 1000**4,
+    "tb": 1000**4,
+    "kib": 1024,
+    "mib": 1024**2,
+    "gib": 1024**3,
+    "tib": 1024**4,
+}
+
+
+def parse_size(size: t.Union[str, int]) -> int:
+    """
+    Parse a size like ``10GB``, ``512MiB`` or a number of bytes.
+    """
+    if isinstance(size, int):
+        return size
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]*)\s*", size)
+    assert match and match.group(2).lower() in UNITS, f"Invalid size: {size}"
+    return int(float(match.group(1)) * UNITS[match.group(2).lower()])
+
+
+def format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1000:
+            return f"{size:.0f}{unit}"
+        size = size / 1000  # type: ignore[assignment]
+    return f"{size:.1f}TB"
+
+
+def stamp(venv: Path) -> str:
+    """
+    A cheap fingerprint of the venv's installed packages.
+    """
+    paths = [
+        venv,
+        *venv.glob("lib/python*/site-packages"),
+        *venv.glob("Lib/site-packages"),
+    ]
+    return ",".join(str(path.stat().st_mtime_ns) for path in paths if path.exists())
+
+
+@dataclass
+class UsageLedger:
+    """
+    The recorded size and last use of each venv under root, keyed by their paths
+    relative to it.
+    """
+
+    root: Path
+
+    def __post_init__(self):
+        os.makedirs(self.root, exist_ok=True)
+        conn = self.connect()
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    @property
+    def path(self) -> Path:
+        return self.root / USAGE_DB
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def key(self, venv: Path) -> str:
+        return venv.absolute().relative_to(self.root.absolute()).as_posix()
+
+    def touch(self, venv: Path, last_used: t.Optional[float] = None):
+        """
+        Record that the venv was used, measuring it if it changed since it was last
+        measured.
+        """
+        if not venv.is_dir():
+            return
+        key, current = self.key(venv), stamp(venv)
+        last_used = time.time() if last_used is None else last_used
+        conn = self.connect()
+        try:
+            with conn:
+                row = conn.execute(
+                    "SELECT stamp FROM usage WHERE path = ?", (key,)
+                ).fetchone()
+                if row is not None and row[0] == current:
+                    conn.execute(
+                        "UPDATE usage SET last_used = ? WHERE path = ?",
+                        (last_used, key),
+                    )
+                    return
+                conn.execute(
+                    "INSERT OR REPLACE INTO usage VALUES (?, ?, ?, ?)",
+                    (key, disk_usage(venv), current, last_used),
+                )
+        finally:
+            conn.close()
+
+    def forget(self, path: Path):
+        """
+        Remove the records of path and every venv below it.
+        """
+        key = self.key(path)
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute(
+                    "DELETE FROM usage WHERE path = ? OR path LIKE ? ESCAPE '\\'",
+                    (key, key.replace("%", "\\%").replace("_", "\\_") + "/%"),
+                )
+        finally:
+            conn.close()
+
+    def entries(self) -> t.List[t.Tuple[Path, int, float]]:
+        """
+        The recorded venvs with their sizes and last use, least recently used first.
+        """
+        conn = self.connect()
+        try:
+            return [
+                (self.root / key, size, last_used)
+                for key, size, last_used in conn.execute(
+                    "SELECT path, size, last_used FROM usage ORDER BY last_used, path"
+                )
+            ]
+        finally:
+            conn.close()
+
+    def total(self) -> int:
+        conn = self.connect()
+        try:
+            (total,) = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM usage"
+            ).fetchone()
+            return total
+        finally:
+            conn.close()
+
+    def get(self, key: str, default: float = 0) -> float:
+        conn = self.connect()
+        try:
+            row = conn.execute(
+                "SELECT value FROM meta WHERE key = ?", (key,)
+            ).fetchone()
+            return default if row is None else row[0]
+        finally:
+            conn.close()
+
+    def set(self, key: str, value: float):
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+        finally:
+            conn.close()
+
+
+@dataclass
+class Collection:
+    orphans: t.List[Path] = field(default_factory=list)
+    evicted: t.List[Path] = field(default_factory=list)
+    freed: int = 0
+    total: int = 0
+
+
+def _within(path: Path, directories: t.Iterable[Path]) -> bool:
+    return any(
+        path == directory or directory in path.parents for directory in directories
+    )
+
+
+def orphans(cfg: "Config") -> t.List[Path]:
+    """
+    The run and template directories of the ptm directory that no configured run
+    uses. Only the top two levels of the directory are listed.
+    """
+    found: t.List[Path] = []
+    templates: t.Set[Path] = set()
+    template_directory = getattr(cfg.driver, "template_directory", None)
+    if template_directory is not None:
+        templates = {template_directory(run) for run in cfg.id_table.values()}
+    for child in cfg.directory.iterdir() if cfg.directory.is_dir() else []:
+        if not child.is_dir():
+            continue
+        if child.name == ".templates":
+            found.extend(
+                template
+                for template in child.iterdir()
+                if template.is_dir() and template not in templates
+            )
+        elif child.name.startswith("."):
+            continue
+        elif child.name not in cfg.environments:
+            found.append(child)
+        else:
+            found.extend(
+                run_dir
+                for run_dir in child.iterdir()
+                if run_dir.is_dir() and run_dir.name not in cfg.id_table
+            )
+    return found
+
+
+def collect(
+    cfg: "Config",
+    max_size: t.Optional[int] = None,
+    protect: t.Iterable[Path] = (),
+    dry_run: bool = False,
+) -> Collection:
+    """
+    Remove orphaned run directories, then evict the least recently used venvs
+    until the recorded total is within max_size.
+
+    :param cfg: the configuration whose ptm directory is collected
+    :param max_size: the budget in bytes, by default ``cache_max_size``
+    :param protect: venvs that must not be evicted (e.g. ones in use)
+    :param dry_run: report what would be removed without removing it
+    """
+    ledger = cfg.usage
+    max_size = cfg.max_cache_size if max_size is None else max_size
+    result = Collection()
+    recorded = {path: size for path, size, _ in ledger.entries()}
+    for orphan in orphans(cfg):
+        result.orphans.append(orphan)
+        result.freed += sum(
+            size for path, size in recorded.items() if _within(path, [orphan])
+        )
+        if not dry_run:
+            shutil.rmtree(orphan, ignore_errors=True)
+            ledger.forget(orphan)
+
+    # venvs that predate the ledger are measured once
+    for run in cfg.id_table.values():
+        if run.venv.is_dir() and run.venv not in recorded and not dry_run:
+            ledger.touch(run.venv, last_used=run.venv.stat().st_mtime)
+
+    entries = [
+        entry for entry in ledger.entries() if not _within(entry[0], result.orphans)
+    ]
+    protected = {path.absolute() for path in protect}
+    result.total = sum(size for _, size, _ in entries)
+    for path, size, _ in entries:
+        if max_size is None or result.total <= max_size:
+            break
+        if path.absolute() in protected:
+            continue
+        if not path.exists():
+            ledger.forget(path)
+            result.total -= size
+            continue
+        result.evicted.append(path)
+        result.freed += size
+        result.total -= size
+        if not dry_run:
+            shutil.rmtree(path, ignore_errors=True)
+            ledger.forget(path)
+    if not dry_run:
+        ledger.set("collected", time.time())
+    return result
+
+
+def collect_opportunistically(
+    cfg: "Config", protect: t.Iterable[Path] = ()
+) -> t.Optional[Collection]:
+    """
+    Collect if a cache budget is configured and either the recorded total exceeds
+    it or orphans have not been removed for COLLECT_INTERVAL seconds. The checks
+    are two small queries of the ledger.
+    """
+    if cfg.max_cache_size is None:
+        return None
+    ledger = cfg.usage
+    if (
+        ledger.total() <= cfg.max_cache_size
+        and time.time() - ledger.get("collected") < COLLECT_INTERVAL
+    ):
+        return None
+    return collect(cfg, protect=protect)
@@ -0,0 +1,152 @@
+"""
+Utilities for copying and relocating virtual environments on disk.
+"""
+
+import os
+import shutil
+import sys
+import typing as t
+from pathlib import Path
+from platform import platform
+
+# linux FICLONE ioctl request number (_IOW(0x94, 9, int))
+FICLONE = 0x40049409
+
+# set to False the first time the filesystem refuses a reflink so we stop trying
+_reflinks_supported = sys.platform.startswith("linux")
+
+
+def bin_dir(venv: Path) -> Path:
+    return venv / ("Scripts" if platform() == "Windows" else "bin")
+
+
+def environment(
+    venv: Path, setenv: t.Mapping[str, t.Optional[str]] = {}
+) -> t.Dict[str, str]:
+    """
+    The current environment with the venv activated and setenv applied.
+    """
+    return {
+        **os.environ,
+        **{key: value for key, value in setenv.items() if value is not None},
+        "VIRTUAL_ENV": str(venv),
+        "PATH": f"{bin_dir(venv)}{os.pathsep}{os.environ.get('PATH', '')}",
+    }
+
+
+def _reflink(src: str, dst: str) -> bool:
+    global _reflinks_supported
+    if not _reflinks_supported:
+        return False
+    import fcntl
+
+    try:
+        with open(src, "rb") as src_fd, open(dst, "wb") as dst_fd:
+            fcntl.ioctl(dst_fd.fileno(), FICLONE, src_fd.fileno())
+    except OSError:
+        _reflinks_supported = False
+        if os.path.exists(dst):
+            os.unlink(dst)
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def clone_file(src: str, dst: str) -> str:
+    """
+    Copy a file as cheaply as the filesystem allows: a copy-on-write reflink where
+    supported, otherwise a hardlink, otherwise a full copy.
+    """
+    if _reflink(src, dst):
+        return dst
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+
+def copy_file(src: str, dst: str) -> str:
+    """
+    Copy a file so it can be modified without modifying src: a copy-on-write
+    reflink where supported, otherwise a full copy.
+    """
+    if not _reflink(src, dst):
+        shutil.copy2(src, dst)
+    return dst
+
+
+def clone_tree(src: Path, dst: Path) -> Path:
+    """
+    Clone the directory tree at src to dst using :func:`clone_file` for each file.
+    """
+    shutil.copytree(src, dst, symlinks=True, copy_function=clone_file)
+    return dst
+
+
+def _replace(candidates: t.Iterable[Path], old: bytes, new: bytes):
+    for candidate in candidates:
+        if candidate.is_symlink() or not candidate.is_file():
+            continue
+        contents = candidate.read_bytes()
+        if old not in contents:
+            continue
+        mode = candidate.stat().st_mode
+        candidate.unlink()
+        candidate.write_bytes(contents.replace(old, new))
+        os.chmod(candidate, mode)
+
+
+def relocate(venv: Path, old: t.Union[str, Path], new: t.Union[str, Path]):
+    """
+    Rewrite the location dependent files of a venv (console script shebangs and
+    activation scripts) that was moved or copied from old to new. Files are replaced
+    rather than written in place so hardlinked originals are left untouched.
+    """
+    old_path, new_path = os.fsencode(str(old)), os.fsencode(str(new))
+    if old_path == new_path:
+        return
+    _replace([*bin_dir(venv).iterdir(), venv / "pyvenv.cfg"], old_path, new_path)
+
+
+def relocate_site_packages(
+    venv: Path, old: t.Union[str, Path], new: t.Union[str, Path]
+):
+    """
+    Rewrite the paths of packages installed from a directory that moved from old to
+    new (e.g. an editable install of the project) in the venv's .pth files and
+    direct_url.json records.
+    """
+    old_path, new_path = os.fsencode(str(old)), os.fsencode(str(new))
+    if old_path == new_path:
+        return
+    for site_packages in [
+        *venv.glob("lib/python*/site-packages"),
+        *venv.glob("Lib/site-packages"),
+    ]:
+        _replace(
+            [
+                *site_packages.glob("*.pth"),
+                *site_packages.glob("*.dist-info/direct_url.json"),
+            ],
+            old_path,
+            new_path,
+        )
+
+
+def disk_usage(*paths: Path) -> int:
+    """
+    The number of bytes used on disk by the given trees, counting files that are
+    hardlinked between them only once.
+    """
+    seen: t.Set[t.Tuple[int, int]] = set()
+    total = 0
+    for path in paths:
+        for root, dirs, files in os.walk(path):
+            for name in (*dirs, *files):
+                stat = os.lstat(os.path.join(root, name))
+                if (stat.st_dev, stat.st_ino) in seen:
+                    continue
+                seen.add((stat.st_dev, stat.st_ino))
+                total += getattr(stat, "st_blocks", 0) * 512 or stat.st_size
+    return total
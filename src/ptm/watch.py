@@ -0,0 +1,430 @@
+"""
+Watch the project for changes and incrementally regenerate and rerun runs.
+
+Changes are collected with inotify on linux, falling back to polling file
+modification times elsewhere or when inotify watches are exhausted. Files matching
+the ``watch_exclude`` glob patterns are not watched. Bursts of events are debounced
+into one batch, which is then classified:
+
+* ``[tool.ptm]`` changes re-expand the configuration and regenerate only the runs
+  :func:`ptm.diff.diff` reports as added or changed,
+* changes to the project's dependencies or ``uv.lock`` regenerate the selected runs,
+* any other change only reruns the command.
+"""
+
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import select
+import struct
+import sys
+import time
+import typing as t
+import warnings
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from dotenv import dotenv_values
+
+from . import toml
+from .config import Config, Run, initialize
+from .diff import diff
+from .results import RESULTS_DB, Result, ResultStore, execute, lock_hash, record_result
+from .venv import environment
+
+DEBOUNCE = 0.3
+POLL_INTERVAL = 0.5
+
+# directories that never hold project inputs
+IGNORED_DIRECTORIES = {"__pycache__", "node_modules", "build", "dist", "htmlcov"}
+
+# reports written by test runs
+IGNORED_FILES = {"coverage.xml", "coverage.json", "junit.xml"}
+
+# the pyproject.toml tables that are inputs of every run's requirements
+DEPENDENCY_TABLES = ("project", "dependency-groups")
+
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+IN_MASK = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+)
+EVENT = struct.Struct("iIII")
+
+
+def ignored(
+    path: Path,
+    root: Path,
+    exclude: t.Container[Path] = (),
+    patterns: t.Sequence[str] = (),
+) -> bool:
+    """
+    Hidden files and directories (e.g. .ptm, .git, .venv, .coverage), caches, build
+    and coverage output, the excluded paths and the paths matching the glob
+    patterns (e.g. ``*.egg-info``), and anything below them, are not watched.
+    """
+    if path in exclude or any(parent in exclude for parent in path.parents):
+        return True
+    try:
+        relative = path.relative_to(root)
+    except ValueError:
+        return False
+    if any(
+        candidate.match(pattern)
+        for candidate in (relative, *relative.parents[:-1])
+        for pattern in patterns
+    ):
+        return True
+    return (
+        any(
+            part.startswith(".") or part in IGNORED_DIRECTORIES
+            for part in relative.parts
+        )
+        or path.suffix in (".pyc", ".pyo")
+        or path.name in IGNORED_FILES
+    )
+
+
+class Watcher(t.Protocol):
+    def wait(self, timeout: t.Optional[float] = None) -> t.Set[Path]:
+        """
+        Block until files change or the timeout passes, returning the changed paths.
+        """
+        ...
+
+
+@dataclass
+class PollingWatcher:
+    root: Path
+    exclude: t.Set[Path] = field(default_factory=set)
+    patterns: t.Sequence[str] = ()
+    interval: float = POLL_INTERVAL
+
+    def __post_init__(self):
+        self._snapshot = self.snapshot()
+
+    def snapshot(self) -> t.Dict[Path, t.Tuple[int, int]]:
+        files: t.Dict[Path, t.Tuple[int, int]] = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            directory = Path(dirpath)
+            dirnames[:] = [
+                name
+                for name in dirnames
+                if not ignored(directory / name, self.root, self.exclude, self.patterns)
+            ]
+            for name in filenames:
+                path = directory / name
+                if ignored(path, self.root, self.exclude, self.patterns):
+                    continue
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                files[path] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def wait(self, timeout: t.Optional[float] = None) -> t.Set[Path]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            current = self.snapshot()
+            changed = {
+                path
+                for path in current.keys() | self._snapshot.keys()
+                if current.get(path) != self._snapshot.get(path)
+            }
+            self._snapshot = current
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            time.sleep(
+                self.interval
+                if deadline is None
+                else max(0, min(self.interval, deadline - time.monotonic()))
+            )
+
+
+class InotifyWatcher:
+    """
+    Recursively watch a directory tree with the linux inotify API.
+    """
+
+    def __init__(
+        self, root: Path, exclude: t.Set[Path] = set(), patterns: t.Sequence[str] = ()
+    ):
+        self.root = root
+        self.exclude = exclude
+        self.patterns = patterns
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches: t.Dict[int, Path] = {}
+        try:
+            self.add(root)
+        except OSError:
+            self.close()
+            raise
+
+    def add(self, directory: Path):
+        for dirpath, dirnames, _ in os.walk(directory):
+            path = Path(dirpath)
+            dirnames[:] = [
+                name
+                for name in dirnames
+                if not ignored(path / name, self.root, self.exclude, self.patterns)
+            ]
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), IN_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, f"Unable to watch {path}: {os.strerror(errno)}")
+            self.watches[wd] = path
+
+    def close(self):
+        os.close(self.fd)
+
+    def wait(self, timeout: t.Optional[float] = None) -> t.Set[Path]:
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        data = os.read(self.fd, 64 * 1024)
+        changed: t.Set[Path] = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT.unpack_from(data, offset)
+            name = data[offset + EVENT.size : offset + EVENT.size + length]
+            offset += EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                # events were lost, report the whole tree as changed
+                changed.add(self.root)
+                continue
+            if wd not in self.watches:
+                continue
+            if mask & (IN_IGNORED | IN_DELETE_SELF):
+                # the directory was removed, its removal is reported by its parent
+                del self.watches[wd]
+                continue
+            path = self.watches[wd] / os.fsdecode(name.rstrip(b"\0"))
+            if ignored(path, self.root, self.exclude, self.patterns):
+                continue
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    self.add(path)
+                except FileNotFoundError:
+                    # removed again before it could be watched
+                    pass
+                except OSError as err:
+                    warnings.warn(f"Changes below {path} are not watched: {err}")
+            changed.add(path)
+        return changed
+
+
+def watcher(
+    root: Path,
+    exclude: t.Set[Path] = set(),
+    patterns: t.Sequence[str] = (),
+    poll: bool = False,
+) -> Watcher:
+    """
+    An inotify watcher of the tree where available, otherwise a polling watcher.
+    """
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(root, exclude, patterns)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(root, exclude, patterns)
+
+
+def debounce(source: Watcher, delay: float = DEBOUNCE) -> t.Set[Path]:
+    """
+    Wait for changes and collect further changes until none arrive for delay
+    seconds.
+    """
+    changes = source.wait()
+    while True:
+        more = source.wait(delay)
+        if not more:
+            return changes
+        changes |= more
+
+
+def drain(source: Watcher) -> t.Set[Path]:
+    """
+    Collect the changes that are already pending without waiting for more.
+    """
+    changes: t.Set[Path] = set()
+    while True:
+        more = source.wait(0)
+        if not more:
+            return changes
+        changes |= more
+
+
+@dataclass
+class Rewrites:
+    """
+    Tells edits apart from files a command rewrites with the same content on every
+    run (e.g. egg-info, a generated ``_version.py`` or test snapshots), which would
+    otherwise rerun the command endlessly.
+    """
+
+    digests: t.Dict[Path, str] = field(default_factory=dict)
+
+    def edited(self, paths: t.Iterable[Path], since: float) -> t.Set[Path]:
+        """
+        The paths modified after the given time whose content differs from the
+        last time they were seen. Removed paths are left out, they are mostly the
+        command's temporary files.
+        """
+        edited = set()
+        for path in paths:
+            try:
+                if path.stat().st_mtime <= since:
+                    continue
+                digest = hashlib.sha256(path.read_bytes()).hexdigest()
+            except OSError:
+                continue
+            if self.digests.get(path) != digest:
+                edited.add(path)
+            self.digests[path] = digest
+        return edited
+
+
+@dataclass
+class WatchSession:
+    """
+    The state of a watch: the current configuration and the runs to rerun the
+    command in. If idents are pinned only those runs are rerun, otherwise the runs
+    selected by the environment and tag filters are.
+    """
+
+    config_file: Path
+    command: str
+    pinned: t.List[str] = field(default_factory=list)
+    environments: t.Set[str] = field(default_factory=set)
+    tags: t.Set[str] = field(default_factory=set)
+    report: t.Callable[[str], None] = print
+
+    cfg: Config = field(init=False)
+    inputs: t.Dict[str, t.Any] = field(init=False)
+
+    def __post_init__(self):
+        self.config_file = self.config_file.absolute()
+        self.cfg = initialize(self.config_file)
+        self.inputs = self.dependency_inputs()
+
+    @property
+    def lock_files(self) -> t.Set[Path]:
+        return {self.config_file.parent / "uv.lock"}
+
+    @property
+    def outputs(self) -> t.Set[Path]:
+        """Files ptm writes itself, which must not trigger a rerun."""
+        outputs = {self.cfg.directory.absolute()}
+        if self.cfg.lockfile:
+            outputs.add(self.cfg.project_dir.absolute() / self.cfg.lockfile)
+        return outputs
+
+    def dependency_inputs(self) -> t.Dict[str, t.Any]:
+        doc = toml.loads(self.config_file.read_text())
+        return {table: doc.get(table) for table in DEPENDENCY_TABLES}
+
+    def selected(self) -> t.List[Run]:
+        if self.pinned:
+            return [
+                self.cfg.id_table[ident]
+                for ident in self.pinned
+                if ident in self.cfg.id_table
+            ]
+        return list(self.cfg.runs(environments=self.environments, tags=self.tags))
+
+    def reload(self) -> t.Optional[t.List[Run]]:
+        """
+        Re-expand the configuration and return the runs whose inputs changed, or
+        None if the project's dependencies changed and every run is affected.
+        """
+        try:
+            cfg = initialize(self.config_file)
+            inputs = self.dependency_inputs()
+        except (Exception, SystemExit) as err:
+            self.report(f"Keeping the previous configuration: {err}")
+            return []
+        delta = diff(self.cfg, cfg)
+        self.cfg = cfg
+        for ident in self.pinned:
+            if ident not in cfg.id_table:
+                self.report(f"Pinned run {ident} is no longer configured")
+        if inputs != self.inputs:
+            self.inputs = inputs
+            return None
+        return delta.affected
+
+    def handle(self, changes: t.Set[Path]) -> t.Tuple[t.List[Run], t.List[Run]]:
+        """
+        Regenerate the runs affected by the changed paths.
+
+        :return: the regenerated runs and the runs to rerun the command in
+        """
+        regenerate: t.Optional[t.List[Run]] = []
+        if self.config_file in changes:
+            regenerate = self.reload()
+        if changes & self.lock_files:
+            regenerate = None
+        selected = self.selected()
+        if regenerate is None:
+            regenerate = selected
+        else:
+            idents = {run.ident for run in selected}
+            regenerate = [run for run in regenerate if run.ident in idents]
+        generated = []
+        with self.cfg.deferred_lock():
+            for run in regenerate:
+                try:
+                    generated.append(run.generate())
+                except SystemExit:
+                    self.report(f"{run} failed to generate")
+        sources = changes - {self.config_file} - self.lock_files
+        if sources or self.pinned or regenerate is selected:
+            return generated, selected
+        return generated, generated
+
+    def execute(self, runs: t.Iterable[Run]) -> t.List[Result]:
+        results = []
+        with ResultStore(self.cfg.directory / RESULTS_DB) as store:
+            for run in runs:
+                started, start = time.time(), time.perf_counter()
+                try:
+                    with run.bootstrap():
+                        bootstrap_time = time.perf_counter() - start
+                        exit_code, command_time, peak_rss = execute(
+                            self.command,
+                            env=environment(run.venv, dotenv_values(run.env_file)),
+                        )
+                except SystemExit:
+                    self.report(f"{run} failed to bootstrap")
+                    continue
+                result = record_result(
+                    store,
+                    run,
+                    self.command,
+                    exit_code,
+                    lock_hash=lock_hash(run),
+                    bootstrap_time=bootstrap_time,
+                    command_time=command_time,
+                    peak_rss=peak_rss,
+                    started=started,
+                )
+                results.append(result)
+                status = "passed" if result.passed else f"FAILED ({exit_code})"
+                self.report(f"{run} {status} in {command_time:.1f}s")
+        return results
@@ -0,0 +1,442 @@
+"""
+Long-lived per-run worker processes for ``ptm run --worker``.
+
+A worker is started with a run's venv interpreter and environment and listens on a
+unix domain socket. Each command is executed in a child forked from the worker, so
+modules the worker has imported are not imported again and state does not leak
+between commands. Before forking, the worker imports the package a command invokes
+so the next command finds it loaded. The client passes its stdin, stdout and stderr
+with the request, so commands read and write the client's terminal.
+
+Commands are argument lists: ``python -m module ...``, ``python script.py ...``,
+console script entry points (``pytest ...``), or any other executable, which is
+exec'd in the forked child.
+
+The protocol is one JSON request line per connection, ``{"op": ..., "args": {...}}``.
+``call`` is answered with a ``{"pid": ...}`` line when the command starts and a
+``{"exit_code": ..., "peak_rss": ...}`` line when it finishes, other operations with
+one ``{"result": ...}`` or ``{"error": ...}`` line.
+
+This module is run as a script by the venv interpreter, which may not have ptm
+installed, so it may only import the standard library.
+"""
+
+import array
+import hashlib
+import io
+import json
+import os
+import runpy
+import signal
+import socket
+import subprocess
+import sys
+import sysconfig
+import time
+import traceback
+import typing as t
+from dataclasses import dataclass
+from importlib import import_module
+from importlib.util import find_spec
+from pathlib import Path
+
+# run as a script, this module's directory is first on sys.path
+try:
+    from .sockets import check_owner, check_peer, connect, private_dir, runtime_dir
+except ImportError:
+    from sockets import (  # type: ignore[import-not-found,no-redef]
+        check_owner,
+        check_peer,
+        connect,
+        private_dir,
+        runtime_dir,
+    )
+
+# workers exit after this many seconds without a request
+IDLE_TIMEOUT = 30 * 60
+
+STDIO = (0, 1, 2)
+
+
+def socket_path(directory: Path) -> Path:
+    """
+    The socket the worker of the given run directory listens on.
+    """
+    digest = hashlib.sha256(str(directory.absolute()).encode()).hexdigest()[:12]
+    return runtime_dir() / f"worker-{digest}.sock"
+
+
+class WorkerError(Exception):
+    pass
+
+
+def _exit_code(status: int) -> int:
+    return os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+
+
+def _console_script(name: str) -> t.Optional[str]:
+    """
+    The ``module:attr`` value of the named console script entry point, if any.
+    """
+    from importlib import metadata
+
+    eps: t.Any = metadata.entry_points()
+    scripts = (
+        eps.select(group="console_scripts")
+        if hasattr(eps, "select")
+        else eps.get("console_scripts", [])
+    )
+    for ep in scripts:
+        if ep.name == name:
+            return ep.value
+    return None
+
+
+def _is_python(executable: str) -> bool:
+    name = os.path.basename(executable)
+    return name == "python" or name.startswith("python3")
+
+
+def resolve(
+    argv: t.List[str], cwd: str
+) -> t.Tuple[t.Optional[str], t.Callable[[], t.Any]]:
+    """
+    Resolve a command to the package it runs, if any, and a function that runs it
+    in the current process with the appropriate ``sys.argv`` and ``sys.path``.
+    """
+    if len(argv) > 2 and _is_python(argv[0]) and argv[1] == "-m":
+        module, args = argv[2], argv[3:]
+
+        def run_module():
+            sys.argv = [module, *args]
+            sys.path.insert(0, cwd)
+            runpy.run_module(module, run_name="__main__", alter_sys=True)
+
+        return module.split(".")[0], run_module
+
+    if len(argv) > 1 and _is_python(argv[0]) and not argv[1].startswith("-"):
+        script, args = argv[1], argv[2:]
+
+        def run_script():
+            sys.argv = [script, *args]
+            sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+            runpy.run_path(script, run_name="__main__")
+
+        return None, run_script
+
+    entry_point = _console_script(os.path.basename(argv[0])) if argv else None
+    if entry_point is not None:
+        module, _, attrs = entry_point.partition(":")
+        module = module.strip()
+
+        def run_entry_point():
+            sys.argv = list(argv)
+            obj = import_module(module)
+            for attr in attrs.strip().split("."):
+                obj = getattr(obj, attr)
+            sys.exit(obj())
+
+        return module.split(".")[0], run_entry_point
+
+    def run_executable():
+        os.execvp(argv[0], argv)
+
+    return None, run_executable
+
+
+def _installed(origin: t.Optional[str]) -> bool:
+    """
+    Whether the file is installed in the venv or the standard library, rather than
+    in a checkout (e.g. an editable install) that may change under the worker.
+    """
+    if origin is None:
+        return False
+    paths = sysconfig.get_paths()
+    directories = {
+        os.path.realpath(paths[name])
+        for name in ("purelib", "platlib", "stdlib", "platstdlib")
+    }
+    origin = os.path.realpath(origin)
+    return any(origin.startswith(directory + os.sep) for directory in directories)
+
+
+def preload(package: t.Optional[str]):
+    """
+    Import the package in the worker so forked commands find it loaded. Only
+    installed packages are imported: a plain module may do its work at import
+    time and a checkout's source would be stale once edited.
+    """
+    if package is None or package in sys.modules:
+        return
+    try:
+        spec = find_spec(package)
+        if (
+            spec is not None
+            and spec.submodule_search_locations is not None
+            and _installed(spec.origin)
+        ):
+            import_module(package)
+    except Exception:
+        traceback.print_exc()
+
+
+def _child(
+    argv: t.List[str], env: t.Dict[str, str], cwd: str, fds: t.List[int]
+) -> t.NoReturn:
+    code = 1
+    try:
+        for fd, target in zip(fds, STDIO):
+            os.dup2(fd, target)
+        for fd in fds:
+            os.close(fd)
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(env)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        try:
+            resolve(argv, cwd)[1]()
+            code = 0
+        except SystemExit as exc:
+            if exc.code is None or isinstance(exc.code, int):
+                code = exc.code or 0
+            else:
+                print(exc.code, file=sys.stderr)
+        except BaseException:
+            traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+def _receive_fds(conn: socket.socket) -> t.List[int]:
+    fds = array.array("i")
+    _, ancdata, _, _ = conn.recvmsg(1, socket.CMSG_SPACE(len(STDIO) * fds.itemsize))
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(data[: len(data) - (len(data) % fds.itemsize)])
+    return list(fds)
+
+
+def _send(stream: io.BufferedIOBase, response: t.Dict[str, t.Any]):
+    stream.write(json.dumps(response).encode() + b"\n")
+    stream.flush()
+
+
+def _execute(
+    stream: io.BufferedIOBase,
+    args: t.Dict[str, t.Any],
+    fds: t.List[int],
+    *inherited: int,
+):
+    """
+    Run a command in a forked child and report its pid and result to the client.
+    """
+    preload(resolve(args["argv"], args["cwd"])[0])
+    pid = os.fork()
+    if pid == 0:
+        for fd in inherited:
+            os.close(fd)
+        _child(args["argv"], args["env"], args["cwd"], fds)
+    for fd in fds:
+        os.close(fd)
+    _send(stream, {"pid": pid})
+    _, status, usage = os.wait4(pid, 0)
+    # linux reports kilobytes, macOS reports bytes
+    scale = 1 if sys.platform == "darwin" else 1024
+    _send(
+        stream,
+        {"exit_code": _exit_code(status), "peak_rss": usage.ru_maxrss * scale},
+    )
+
+
+def serve(path: Path, lock_hash: t.Optional[str]):
+    """
+    Accept requests on the socket until stopped or idle for IDLE_TIMEOUT seconds.
+    """
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(str(path))
+    listener.listen()
+    listener.settimeout(IDLE_TIMEOUT)
+    inode = path.stat().st_ino
+
+    def remove():
+        # a replacement worker may already be listening on the path
+        if path.exists() and path.stat().st_ino == inode:
+            path.unlink()
+
+    try:
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except socket.timeout:
+                return
+            conn.settimeout(None)
+            with conn:
+                fds = _receive_fds(conn)
+                try:
+                    check_peer(conn)
+                except PermissionError:
+                    for fd in fds:
+                        os.close(fd)
+                    continue
+                with conn.makefile("rwb") as stream:
+                    request = json.loads(stream.readline())
+                    op = request["op"]
+                    if op == "call":
+                        _execute(
+                            stream,
+                            request["args"],
+                            fds,
+                            listener.fileno(),
+                            conn.fileno(),
+                        )
+                        continue
+                    for fd in fds:
+                        os.close(fd)
+                    if op == "ping":
+                        _send(stream, {"result": {"lock_hash": lock_hash}})
+                    elif op == "stop":
+                        remove()
+                        _send(stream, {"result": os.getpid()})
+                        return
+                    else:
+                        _send(stream, {"error": f"Unknown operation: {op}"})
+    finally:
+        listener.close()
+        remove()
+
+
+@dataclass
+class Worker:
+    path: Path
+
+    def _connect(self, timeout: t.Optional[float] = None) -> socket.socket:
+        return connect(self.path, timeout)
+
+    def request(self, op: str, timeout: t.Optional[float] = 1, **args: t.Any) -> t.Any:
+        with self._connect(timeout) as sock:
+            sock.sendmsg([b"\0"])
+            with sock.makefile("rwb") as stream:
+                stream.write(json.dumps({"op": op, "args": args}).encode() + b"\n")
+                stream.flush()
+                response = json.loads(stream.readline())
+        if "error" in response:
+            raise WorkerError(response["error"])
+        return response["result"]
+
+    def lock_hash(self) -> t.Optional[str]:
+        """
+        The lock hash the running worker was started with, None if it is not running.
+        """
+        try:
+            return self.request("ping")["lock_hash"]
+        except (OSError, ValueError, WorkerError):
+            return None
+
+    def stop(self):
+        """
+        Stop the worker, removing the socket of a worker that is no longer running.
+        """
+        try:
+            self.request("stop")
+        except PermissionError:
+            raise
+        except (OSError, ValueError, WorkerError):
+            if self.path.exists():
+                self.path.unlink()
+
+    def start(
+        self,
+        python: Path,
+        env: t.Dict[str, str],
+        lock_hash: t.Optional[str],
+        log: t.Optional[Path] = None,
+        timeout: float = 10,
+    ):
+        """
+        Start a worker with the given interpreter and environment, replacing any
+        worker already listening on the socket.
+        """
+        private_dir(self.path.parent)
+        self.stop()
+        with open(log or os.devnull, "ab") as err:
+            subprocess.Popen(
+                [str(python), __file__, str(self.path), lock_hash or ""],
+                env=env,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=err,
+                start_new_session=True,
+            )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.path.exists() and self.lock_hash() == (lock_hash or None):
+                return
+            time.sleep(0.01)
+        raise WorkerError(
+            f"The worker for {python} did not start" + (f", see {log}" if log else "")
+        )
+
+    def call(
+        self, argv: t.List[str], env: t.Dict[str, str], cwd: t.Optional[str] = None
+    ) -> t.Tuple[int, float, t.Optional[int]]:
+        """
+        Run the command in a process forked from the worker and return its exit
+        code, wall time and peak resident set size in bytes. Interrupts are
+        forwarded to the command.
+        """
+        start = time.perf_counter()
+        with self._connect() as sock:
+            sock.sendmsg(
+                [b"\0"],
+                [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array("i", STDIO))],
+            )
+            with sock.makefile("rwb") as stream:
+                request = {
+                    "op": "call",
+                    "args": {"argv": argv, "env": env, "cwd": cwd or os.getcwd()},
+                }
+                stream.write(json.dumps(request).encode() + b"\n")
+                stream.flush()
+                pid = None
+                while True:
+                    try:
+                        line = stream.readline()
+                    except KeyboardInterrupt:
+                        if pid is not None:
+                            os.kill(pid, signal.SIGINT)
+                        continue
+                    if not line:
+                        raise WorkerError(f"The worker on {self.path} exited")
+                    response = json.loads(line)
+                    if "error" in response:
+                        raise WorkerError(response["error"])
+                    if "pid" in response:
+                        pid = response["pid"]
+                        continue
+                    return (
+                        response["exit_code"],
+                        time.perf_counter() - start,
+                        response["peak_rss"],
+                    )
+
+
+def main(argv: t.List[str]):
+    # running as a script puts this package first on sys.path where its modules
+    # would shadow the venv's (e.g. toml)
+    if sys.path and sys.path[0] == os.path.dirname(os.path.abspath(__file__)):
+        del sys.path[0]
+    # interrupts are forwarded to commands by the client
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    path, lock_hash = Path(argv[0]), argv[1] if len(argv) > 1 else ""
+    if path.exists() or path.is_symlink():
+        check_owner(path)
+        path.unlink()
+    serve(path, lock_hash or None)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
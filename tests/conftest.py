@@ -0,0 +1,103 @@
+import os
+import subprocess
+import typing as t
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+import ptm.drivers.uv
+from ptm.config import Config, Run, initialize, register_driver
+from ptm.pack import mark_installed
+from ptm.results import lock_hash
+
+
+class FakeDriver:
+    """
+    Generates fixed requirements and bootstraps empty venvs, recording the runs it
+    generated and bootstrapped. populate, if set, fills each venv it bootstraps.
+    """
+
+    def __init__(self):
+        self.requirements = "django==5.1.7\n"
+        self.populate: t.Optional[t.Callable[[Run, Path], None]] = None
+        self.generated: t.List[str] = []
+        self.bootstraps: t.List[str] = []
+
+    def generate(self, run):
+        self.generated.append(run.ident)
+        (run.directory / "requirements.txt").write_text(self.requirements)
+
+    @contextmanager
+    def bootstrap(self, run):
+        self.bootstraps.append(run.ident)
+        os.makedirs(run.venv, exist_ok=True)
+        if self.populate:
+            self.populate(run, run.venv.absolute())
+        mark_installed(run, lock_hash(run))
+        yield
+
+
+@pytest.fixture
+def driver() -> FakeDriver:
+    """A fake driver, registered as ``driver = "fake"``."""
+    fake = FakeDriver()
+    register_driver("fake", fake)
+    return fake
+
+
+@pytest.fixture
+def project(tmp_path) -> t.Callable[..., Config]:
+    """
+    Write the configuration to the pyproject.toml of tmp_path, or of a checkout
+    directory in it, and load it.
+    """
+
+    def write(config: str, checkout: str = "") -> Config:
+        directory = tmp_path / checkout
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / "pyproject.toml").write_text(config)
+        return initialize(directory / "pyproject.toml")
+
+    return write
+
+
+class FakeUV:
+    """
+    The uv commands run by the uv driver, recording the resolutions, the venvs
+    created and the install commands.
+    """
+
+    def __init__(self):
+        self.version = "uv 0.6.0"
+        self.exported = "django==5.0\nasgiref==3.8.1\n"
+        self.compiled = "asgiref==3.8.1\ndjango==5.1.7\n"
+        self.compiles: t.List[t.List[str]] = []
+        self.venvs: t.List[str] = []
+        self.installs: t.List[t.List[str]] = []
+
+    def run(self, cmd, stdout=None, **kwargs):
+        if cmd == ["uv", "--version"]:
+            return subprocess.CompletedProcess(cmd, 0, stdout=f"{self.version}\n")
+        if cmd[:2] == ["uv", "export"]:
+            stdout.write(self.exported)
+        elif cmd[:2] == ["uv", "venv"]:
+            self.venvs.append(cmd[-1])
+            (Path(cmd[-1]) / "bin").mkdir(parents=True, exist_ok=True)
+            (Path(cmd[-1]) / "pyvenv.cfg").write_text(f"home = {cmd[-1]}\n")
+        elif cmd[:3] == ["uv", "pip", "install"]:
+            self.installs.append(cmd)
+        else:
+            self.compiles.append(cmd)
+            stdout.write(self.compiled)
+        return subprocess.CompletedProcess(cmd, 0)
+
+
+@pytest.fixture
+def uv(monkeypatch) -> t.Iterator[FakeUV]:
+    """Replace the uv commands run by the uv driver."""
+    fake = FakeUV()
+    monkeypatch.setattr(ptm.drivers.uv.subprocess, "run", fake.run)
+    ptm.drivers.uv.uv_version.cache_clear()
+    yield fake
+    ptm.drivers.uv.uv_version.cache_clear()
@@ -0,0 +1,59 @@
+import os
+import time
+
+import ptm.drivers.uv
+from ptm.cache import ResolutionCache, resolution_key
+
+CONFIG = """
+[tool.ptm.env.default]
+matrix = [{python = ["3.12", "3.13"], django = "5.1"}]
+"""
+
+
+def test_resolution_cache(tmp_path):
+    key = resolution_key(requirements="django\r\nasgiref\n", python="3.12")
+    assert key == resolution_key(requirements="django\nasgiref", python="3.12")
+    assert key != resolution_key(requirements="django\nasgiref", python="3.13")
+
+    cache = ResolutionCache(tmp_path / "cache", ttl=60)
+    assert cache.get(key) is None
+    cache.put(key, "django==5.1.7\n")
+    assert cache.get(key) == "django==5.1.7\n"
+    expired = resolution_key(requirements="expired")
+    cache.put(expired, "django==4.2\n")
+    os.utime(cache.path(expired), (time.time() - 60, time.time() - 60))
+    assert cache.get(expired) is None
+
+    archive = tmp_path / "resolutions.tar.gz"
+    assert cache.export(archive) == 1
+    assert not cache.path(expired).exists()
+    restored = ResolutionCache(tmp_path / "restored", ttl=60)
+    assert restored.restore(archive) == 1
+    assert restored.get(key) == "django==5.1.7\n"
+    # entries are only imported once
+    assert restored.restore(archive) == 0
+
+
+def test_generate_cached(tmp_path, monkeypatch, project, uv):
+    monkeypatch.setenv("PTM_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.delenv("PTM_NO_RESOLUTION_CACHE", raising=False)
+    monkeypatch.delenv("UV_INDEX_URL", raising=False)
+
+    def generate(checkout):
+        for generated in project(CONFIG, checkout).generate():
+            assert (generated.directory / "requirements.txt").read_text() == (
+                uv.compiled
+            )
+
+    generate("one")
+    generate("two")
+    # the second checkout resolves nothing
+    assert len(uv.compiles) == 2
+
+    # another index or host resolves again
+    monkeypatch.setenv("UV_INDEX_URL", "https://mirror.example/simple")
+    generate("index")
+    assert len(uv.compiles) == 4
+    monkeypatch.setattr(ptm.drivers.uv.platform, "machine", lambda: "riscv64")
+    generate("machine")
+    assert len(uv.compiles) == 6
@@ -0,0 +1,82 @@
+import json
+import socket
+import threading
+
+import pytest
+
+from ptm.coordinator import Coordinator, CoordinatorError, CoordinatorServer, work
+
+
+def test_coordinator(driver, project):
+    cfg = project(
+        """
+[tool.ptm]
+driver = "fake"
+setenv = {GREETING = "hello"}
+
+[tool.ptm.env.default]
+matrix = [{python = ["3.10", "3.11", "3.12", "3.13"], django = "5.1"}]
+"""
+    )
+    runs = list(cfg.runs())
+    failing = runs[-1]
+    messages = []
+    command = (
+        f'echo "$GREETING from $PTM_RUN"; test "$PTM_RUN" != "{failing.directory}"'
+    )
+    coordinator = Coordinator(runs=runs, command=command, report=messages.append)
+    server = CoordinatorServer(("127.0.0.1", 0), coordinator)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    address = server.server_address[:2]
+    try:
+        # workers need the token and must execute the coordinator's command
+        with pytest.raises(CoordinatorError, match="token"):
+            work(cfg, address, command, "guess")
+        with pytest.raises(CoordinatorError, match="distributes"):
+            work(cfg, address, "rm -rf /", coordinator.token)
+        with socket.create_connection(address) as sock:
+            stream = sock.makefile("rwb")
+            stream.write(b'{"op": "next"}\n')
+            stream.flush()
+            assert stream.readline() == b""
+            stream.close()
+        assert not coordinator.in_flight
+
+        # a worker that dies after taking a run
+        with socket.create_connection(address) as sock:
+            stream = sock.makefile("rwb")
+            hello = {"op": "hello", "worker": "doomed", "token": coordinator.token}
+            stream.write(json.dumps(hello).encode() + b'\n{"op": "next"}\n')
+            stream.flush()
+            assert json.loads(stream.readline()) == {"command": command}
+            lost = json.loads(stream.readline())["run"]
+            stream.close()
+
+        counts = []
+        workers = [
+            threading.Thread(
+                target=lambda name=name: counts.append(
+                    work(cfg, address, command, coordinator.token, name, interval=0.05)
+                )
+            )
+            for name in ("one", "two")
+        ]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join(timeout=30)
+        assert coordinator.finished.is_set()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert sum(counts) == len(runs)
+    assert coordinator.requeued == 1
+    assert lost in coordinator.results
+    assert set(coordinator.results) == {run.ident for run in runs}
+    assert [result.ident for result in coordinator.failed] == [failing.ident]
+    assert (
+        f"hello from {runs[0].directory}" in (runs[0].directory / "run.log").read_text()
+    )
+    # the output of the failed run is reported
+    assert any(f"[{failing.ident}] hello from" in message for message in messages)
@@ -0,0 +1,66 @@
+import itertools
+
+import pytest
+
+from ptm.covering import covering_array, parse_expansion
+
+PARAMETERS = {
+    "python": ["3.9", "3.10", "3.11", "3.12", "3.13"],
+    "django": ["4.2", "5.0", "5.1", "5.2"],
+    "psycopg": ["2", "3"],
+    "extras": ["none", "all"],
+    "rdbms": ["sqlite", "postgres", "mysql"],
+}
+
+
+def covered(rows, strength):
+    for names in itertools.combinations(PARAMETERS, strength):
+        for values in itertools.product(*(PARAMETERS[name] for name in names)):
+            if not any(
+                all(row[name] == value for name, value in zip(names, values))
+                for row in rows
+            ):
+                return False
+    return True
+
+
+@pytest.mark.parametrize("strength", [2, 3])
+def test_covering_array(strength):
+    include = [{"python": "3.9", "django": "5.2", "rdbms": "mysql"}]
+    rows = covering_array(PARAMETERS, strength, include)
+    assert covered(rows, strength)
+    assert len(rows) < 240
+    assert rows[0]["python"] == "3.9"
+    assert rows[0]["django"] == "5.2"
+    assert rows[0]["rdbms"] == "mysql"
+    assert rows == covering_array(PARAMETERS, strength, include)
+
+
+def test_pairwise_reduction():
+    assert len(covering_array(PARAMETERS, 2)) <= 25
+
+
+def test_invalid_inclusion():
+    with pytest.raises(ValueError):
+        covering_array(PARAMETERS, 2, [{"python": "2.7"}])
+
+
+@pytest.mark.parametrize(
+    "group",
+    [
+        '{python = "3.12", django = []}',
+        '{python = "3.12", django = ["5.1", "5.2"], -include = [{django = "5.2"}]}',
+    ],
+)
+def test_invalid_group(project, group):
+    with pytest.raises(AssertionError):
+        project(f"[tool.ptm.env.default]\nmatrix = [{group}]\n")
+
+
+def test_parse_expansion():
+    assert parse_expansion(None) is None
+    assert parse_expansion("product") is None
+    assert parse_expansion("pairwise") == 2
+    assert parse_expansion("n-wise:3") == 3
+    with pytest.raises(ValueError):
+        parse_expansion("n-wise:x")
@@ -0,0 +1,55 @@
+from ptm.config import initialize
+from ptm.diff import diff
+
+BASE = """
+[tool.ptm]
+groups = ["test"]
+
+[tool.ptm.env.default]
+matrix = [
+  {{python = "3.9", django = ["4.2", "5.0"]}},
+  {{python = "3.12", django = "5.1"{extra}}},
+]
+"""
+
+
+def test_diff(tmp_path):
+    (tmp_path / "old").mkdir()
+    (tmp_path / "new").mkdir()
+    (tmp_path / "old" / "pyproject.toml").write_text(BASE.format(extra=""))
+    (tmp_path / "new" / "pyproject.toml").write_text(
+        BASE.format(extra=', -groups=["psycopg3"]').replace('"5.0"', '"5.2"')
+    )
+    old = initialize(tmp_path / "old" / "pyproject.toml")
+    new = initialize(tmp_path / "new" / "pyproject.toml")
+
+    result = diff(old, new)
+    assert [str(dep) for run in result.added for dep in run.dependencies] == [
+        "django~=5.2.0"
+    ]
+    assert [str(dep) for run in result.removed for dep in run.dependencies] == [
+        "django~=5.0.0"
+    ]
+    assert len(result.changed) == 1
+    assert result.changed[0].fields == {"groups": (["test"], ["psycopg3", "test"])}
+    assert {run.ident for run in result.affected} == {
+        result.added[0].ident,
+        result.changed[0].new.ident,
+    }
+    assert not diff(old, old)
+
+
+def test_retagged(tmp_path):
+    (tmp_path / "old").mkdir()
+    (tmp_path / "new").mkdir()
+    (tmp_path / "old" / "pyproject.toml").write_text(BASE.format(extra=""))
+    (tmp_path / "new" / "pyproject.toml").write_text(
+        BASE.format(extra=', -tags=["latest"]')
+    )
+    result = diff(
+        initialize(tmp_path / "old" / "pyproject.toml"),
+        initialize(tmp_path / "new" / "pyproject.toml"),
+    )
+    # a tag change does not change what the run resolves and executes
+    assert result and not result.changed and not result.affected
+    assert result.retagged[0].fields == {"tags": ([], ["latest"])}
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from ptm.config import initialize
+from ptm.index import IndexUnavailable, PackageIndex, select_versions
+
+DJANGO = {
+    "info": {"name": "Django"},
+    "releases": {
+        version: [{"yanked": version == "5.0.5", "requires_python": ">=3.10"}]
+        for version in [
+            "4.1.13",
+            "4.2",
+            "4.2.20",
+            "5.0",
+            "5.0.4",
+            "5.0.5",
+            "5.1.7",
+            "5.2b1",
+        ]
+    },
+}
+# a release whose files were all deleted
+DJANGO["releases"]["5.1.8"] = []
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setenv("PTM_CACHE_DIR", str(tmp_path / "cache"))
+    (tmp_path / "index").mkdir()
+    (tmp_path / "index" / "django.json").write_text(json.dumps(DJANGO))
+    return f"file://{tmp_path / 'index'}/{{package}}.json"
+
+
+def test_select_versions():
+    releases = {version: {} for version, files in DJANGO["releases"].items() if files}
+    assert select_versions(releases, ">=4.2", per="minor") == [
+        "4.2.20",
+        "5.0.5",
+        "5.1.7",
+    ]
+    assert select_versions(releases, ">=5.0", per="minor", prereleases=True) == [
+        "5.0.5",
+        "5.1.7",
+        "5.2b1",
+    ]
+    assert select_versions(releases, "<5", per="major") == ["4.2.20"]
+    assert select_versions(releases, ">=5.1", prereleases=True) == ["5.1.7", "5.2b1"]
+
+
+def test_index_cache(index, tmp_path):
+    versions = PackageIndex(url=index).versions("Django", ">=5.0", per="minor")
+    assert versions == ["5.0.4", "5.1.7"]
+    (tmp_path / "index" / "django.json").unlink()
+    # served from the on disk cache
+    assert PackageIndex(url=index).versions("django", ">=5.0") == [
+        "5.0",
+        "5.0.4",
+        "5.1.7",
+    ]
+    assert PackageIndex(url=index, ttl=0, offline=True).versions("django", ">5.1")
+    with pytest.raises(IndexUnavailable):
+        PackageIndex(url=index, offline=True).fetch("psycopg")
+
+
+def test_dynamic_matrix(index, tmp_path):
+    (tmp_path / "pyproject.toml").write_text(
+        f"""
+[tool.ptm]
+index_url = "{index}"
+
+[tool.ptm.env.default]
+matrix = [
+  {{python = "3.12", django = {{range = ">=4.2", per = "minor", include-prereleases = true}}}},
+]
+"""
+    )
+    cfg = initialize(tmp_path / "pyproject.toml")
+    assert [str(run.dependencies[0]) for run in cfg.runs()] == [
+        "django==4.2.20",
+        "django==5.0.4",
+        "django==5.1.7",
+        "django==5.2b1",
+    ]
@@ -0,0 +1,82 @@
+from ptm.lock import Lock, LockedRun, Package, requirement_lines
+
+COMPILED = """\
+# This file was autogenerated by uv via the following command:
+#    uv pip compile requirements.in -o requirements.txt
+-e .
+asgiref==3.8.1
+    # via django
+django==5.1.7
+    # via -r requirements.in
+pywin32==308 ; sys_platform == 'win32'
+Requests[socks,security]==2.32.3
+"""
+
+
+def test_package_parse():
+    assert Package.parse("django==5.1.7") == Package(name="django", version="5.1.7")
+    assert Package.parse("-e .") == Package(name="", source="-e .")
+    assert Package.parse("Requests[socks,security]==2.32.3").requirement == (
+        "requests[security,socks]==2.32.3"
+    )
+    assert Package.parse("pywin32==308 ; sys_platform == 'win32'").markers == (
+        'sys_platform == "win32"'
+    )
+    assert Package.parse("pkg @ https://example.com/pkg.whl").requirement == (
+        "pkg @ https://example.com/pkg.whl"
+    )
+
+
+def test_lock_round_trip(tmp_path):
+    lock = Lock(path=tmp_path / "ptm.lock")
+    lines = requirement_lines(COMPILED)
+    assert lines[:2] == ["-e .", "asgiref==3.8.1"]
+    lock.add(
+        "bbbbbbbbbbbb",
+        LockedRun(env="b", python="3.12", packages=[], setenv={"RDBMS": "pg"}),
+        lines,
+    )
+    lock.add(
+        "aaaaaaaaaaaa",
+        LockedRun(env="a", python="3.11", packages=[], strategy="lowest"),
+        ["-e .", "django==4.2.20"],
+    )
+    # shared packages are stored once
+    assert len(lock.packages) == 6
+    lock.save()
+    text = lock.path.read_text()
+    assert text.index("[runs.aaaaaaaaaaaa]") < text.index("[runs.bbbbbbbbbbbb]")
+
+    loaded = Lock.load(lock.path)
+    assert loaded == lock
+    assert loaded.requirements("aaaaaaaaaaaa") == ["-e .", "django==4.2.20"]
+    assert loaded.dumps() == text
+
+    loaded.prune({"aaaaaaaaaaaa"})
+    assert set(loaded.runs) == {"aaaaaaaaaaaa"}
+    assert set(loaded.packages) == {"-e .", "django==4.2.20"}
+
+
+def test_missing_lock(tmp_path):
+    lock = Lock.load(tmp_path / "ptm.lock")
+    assert not lock.runs and not lock.packages
+
+
+def test_concurrent_saves(tmp_path):
+    path = tmp_path / "ptm.lock"
+    one, two = Lock.load(path), Lock.load(path)
+    one.add("aaaaaaaaaaaa", LockedRun(env="a", python="3.12", packages=[]), ["x==1"])
+    two.add("bbbbbbbbbbbb", LockedRun(env="b", python="3.12", packages=[]), ["y==1"])
+    one.save()
+    two.save()
+    # the second save keeps the run saved by the first
+    assert set(Lock.load(path).runs) == {"aaaaaaaaaaaa", "bbbbbbbbbbbb"}
+
+    # pruning removes runs saved by others that are not configured
+    one.prune({"aaaaaaaaaaaa"})
+    with one.deferred():
+        one.save()
+        assert set(Lock.load(path).runs) == {"aaaaaaaaaaaa", "bbbbbbbbbbbb"}
+    loaded = Lock.load(path)
+    assert set(loaded.runs) == {"aaaaaaaaaaaa"}
+    assert set(loaded.packages) == {"x==1"}
@@ -0,0 +1,188 @@
+import hashlib
+import io
+import json
+import os
+import sys
+import tarfile
+
+import ptm.venv
+from ptm.pack import MANIFEST, pack, restored, unpack
+from ptm.results import lock_hash
+
+CONFIG = """
+[tool.ptm]
+driver = "fake"
+
+[tool.ptm.env.default]
+matrix = [{python = ["3.12", "3.13"], django = "5.1"}]
+"""
+
+
+def populate(run, venv):
+    site_packages = venv / "lib" / "python3.12" / "site-packages"
+    site_packages.mkdir(parents=True)
+    (venv / "bin").mkdir()
+    (venv / "pyvenv.cfg").write_text(f"home = {os.path.dirname(sys.executable)}\n")
+    os.symlink(sys.executable, venv / "bin" / "python")
+    os.symlink("python", venv / "bin" / "python3")
+    script = venv / "bin" / "django-admin"
+    script.write_text(f"#!{venv}/bin/python\nimport django\n")
+    script.chmod(0o755)
+    (site_packages / "django.py").write_text("VERSION = (5, 1, 7)\n" * 1000)
+    (site_packages / "_project.pth").write_text(
+        f"{run.group.env.cfg.project_dir.absolute()}/src\n"
+    )
+
+
+def test_pack(tmp_path, driver, project):
+    driver.populate = populate
+    cfg = project(CONFIG, "one")
+    runs = list(cfg.runs())
+    for run in runs:
+        run.generate()
+        with cfg.driver.bootstrap(run):
+            pass
+
+    archive = tmp_path / "venvs.tar.gz"
+    packed = pack(runs, archive)
+    assert packed.runs == [run.ident for run in runs]
+    # only the scripts with each venv's path in their shebang differ
+    assert packed.files == 8 and packed.objects == 5
+
+    moved = project(CONFIG, "two")
+    changed = moved.id_table[runs[1].ident]
+    changed.generate()
+    (changed.directory / "requirements.txt").write_text("django==5.1.8\n")
+    unpacked = unpack(moved, archive)
+    assert unpacked.restored == [runs[0].ident]
+    assert unpacked.skipped == {runs[1].ident: "requirements changed"}
+
+    run = moved.id_table[runs[0].ident]
+    venv = run.venv.absolute()
+    assert restored(run)
+    assert (venv / "bin" / "django-admin").read_text().startswith(f"#!{venv}/bin/")
+    assert os.access(venv / "bin" / "django-admin", os.X_OK)
+    assert os.readlink(venv / "bin" / "python3") == "python"
+    assert os.readlink(venv / "bin" / "python") == sys.executable
+    site_packages = venv / "lib" / "python3.12" / "site-packages"
+    assert (site_packages / "_project.pth").read_text() == f"{tmp_path / 'two'}/src\n"
+    original = runs[0].venv / "lib" / "python3.12" / "site-packages" / "django.py"
+    assert (site_packages / "django.py").stat().st_mtime == int(
+        original.stat().st_mtime
+    )
+    assert not (moved.directory / f".unpack-{os.getpid()}").exists()
+
+    (run.directory / "requirements.txt").write_text("django==5.1.8\n")
+    assert not restored(run)
+
+
+def test_pack_installed_hash(tmp_path, driver, project):
+    cfg = project(CONFIG)
+    run = next(cfg.runs())
+    run.generate()
+    with cfg.driver.bootstrap(run):
+        pass
+    installed = lock_hash(run)
+
+    # the venv was installed for the previous requirements
+    (run.directory / "requirements.txt").write_text("django==5.1.8\n")
+    archive = tmp_path / "venvs.tar.gz"
+    pack([run], archive)
+    with tarfile.open(archive) as tar:
+        manifest = json.load(tar.extractfile(MANIFEST))
+    assert manifest["runs"][run.ident]["lock_hash"] == installed
+    assert unpack(cfg, archive).skipped == {run.ident: "requirements changed"}
+
+
+def test_unpack_modes(tmp_path, monkeypatch, driver, project):
+    # where reflinks are not supported restored files are hardlinked
+    monkeypatch.setattr(ptm.venv, "_reflinks_supported", False)
+
+    def populate(run, venv):
+        (venv / "bin").mkdir()
+        for name, mode, mtime in (("a.py", 0o644, 1000), ("b.py", 0o755, 2000)):
+            (venv / name).write_text("same\n")
+            (venv / name).chmod(mode)
+            os.utime(venv / name, (mtime, mtime))
+
+    driver.populate = populate
+    cfg = project(CONFIG, "one")
+    runs = list(cfg.runs())
+    for run in runs:
+        run.generate()
+        with cfg.driver.bootstrap(run):
+            pass
+    archive = tmp_path / "venvs.tar.gz"
+    assert pack(runs, archive).objects == 1
+
+    moved = project(CONFIG, "two")
+    assert len(unpack(moved, archive, max_workers=1).restored) == 2
+    for run in moved.runs():
+        for name, mode, mtime in (("a.py", 0o644, 1000), ("b.py", 0o755, 2000)):
+            info = (run.venv / name).stat()
+            assert (info.st_mode & 0o777, info.st_mtime) == (mode, mtime)
+    # files with the same content, mode and mtime share one copy
+    one, two = (run.venv / "b.py" for run in moved.runs())
+    assert one.stat().st_ino == two.stat().st_ino
+
+
+def test_unpack_refuses_escapes(tmp_path, driver, project):
+    cfg = project(CONFIG)
+    run = next(cfg.runs())
+    run.generate()
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    content = b"ssh-ed25519 AAAA attacker\n"
+    sha = hashlib.sha256(content).hexdigest()
+    packed = {
+        "venv": ".ptm/x/.venv",
+        "origin": "/elsewhere/.venv",
+        "project": "/elsewhere",
+        "python": run.python,
+        "lock_hash": lock_hash(run),
+    }
+    for manifest in (
+        # a file written through a symlink to a directory outside of the venv
+        {
+            **packed,
+            "symlinks": [["lib64", str(outside)]],
+            "files": [["lib64/authorized_keys", 0o644, 0, sha]],
+        },
+        # a symlink out of the venv that is not an interpreter
+        {**packed, "symlinks": [["lib/keys", str(outside / "keys")]], "files": []},
+    ):
+        archive = tmp_path / "evil.tar.gz"
+        data = json.dumps({"version": 1, "runs": {run.ident: manifest}}).encode()
+        with tarfile.open(archive, "w:gz") as tar:
+            for name, payload in ((MANIFEST, data), (f"objects/{sha}", content)):
+                info = tarfile.TarInfo(name)
+                info.size = len(payload)
+                tar.addfile(info, io.BytesIO(payload))
+        unpacked = unpack(cfg, archive)
+        assert not unpacked.restored and run.ident in unpacked.skipped
+        assert list(outside.iterdir()) == []
+        assert not run.venv.exists()
+
+
+def test_bootstrap_restored(tmp_path, monkeypatch, project, uv):
+    monkeypatch.setenv("PTM_NO_RESOLUTION_CACHE", "1")
+    uv.compiled = "-e .\ndjango==5.1.7\n"
+    config = "[tool.ptm.env.default]\nmatrix = [{python = '3.12'}]\n"
+    run = next(project(config, "one").runs())
+    with run.bootstrap():
+        pass
+    archive = tmp_path / "venvs.tar.gz"
+    pack([run], archive)
+
+    moved = project(config, "two")
+    run = next(moved.runs())
+    run.generate()
+    assert unpack(moved, archive).restored == [run.ident]
+    uv.installs.clear()
+    for _ in range(2):
+        with run.bootstrap():
+            pass
+    # the editable install of the project is reinstalled from the new checkout
+    # once, then the venv is bootstrapped as usual
+    assert uv.installs[0][-4:] == ["--reinstall", "--no-deps", "-e", "."]
+    assert "--exact" in uv.installs[1]
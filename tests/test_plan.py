@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+from ptm.plan import parse_duration, plan, plan_runs
+from ptm.results import RESULTS_DB, Result, ResultStore
+
+CONFIG = """
+[tool.ptm.env.default]
+matrix = [
+    {python = ["3.10", "3.11", "3.12", "3.13"], django = ["4.2", "5.1", "5.2"]},
+    {python = "3.10", django = "4.2", -strategy = "lowest-direct", -tags = ["lowest"]},
+]
+"""
+
+
+def test_parse_duration():
+    assert parse_duration("15m") == 900
+    assert parse_duration("1h30m") == 5400
+    assert parse_duration("1m30s") == parse_duration("90s") == 90
+    with pytest.raises(AssertionError):
+        parse_duration("90")
+
+
+def test_plan(project):
+    # the lowest runs are required by default
+    default = project(CONFIG, "default")
+    selection = plan_runs(default, default.runs(), "1", seed="abc")
+    assert [run.tags for run in selection.selected] == [["lowest"]]
+
+    cfg = project("[tool.ptm]\nplan_require = []\n" + CONFIG)
+    runs = list(cfg.runs())
+    lowest = runs[-1]
+    assert lowest.tags == ["lowest"]
+
+    # 4 pythons and 3 djangos are covered by 4 runs
+    selection = plan_runs(cfg, runs, "4", seed="abc")
+    assert len(selection.selected) == 4 and not selection.uncovered
+    assert plan_runs(cfg, runs, "4", seed="abc") == selection
+    assert plan_runs(cfg, runs, "2", seed="abc").uncovered
+
+    # required runs are always included
+    selection = plan_runs(cfg, runs, "4", required=["lowest"], seed="abc")
+    assert lowest in selection.selected and len(selection.selected) == 4
+
+    # the recorded durations are spent, unknown runs take the average
+    slow = {run.ident for run in runs if run.python == "3.13"}
+    with ResultStore(cfg.directory / RESULTS_DB) as store:
+        for run in runs[:-1]:
+            store.record(
+                Result(
+                    ident=run.ident,
+                    env="default",
+                    python=run.python,
+                    lock_hash=None,
+                    command="pytest",
+                    exit_code=0,
+                    bootstrap_time=10,
+                    command_time=590 if run.ident in slow else 50,
+                )
+            )
+    selection = plan_runs(cfg, runs, "5m", seed="abc")
+    assert selection.duration <= 300 and len(selection.selected) == 3
+    assert all(run.ident not in slow for run in selection.selected)
+    assert ("python", "3.13") in selection.uncovered
+    assert len(plan_runs(cfg, runs, "15m", seed="abc").selected) == 4
+
+
+def test_plan_scales(project):
+    values = ", ".join(f'"{value}"' for value in range(1, 6))
+    cfg = project(
+        "[tool.ptm.env.default]\n"
+        f'matrix = [{{python = ["3.10", "3.11", "3.12", "3.13"], a = [{values[:-5]}], '
+        f"b = [{values}], c = [{values}], d = [{values}]}}]\n"
+    )
+    runs = list(cfg.runs())
+    assert len(runs) == 2000
+    costs = {run.ident: 1 + index % 7 for index, run in enumerate(runs)}
+    start = time.perf_counter()
+    selection = plan(runs, 30, costs, seed="abc")
+    assert time.perf_counter() - start < 0.5
+    assert not selection.uncovered and selection.duration <= 30
@@ -0,0 +1,93 @@
+import json
+
+from packaging.version import Version
+
+from ptm.config import initialize
+from ptm.preflight import Satisfiability, preflight, python_version, supports
+
+
+def release(requires_python, *requires_dist):
+    return {
+        "info": {"requires_python": requires_python, "requires_dist": requires_dist}
+    }
+
+
+def test_preflight(tmp_path, monkeypatch):
+    monkeypatch.setenv("PTM_CACHE_DIR", str(tmp_path / "cache"))
+    index = tmp_path / "index"
+    (index / "django").mkdir(parents=True)
+    (index / "asgiref").mkdir()
+    (index / "django.json").write_text(
+        json.dumps(
+            {
+                "releases": {
+                    "4.2.20": [{"requires_python": ">=3.8"}],
+                    "5.1.7": [{"requires_python": ">=3.10"}],
+                }
+            }
+        )
+    )
+    (index / "django" / "4.2.20.json").write_text(
+        json.dumps(
+            release(">=3.8", "asgiref<4,>=3.6.0", "tzdata; sys_platform=='win32'")
+        )
+    )
+    (index / "django" / "5.1.7.json").write_text(
+        json.dumps(release(">=3.10", "asgiref<4,>=3.8.1"))
+    )
+    (index / "asgiref.json").write_text(
+        json.dumps({"releases": {"3.6.0": [{}], "3.8.1": [{}]}})
+    )
+    (index / "asgiref" / "3.6.0.json").write_text(json.dumps(release(None)))
+    (index / "asgiref" / "3.8.1.json").write_text(json.dumps(release(None)))
+
+    config = tmp_path / "pyproject.toml"
+    config.write_text(
+        f"""
+[project]
+name = "preflight"
+requires-python = ">=3.8"
+
+[tool.ptm]
+index_url = "file://{index}/{{package}}.json"
+
+[tool.ptm.env.default]
+matrix = [
+    {{python = ["3.8", "3.12"], django = ["4.2", "5.1"], asgiref = "==3.6.0"}},
+    {{python = "3.12", django = "6.0"}},
+    {{python = "3.12", django = "https://example.com/django.tar.gz"}},
+]
+"""
+    )
+    cfg = initialize(config)
+    verdicts = {
+        (verdict.run.python, str(verdict.run.dependencies[0].specifier)): verdict
+        for verdict in preflight(cfg.runs(), cfg.index, cfg.requires_python)
+    }
+    assert len(verdicts) == 6
+    satisfiable = verdicts[("3.8", "~=4.2.0")]
+    assert satisfiable.satisfiability is Satisfiability.SATISFIABLE
+    assert verdicts[("3.12", "~=4.2.0")].satisfiability is Satisfiability.SATISFIABLE
+
+    too_old = verdicts[("3.8", "~=5.1.0")]
+    assert too_old.satisfiability is Satisfiability.UNSATISFIABLE
+    assert "requires python >=3.10" in too_old.reasons[0]
+    assert str(too_old).startswith("default line 11: ")
+
+    conflict = verdicts[("3.12", "~=5.1.0")]
+    assert conflict.satisfiability is Satisfiability.UNSATISFIABLE
+    assert conflict.reasons == ["django==5.1.7 requires asgiref<4,>=3.8.1"]
+
+    missing = verdicts[("3.12", "~=6.0.0")]
+    assert missing.satisfiability is Satisfiability.UNSATISFIABLE
+    assert str(missing).startswith("default line 12: ")
+
+    assert verdicts[("3.12", "")].satisfiability is Satisfiability.UNKNOWN
+
+
+def test_supports_micro_releases():
+    assert supports(">=3.8.1", Version("3.8"))
+    assert supports("!=3.9.0", Version("3.9"))
+    assert not supports(">=3.8.1", Version("3.8.0"))
+    assert not supports(">=3.9", Version("3.8"))
+    assert supports(">=3.8.1,<3.9", python_version("cpython3.8"))
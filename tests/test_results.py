@@ -0,0 +1,53 @@
+from ptm.results import Result, ResultStore, execute, record_result
+
+
+def result(ident, exit_code, lock="abc", time=1.0):
+    return Result(
+        ident=ident,
+        env="default",
+        python="3.12",
+        lock_hash=lock,
+        command="pytest",
+        exit_code=exit_code,
+        command_time=time,
+    )
+
+
+def test_results_store(tmp_path):
+    with ResultStore(tmp_path / "results.db", batch_size=100) as store:
+        store.record(result("a", 0, time=3.0))
+        store.record(result("a", 1, time=2.0))
+        store.record(result("b", 1, time=5.0))
+        store.record(result("b", 0, lock="def", time=4.0))
+        store.record(result("c", 0, time=1.0))
+        store.record(result("c", 1, time=6.0))
+        store.record(result("c", 0, time=1.0))
+
+    store = ResultStore(tmp_path / "results.db")
+    assert [(res.ident, res.exit_code) for res in store.latest()] == [
+        ("a", 1),
+        ("b", 0),
+        ("c", 0),
+    ]
+    assert [res.ident for res in store.failed()] == ["a"]
+    assert [res.ident for res in store.flaky()] == ["a", "c"]
+    assert [res.ident for res in store.slowest(2)] == ["b", "a"]
+    assert [res.exit_code for res in store.history("c")] == [0, 1, 0]
+
+
+def test_execute():
+    exit_code, elapsed, peak_rss = execute("exit 3")
+    assert exit_code == 3
+    assert elapsed >= 0
+    assert peak_rss is None or peak_rss > 0
+
+
+def test_record_result(tmp_path):
+    served = {"ident": "a", "env": "default", "python": "3.12"}
+    with ResultStore(tmp_path / "results.db") as store:
+        recorded = record_result(store, served, "pytest", 1, "abc", command_time=2.0)
+        assert record_result(None, served, "pytest", 0, "def").passed
+    # the start time is kept, not the time the result was recorded
+    assert record_result(None, served, "pytest", 0, None, started=5.0).started == 5.0
+    assert recorded.lock_hash == "abc" and not recorded.passed
+    assert [(res.ident, res.command_time) for res in store.latest()] == [("a", 2.0)]
@@ -0,0 +1,46 @@
+import threading
+
+from ptm.server import Server, connect, select
+
+
+def test_server(tmp_path, monkeypatch, driver):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    monkeypatch.delenv("PTM_NO_SERVER", raising=False)
+    config = tmp_path / "pyproject.toml"
+    config.write_text(
+        """
+[tool.ptm]
+driver = "fake"
+setenv = {RDBMS = "sqlite"}
+
+[tool.ptm.env.default]
+matrix = [{python = ["3.11", "3.12"], django = "5.1", -tags = ["latest"]}]
+"""
+    )
+    assert connect(config) is None
+
+    server = Server(config)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        client = connect(config)
+        assert client
+        index = client.request("index")
+        assert index["environments"] == ["default"]
+        runs = select(index, tags=["latest"])
+        assert len(runs) == 2
+
+        info = client.request("bootstrap", ident=runs[0]["ident"])
+        assert info["setenv"]["RDBMS"] == "sqlite"
+        assert info["lock_hash"]
+        client.request("bootstrap", ident=runs[0]["ident"])
+        # the venv is still fresh so it is not bootstrapped again
+        assert driver.bootstraps == [runs[0]["ident"]]
+
+        client.request("generate", idents=[runs[0]["ident"]])
+        client.request("bootstrap", ident=runs[0]["ident"])
+        assert driver.bootstraps == [runs[0]["ident"]] * 2
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert connect(config) is None
@@ -0,0 +1,34 @@
+from ptm.config import initialize
+from ptm.toml import loads, matrix_lines
+
+CONFIG = """
+[tool.ptm.env."a.b"]
+tags = ["x"]  # [not a table]
+matrix = [ {python="3.8", x="a]\\\\\\"{"},
+  # {python="3.9"}
+  {python = "3.9"}, {python="3.10", -setenv={A="}"}}
+]
+
+[[tool.ptm.env.c.matrix]]
+python = "3.11"
+
+[[tool.ptm.env.c.matrix]]
+python = '''3.12'''
+
+[tool.ptm.env]
+d.matrix = [
+   {python='3.13'},
+]
+"""
+
+
+def test_matrix_lines():
+    assert loads(CONFIG)["tool"]["ptm"]["env"]["a.b"]["matrix"][0]["x"] == 'a]\\"{'
+    assert matrix_lines(CONFIG) == {"a.b": [4, 6, 6], "c": [9, 12], "d": [17]}
+
+
+def test_run_group_lineno(tmp_path):
+    (tmp_path / "pyproject.toml").write_text(CONFIG)
+    cfg = initialize(tmp_path / "pyproject.toml")
+    assert [group.lineno for group in cfg.environments["a.b"].matrix] == [4, 6, 6]
+    assert [group.lineno for group in cfg.environments["c"].matrix] == [9, 12]
@@ -0,0 +1,66 @@
+import ptm.usage
+from ptm.usage import collect, collect_opportunistically, parse_size
+
+
+def make_venv(venv, size):
+    site_packages = venv / "lib" / "python3.12" / "site-packages"
+    site_packages.mkdir(parents=True)
+    (site_packages / "package.py").write_bytes(b"x" * size)
+
+
+def test_parse_size():
+    assert parse_size("10GB") == 10 * 1000**3
+    assert parse_size("1.5 MiB") == 1.5 * 1024**2
+    assert parse_size(1024) == 1024
+    assert parse_size("2048") == 2048
+
+
+def test_gc(monkeypatch, project):
+    cfg = project(
+        """
+[tool.ptm]
+cache_max_size = "250KB"
+
+[tool.ptm.env.default]
+matrix = [{python = ["3.11", "3.12", "3.13"], django = "5.1"}]
+"""
+    )
+    runs = list(cfg.runs())
+    for offset, run in enumerate(runs):
+        make_venv(run.venv, 100_000)
+        cfg.usage.touch(run.venv, last_used=1000 + offset)
+
+    measured = []
+    disk_usage = ptm.usage.disk_usage
+    monkeypatch.setattr(
+        ptm.usage, "disk_usage", lambda path: measured.append(path) or disk_usage(path)
+    )
+    runs[0].touch()
+    assert not measured
+    (runs[0].venv / "lib" / "python3.12" / "site-packages" / "new.py").write_text("")
+    runs[0].touch()
+    assert measured == [runs[0].venv]
+    assert cfg.usage.total() > 300_000
+
+    orphan_run = cfg.directory / "default" / "0123456789ab"
+    make_venv(orphan_run / ".venv", 100)
+    orphan_env = cfg.directory / "removed"
+    orphan_env.mkdir()
+    orphan_template = cfg.directory / ".templates" / "3.7-default"
+    orphan_template.mkdir(parents=True)
+
+    preview = collect(cfg, protect=[runs[1].venv], dry_run=True)
+    assert orphan_run.exists() and all(run.venv.exists() for run in runs)
+
+    collection = collect(cfg, protect=[runs[1].venv])
+    assert collection == preview
+    assert set(collection.orphans) == {orphan_run, orphan_env, orphan_template}
+    assert not any(path.exists() for path in collection.orphans)
+    # the least recently used venv that is not protected is evicted
+    assert collection.evicted == [runs[2].venv]
+    assert not runs[2].venv.exists() and runs[2].directory.exists()
+    assert runs[0].venv.exists() and runs[1].venv.exists()
+    assert collection.total == cfg.usage.total() <= 250_000
+
+    # within budget and recently collected
+    assert collect_opportunistically(cfg) is None
@@ -0,0 +1,72 @@
+import os
+
+import ptm.venv
+from ptm.venv import bin_dir, clone_tree, disk_usage, relocate
+
+CONFIG = """
+[tool.ptm]
+templates = true
+
+[tool.ptm.env.default]
+matrix = [{python = "3.12", django = ["4.2", "5.1"]}]
+"""
+
+
+def test_clone_and_relocate(tmp_path, monkeypatch):
+    # where reflinks are not supported files are hardlinked
+    monkeypatch.setattr(ptm.venv, "_reflinks_supported", False)
+    template = tmp_path / "template" / ".venv"
+    bin_dir(template).mkdir(parents=True)
+    (template / "pyvenv.cfg").write_text("home = /usr/bin\n")
+    script = bin_dir(template) / "pytest"
+    script.write_text(f"#!{bin_dir(template)}/python\nimport pytest\n")
+    os.chmod(script, 0o755)
+    (template / "lib.py").write_text("x = 1\n" * 1000)
+
+    clone = tmp_path / "run" / ".venv"
+    clone_tree(template, clone)
+    relocate(clone, template, clone)
+
+    assert (
+        (bin_dir(clone) / "pytest").read_text().startswith(f"#!{bin_dir(clone)}/python")
+    )
+    assert os.access(bin_dir(clone) / "pytest", os.X_OK)
+    # the template must not be modified through a shared inode
+    assert script.read_text().startswith(f"#!{bin_dir(template)}/python")
+    assert (bin_dir(clone) / "pytest").stat().st_ino != script.stat().st_ino
+    shared = (clone / "lib.py").stat()
+    assert shared.st_ino == (template / "lib.py").stat().st_ino
+    assert shared.st_nlink == 2
+    assert disk_usage(template, clone) < disk_usage(template) + disk_usage(clone)
+
+
+def test_template(project, uv):
+    cfg = project(CONFIG)
+    old, new = cfg.runs()
+    uv.compiled = "asgiref==3.8.1\ndjango==4.2\nsqlparse==0.5.0\n"
+    old.generate()
+    uv.compiled = "asgiref==3.8.1\ndjango==5.1.7\nsqlparse==0.5.0\n"
+    new.generate()
+
+    # the template holds the requirements both runs share
+    with old.bootstrap():
+        pass
+    template = cfg.driver.template_directory(old)
+    assert (template / "requirements.txt").read_text().splitlines() == [
+        "asgiref==3.8.1",
+        "sqlparse==0.5.0",
+    ]
+    assert uv.venvs == [str(template / ".venv")]
+    assert uv.installs[0][-2:] == ["asgiref==3.8.1", "sqlparse==0.5.0"]
+    assert "django==4.2" in uv.installs[1]
+    assert (old.venv / "pyvenv.cfg").read_text() == f"home = {old.venv}\n"
+
+    # an unchanged template is cloned as it is, its intersection is computed once
+    # per generate pass
+    assert list(cfg.driver.intersections.values()) == [
+        ["asgiref==3.8.1", "sqlparse==0.5.0"]
+    ]
+    with new.bootstrap():
+        pass
+    assert uv.venvs == [str(template / ".venv")]
+    assert len(uv.installs) == 3 and "django==5.1.7" in uv.installs[2]
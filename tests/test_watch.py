@@ -0,0 +1,115 @@
+import sys
+import time
+
+import pytest
+
+from ptm.watch import (
+    InotifyWatcher,
+    PollingWatcher,
+    Rewrites,
+    WatchSession,
+    debounce,
+    drain,
+)
+
+CONFIG = """
+[project]
+name = "example"
+dependencies = ["requests"]
+
+[tool.ptm]
+driver = "fake"
+
+[tool.ptm.env.old]
+matrix = [{{python = "3.12", django = "4.2"}}]
+
+[tool.ptm.env.new]
+matrix = [{{python = "3.12", django = "{django}"}}]
+"""
+
+
+def test_polling_watcher(tmp_path):
+    (tmp_path / "module.py").write_text("")
+    (tmp_path / ".ptm").mkdir()
+    (tmp_path / "out").mkdir()
+    watcher = PollingWatcher(
+        tmp_path, {tmp_path / "out"}, ["*.egg-info"], interval=0.01
+    )
+    assert watcher.wait(0) == set()
+    (tmp_path / "module.py").write_text("changed")
+    (tmp_path / "other.py").write_text("")
+    (tmp_path / ".ptm" / "ignored.txt").write_text("")
+    (tmp_path / "out" / "report.txt").write_text("")
+    (tmp_path / "coverage.xml").write_text("")
+    (tmp_path / "example.egg-info").mkdir()
+    (tmp_path / "example.egg-info" / "PKG-INFO").write_text("")
+    assert debounce(watcher, 0.05) == {tmp_path / "module.py", tmp_path / "other.py"}
+    # a change made while the command ran is reported by the next wait
+    (tmp_path / "module.py").write_text("changed again")
+    assert debounce(watcher, 0.05) == {tmp_path / "module.py"}
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify")
+def test_inotify_watcher(tmp_path):
+    watcher = InotifyWatcher(tmp_path)
+    try:
+        (tmp_path / "package").mkdir()
+        assert drain(watcher) == {tmp_path / "package"}
+        assert len(watcher.watches) == 2
+        (tmp_path / "package" / "module.py").write_text("")
+        assert drain(watcher) == {tmp_path / "package" / "module.py"}
+
+        # the watches of removed directories are dropped
+        (tmp_path / "package" / "module.py").unlink()
+        (tmp_path / "package").rmdir()
+        assert tmp_path / "package" in drain(watcher)
+        assert list(watcher.watches.values()) == [tmp_path]
+    finally:
+        watcher.close()
+
+
+def test_rewrites(tmp_path):
+    rewrites = Rewrites()
+    version, module = tmp_path / "_version.py", tmp_path / "module.py"
+    version.write_text("version = '1.0'")
+    module.write_text("")
+    started = time.time() - 1
+    assert rewrites.edited({version, module}, started) == {version, module}
+    assert rewrites.edited({version, module}, time.time() + 1) == set()
+
+    # a file rewritten with the same content is not an edit
+    version.write_text("version = '1.0'")
+    module.write_text("changed")
+    assert rewrites.edited({version, module}, started) == {module}
+    module.unlink()
+    assert rewrites.edited({module}, started) == set()
+
+
+def test_watch_session(tmp_path, driver, project):
+    config = project(CONFIG.format(django="5.1")).project_dir / "pyproject.toml"
+    session = WatchSession(config, "true", report=lambda message: None)
+    old, new = session.selected()
+    assert old.group.env.name == "old"
+
+    # a source change only reruns the command
+    generated, rerun = session.handle({tmp_path / "module.py"})
+    assert generated == [] and rerun == [old, new]
+    assert all(result.passed for result in session.execute(rerun))
+    driver.generated.clear()
+
+    # a change of one environment only regenerates and reruns its run
+    config.write_text(CONFIG.format(django="5.2"))
+    generated, rerun = session.handle({config})
+    assert [run.group.env.name for run in generated] == ["new"]
+    assert rerun == generated
+    assert driver.generated == [generated[0].ident]
+
+    # a change of the project's dependencies regenerates every run
+    config.write_text(CONFIG.format(django="5.2").replace("requests", "httpx"))
+    generated, rerun = session.handle({config})
+    assert len(generated) == len(rerun) == 2
+
+    # pinned runs are the only ones regenerated and rerun
+    pinned = WatchSession(config, "true", pinned=[old.ident], report=print)
+    generated, rerun = pinned.handle({tmp_path / "uv.lock"})
+    assert generated == rerun == [pinned.cfg.id_table[old.ident]]
@@ -0,0 +1,85 @@
+import os
+import sys
+
+import pytest
+
+from ptm.sockets import check_owner
+from ptm.worker import Worker, preload, socket_path
+
+SCRIPT = """
+import os
+import sys
+
+print("hello", os.environ["GREETING"], sys.argv[1:])
+sys.exit(3)
+"""
+
+
+def test_worker(tmp_path, monkeypatch, capfd):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    script = tmp_path / "script.py"
+    script.write_text(SCRIPT)
+    worker = Worker(socket_path(tmp_path / "run"))
+    assert worker.lock_hash() is None
+
+    worker.start(
+        sys.executable, dict(os.environ), "abc123", log=tmp_path / "worker.log"
+    )
+    try:
+        assert worker.lock_hash() == "abc123"
+        env = {**os.environ, "GREETING": "world"}
+        exit_code, elapsed, peak_rss = worker.call(
+            ["python", str(script), "-x"], env, cwd=str(tmp_path)
+        )
+        assert exit_code == 3
+        assert elapsed > 0 and peak_rss
+        assert "hello world ['-x']" in capfd.readouterr().out
+
+        # modules run in a fresh fork each time
+        for _ in range(2):
+            assert worker.call(["python", "-m", "json.tool", "--help"], env)[0] == 0
+        assert "usage" in capfd.readouterr().out
+
+        assert worker.call(["sh", "-c", "exit 4"], env)[0] == 4
+    finally:
+        worker.stop()
+    assert worker.lock_hash() is None
+    assert not worker.path.exists()
+
+
+def test_runtime_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    path = socket_path(tmp_path / "run")
+    # only serving creates the directory
+    assert path.parent == tmp_path / "ptm"
+    assert not path.parent.exists()
+    assert Worker(path).lock_hash() is None
+    assert not path.parent.exists()
+
+    # a directory others can write to could hold another user's socket
+    path.parent.mkdir(0o777)
+    path.parent.chmod(0o777)
+    with pytest.raises(PermissionError):
+        Worker(path).start(sys.executable, dict(os.environ), None, timeout=0)
+    path.parent.chmod(0o700)
+
+    impostor = path
+    impostor.write_text("")
+    with pytest.raises(PermissionError):
+        Worker(impostor).stop()
+    with pytest.raises(PermissionError):
+        check_owner(impostor)
+
+
+def test_preload(tmp_path, monkeypatch):
+    # a checkout's source, e.g. an editable install, may change between commands
+    package = tmp_path / "checkout_package"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    preload("checkout_package")
+    assert "checkout_package" not in sys.modules
+
+    monkeypatch.delitem(sys.modules, "xmlrpc", raising=False)
+    preload("xmlrpc")
+    assert "xmlrpc" in sys.modules